@@ -0,0 +1,61 @@
+# coding: utf-8
+"""
+Разбор ответов stats2 на 200 объектов за 92 дня
+стандартным json, через requests.Response.json() и orjson.
+
+python -m benchmarks.bench_decode [кол-во ответов]
+"""
+import json
+import sys
+import time
+
+import requests
+
+from tapioca_mytarget import MytargetLight
+from tapioca_mytarget.decoder import ORJSON, STDLIB, get_decoder
+from tapioca_mytarget.tapioca_mytarget import LocalResult
+from tapioca_mytarget.testing import stats_response
+
+
+def timeit(func, contents):
+    started = time.perf_counter()
+    data = [func(content) for content in contents]
+    return data, time.perf_counter() - started
+
+
+def requests_json(content):
+    response = requests.Response()
+    response._content = content
+    return response.json()
+
+
+def main(responses=5):
+    contents = [json.dumps(stats_response(
+        range(n * 200, (n + 1) * 200), days=92)).encode('utf-8')
+        for n in range(responses)]
+    print('{} ответов по {:.1f} МБ'.format(
+        responses, sum(map(len, contents)) / responses / 2 ** 20))
+
+    decoders = [('json', get_decoder(STDLIB)),
+                ('requests', requests_json)]
+    try:
+        decoders.append(('orjson', get_decoder(ORJSON)))
+    except ImportError:
+        print('orjson не установлен')
+
+    light_api = MytargetLight(access_token=None)
+    expected = None
+    for name, decoder in decoders:
+        data, decode_time = timeit(decoder, contents)
+        if expected is None:
+            expected = data
+        assert data == expected
+        started = time.perf_counter()
+        light_api._stats_to_columns([LocalResult(i) for i in data])
+        columns_time = time.perf_counter() - started
+        print('{:<9} разбор {:.3f} сек., разбор + колонки {:.3f} сек.'
+              .format(name, decode_time, decode_time + columns_time))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
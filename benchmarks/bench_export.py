@@ -0,0 +1,64 @@
+# coding: utf-8
+"""
+Пиковая память get_stats(as_dataframe=True) и export_stats порциями.
+
+python -m benchmarks.bench_export [кол-во объектов] [кол-во дней]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from tapioca_mytarget import CsvSink, MytargetLight
+from tapioca_mytarget.tapioca_mytarget import LocalResult
+from tapioca_mytarget.testing import stats_response
+
+
+class LightApiStub(MytargetLight):
+    """
+    Отдает статистику FakeMytargetServer без HTTP сервера,
+    чтобы в пик памяти не попадали ответы сервера.
+    """
+
+    def _request_stats(self, object_type, time_mode, ids_str, params):
+        date_from = datetime.strptime(params['date_from'], '%Y-%m-%d')
+        days = len(self._period_dates(params['date_from'],
+                                      params['date_to']))
+        ids = [int(i) for i in ids_str.split(',')]
+        return LocalResult(stats_response(ids, date_from, days))
+
+
+def measure(func):
+    tracemalloc.start()
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20
+
+
+def main(objects=1000, days=92):
+    light_api = LightApiStub(access_token=None)
+    date_to = datetime(2019, 1, 1) + timedelta(days - 1)
+    params = dict(object_type=light_api.BANNER_STATS,
+                  ids=list(range(objects)), date_from='2019-01-01',
+                  date_to=date_to.strftime('%Y-%m-%d'))
+
+    elapsed, peak = measure(
+        lambda: light_api.get_stats(as_dataframe=True, **params))
+    print('get_stats(as_dataframe=True): {:.2f} сек., пик {:.0f} МБ'
+          .format(elapsed, peak))
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'stats.csv')
+        elapsed, peak = measure(lambda: light_api.export_stats(
+            CsvSink(path), chunk_rows=20000, **params))
+        print('export_stats(CsvSink, chunk_rows=20000): '
+              '{:.2f} сек., пик {:.0f} МБ'.format(elapsed, peak))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
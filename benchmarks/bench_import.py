@@ -0,0 +1,41 @@
+# coding: utf-8
+"""
+Время импорта tapioca_mytarget в новом процессе
+и проверка, что при импорте не загружается pandas.
+
+python -m benchmarks.bench_import [кол-во запусков]
+"""
+import subprocess
+import sys
+
+CODE = """
+import sys, time
+started = time.perf_counter()
+import tapioca_mytarget
+print(time.perf_counter() - started, 'pandas' in sys.modules)
+"""
+
+
+def import_time():
+    output = subprocess.check_output([sys.executable, '-c', CODE])
+    seconds, pandas_loaded = output.decode().split()
+    return float(seconds), pandas_loaded == 'True'
+
+
+def main(runs=5):
+    times = []
+    pandas_loaded = False
+    for _ in range(runs):
+        seconds, loaded = import_time()
+        times.append(seconds)
+        pandas_loaded = pandas_loaded or loaded
+
+    print('{} запусков'.format(runs))
+    print('импорт: среднее {:.3f} сек., мин. {:.3f} сек.'
+          .format(sum(times) / len(times), min(times)))
+    print('pandas загружен при импорте: {}'
+          .format('да' if pandas_loaded else 'нет'))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,49 @@
+# coding: utf-8
+"""
+Память и скорость агрегации DataFrame статистики
+без приведения типов метрик и с metric_types='float'.
+
+python -m benchmarks.bench_metric_types [кол-во ответов]
+"""
+import sys
+import time
+
+from tapioca_mytarget import MytargetLight
+from tapioca_mytarget.tapioca_mytarget import LocalResult
+from tapioca_mytarget.testing import stats_response
+
+
+def measure(light_api, results):
+    started = time.perf_counter()
+    df = light_api._stats_to_df(results)
+    convert_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    metrics = [c for c in df.columns if c not in ('date', 'id')]
+    # Без приведения типов строки с деньгами нужно приводить при агрегации.
+    df[metrics].apply(lambda column: column.astype(float)).groupby(
+        df['date']).sum()
+    aggregate_time = time.perf_counter() - started
+
+    memory = df.memory_usage(deep=True).sum() / 2 ** 20
+    return convert_time, aggregate_time, memory, len(df)
+
+
+def main(responses=5):
+    results = [LocalResult(stats_response(range(n * 200, (n + 1) * 200),
+                                          days=92))
+               for n in range(responses)]
+
+    for metric_types in (None, 'float'):
+        light_api = MytargetLight(access_token=None,
+                                  metric_types=metric_types)
+        convert_time, aggregate_time, memory, rows = measure(
+            light_api, results)
+        print('metric_types={}: {} строк, DataFrame {:.3f} сек., '
+              'агрегация {:.3f} сек., память {:.1f} МБ'
+              .format(metric_types, rows, convert_time,
+                      aggregate_time, memory))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
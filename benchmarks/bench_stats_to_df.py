@@ -0,0 +1,61 @@
+# coding: utf-8
+"""
+Сравнение MytargetLight._stats_to_df с прежней реализацией,
+которая вызывала json_normalize по каждому объекту.
+
+python -m benchmarks.bench_stats_to_df [кол-во ответов]
+"""
+import sys
+import time
+
+import pandas as pd
+
+try:
+    from pandas import json_normalize
+except ImportError:
+    from pandas.io.json import json_normalize
+
+from tapioca_mytarget import MytargetLight
+from tapioca_mytarget.tapioca_mytarget import LocalResult
+from tapioca_mytarget.testing import stats_response
+
+
+def stats_to_df_json_normalize(results):
+    df_list = []
+    for result in results:
+        result = result().data
+        for i in result['items']:
+            rows = i.get('rows') or i.get('total')
+            df_ = json_normalize(rows)
+            df_['id'] = i['id']
+            df_list.append(df_)
+    return pd.concat(df_list, sort=False).reset_index(drop=True)
+
+
+def timeit(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def main(responses=5):
+    results = [LocalResult(stats_response(range(n * 200, (n + 1) * 200),
+                                          days=92))
+               for n in range(responses)]
+    light_api = MytargetLight(access_token=None)
+
+    old, old_time = timeit(stats_to_df_json_normalize, results)
+    new, new_time = timeit(light_api._stats_to_df, results)
+
+    assert list(old.columns) == list(new.columns)
+    pd.testing.assert_frame_equal(old, new, check_dtype=False)
+
+    print('{} ответов, {} строк, {} колонок'
+          .format(responses, len(new), len(new.columns)))
+    print('json_normalize: {:.3f} сек.'.format(old_time))
+    print('по колонкам:    {:.3f} сек. (в {:.1f} раз быстрее)'
+          .format(new_time, old_time / new_time))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,66 @@
+# coding: utf-8
+"""
+Пропускная способность get_stats и get_banners на локальном сервере,
+имитирующем API myTarget, при разном кол-ве потоков.
+
+python -m benchmarks.bench_throughput [объектов] [дней] [задержка, мс] [RPS квота]
+"""
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from tapioca_mytarget import MytargetLight
+from tapioca_mytarget.testing import FakeMytargetServer
+
+WORKERS = (1, 4, 8, 16)
+
+
+def measure(server, func):
+    server.reset_counters()
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    return ('{:>5} запросов, 429: {:>3}, {:6.2f} сек., {:7.1f} запр./сек., '
+            '{:6.1f} МБ ответов'
+            .format(server.requests, server.throttled, elapsed,
+                    server.requests / elapsed, server.bytes_sent / 2 ** 20))
+
+
+def peak_memory(func):
+    # tracemalloc в несколько раз замедляет выполнение,
+    # поэтому память измеряется отдельным запуском.
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def main(objects=1000, days=92, latency_ms=50, rps=0):
+    date_to = datetime(2019, 1, 1) + timedelta(days - 1)
+    limits = {1: rps} if rps else None
+    with FakeMytargetServer(n_banners=objects, latency=latency_ms / 1000,
+                            limits=limits) as server:
+        print('{} объявлений, {} дней, задержка {} мс, квота {} запр./сек.'
+              .format(objects, days, latency_ms, rps or 'нет'))
+        for max_workers in WORKERS:
+            light_api = MytargetLight(access_token='fake',
+                                      url_root=server.url_root,
+                                      max_workers=max_workers)
+
+            def get_stats():
+                light_api.get_stats(object_type=light_api.BANNER_STATS,
+                                    ids=list(range(1, objects + 1)),
+                                    date_from='2019-01-01',
+                                    date_to=date_to.strftime('%Y-%m-%d'))
+
+            print('max_workers={:<2} get_banners: {}'.format(
+                max_workers, measure(server, light_api.get_banners)))
+            print('max_workers={:<2} get_stats:   {}'.format(
+                max_workers, measure(server, get_stats)))
+        print('пик памяти get_stats: {:.1f} МБ'.format(peak_memory(get_stats)))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
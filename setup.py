@@ -54,7 +54,13 @@ setup(
     install_requires=[
         'pandas',
         'requests-oauthlib>=0.4.2',
+        'tapioca-wrapper==2.3.0',
     ],
+    extras_require={
+        'async': ['aiohttp'],
+        'arrow': ['pyarrow'],
+        'json': ['orjson'],
+    },
     license="BSD",
     zip_safe=False,
     keywords='tapioca-mytarget',
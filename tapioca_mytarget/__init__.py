@@ -5,4 +5,18 @@ __email__ = 'vur21@ya.com'
 __version__ = '2019.4.4'
 
 
-from .tapioca_mytarget import Mytarget, MytargetLight, MytargetAuth
+from .tapioca_mytarget import (
+    Mytarget, MytargetLight, MytargetAuth, create_session)
+from .adaptive import ChunkSizer
+from .agency import MytargetAgency
+from .arrow import ParquetSink
+from .async_client import AsyncMytarget, AsyncMytargetLight
+from .backfill import StatsBackfill
+from .cache import StatsCache
+from .export import CallbackSink, CsvSink
+from .catalog import ObjectCatalog
+from .metrics import MetricsCollector
+from .rate_limit import RateLimiter
+from .retry import CircuitBreaker, RetryPolicy, RetryRule
+from .sync import StatsSync
+from .tokens import FileTokenStore, MemoryTokenStore, SQLiteTokenStore
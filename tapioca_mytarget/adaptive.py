@@ -0,0 +1,166 @@
+# coding: utf-8
+"""
+Адаптивный размер запросов статистики.
+
+Большие запросы по объектам с большой статистикой отвечают долго,
+отдают огромные ответы и падают по таймауту, а маленькие запросы
+по почти пустому аккаунту тратят квоту впустую.
+ChunkSizer по ответам оценивает время, размер ответа и кол-во строк
+на одну ячейку "объект x день" и подбирает кол-во объектов
+и дней в запросе в пределах ограничений API.
+"""
+import logging
+import threading
+
+import requests
+
+
+def is_timeout(exception):
+    """Запрос не дождался ответа или сервер ответил 504."""
+    if isinstance(exception, requests.exceptions.Timeout):
+        return True
+    return getattr(exception, 'status_code', None) == 504
+
+
+def split_request(ids, period):
+    """
+    Делит запрос пополам: сначала по объектам, а для одного объекта по дням.
+
+    :param ids: list : идентификаторы объектов
+    :param period: list : дни периода ['2019-01-01', ...] или None
+    :return: [(ids, period), (ids, period)] или [], если делить нечего
+    """
+    if len(ids) > 1:
+        middle = len(ids) // 2
+        return [(ids[:middle], period), (ids[middle:], period)]
+    if period and len(period) > 1:
+        middle = len(period) // 2
+        return [(ids, period[:middle]), (ids, period[middle:])]
+    return []
+
+
+class ChunkSizer:
+    """
+    Подбирает limit_in_request и interval по ответам API.
+
+    Из ответов с экспоненциальным сглаживанием считается время ответа
+    и размер ответа на одну ячейку "объект x день" и плотность строк.
+    Размер следующих запросов - столько ячеек, чтобы ответ уложился
+    в target_seconds и max_bytes, но меняется не больше чем в max_step раз.
+    Сначала растет кол-во объектов в запросе до 200,
+    потом длина периода до 92 дней.
+    После таймаута размер сразу уменьшается вдвое от упавшего запроса
+    и дальше не растет больше этого размера.
+
+    Один объект можно использовать в нескольких потоках и вызовах,
+    подобранный размер сохраняется между вызовами.
+
+    sizer = ChunkSizer(target_seconds=10)
+    light_api = MytargetLight(access_token=ACCESS_TOKEN, chunk_sizer=sizer,
+                              timeout=60)
+    """
+    MAX_LIMIT_IN_REQUEST = 200
+    MAX_INTERVAL = 92
+
+    def __init__(self, limit_in_request=50, interval=31,
+                 target_seconds=5.0, max_bytes=8 * 2 ** 20,
+                 max_step=2.0, smoothing=0.5):
+        """
+        :param limit_in_request: int : начальное кол-во объектов в запросе
+        :param interval: int : начальное кол-во дней в запросе
+        :param target_seconds: float : желаемое время ответа
+        :param max_bytes: int : желаемый макс. размер ответа
+        :param max_step: float : во сколько раз размер может
+            измениться за один ответ
+        :param smoothing: float : вес последнего ответа в оценках, от 0 до 1
+        """
+        if not 0 < limit_in_request <= self.MAX_LIMIT_IN_REQUEST:
+            raise ValueError('limit_in_request должен быть от 1 до {}'
+                             .format(self.MAX_LIMIT_IN_REQUEST))
+        if not 0 < interval <= self.MAX_INTERVAL:
+            raise ValueError('interval должен быть от 1 до {}'
+                             .format(self.MAX_INTERVAL))
+        self.limit_in_request = limit_in_request
+        self.interval = interval
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.max_step = max_step
+        self.smoothing = smoothing
+        # Оценки на одну ячейку "объект x день".
+        self.seconds_per_cell = None
+        self.bytes_per_cell = None
+        self.density = None
+        self.timeouts = 0
+        # Макс. кол-во ячеек после таймаутов.
+        self.max_cells = None
+        self._lock = threading.Lock()
+
+    def _smooth(self, old, new):
+        if old is None:
+            return new
+        return old + self.smoothing * (new - old)
+
+    def record(self, n_ids, days, elapsed, size=None, rows=None):
+        """
+        Учитывает успешный ответ.
+
+        :param n_ids: int : кол-во объектов в запросе
+        :param days: int : кол-во дней в запросе, 1 для суммарной статистики
+        :param elapsed: float : время ответа в секундах
+        :param size: int : размер ответа в байтах
+        :param rows: int : кол-во строк статистики в ответе
+        """
+        cells = n_ids * days
+        with self._lock:
+            self.seconds_per_cell = self._smooth(
+                self.seconds_per_cell, elapsed / cells)
+            if size is not None:
+                self.bytes_per_cell = self._smooth(
+                    self.bytes_per_cell, size / cells)
+            if rows is not None:
+                self.density = self._smooth(self.density, rows / cells)
+            self._resize(self._target_cells(), self.limit_in_request *
+                         self.interval)
+
+    def on_timeout(self, n_ids, days):
+        """Запрос из n_ids объектов за days дней не дождался ответа."""
+        cells = max(n_ids * days // 2, 1)
+        with self._lock:
+            self.timeouts += 1
+            # Время на ячейку не меньше, чем у упавшего запроса.
+            self.seconds_per_cell = max(self.seconds_per_cell or 0,
+                                        self.target_seconds / cells)
+            self.max_cells = min(self.max_cells or cells, cells)
+            self._resize(cells, cells)
+        logging.info('Таймаут запроса {} объектов за {} дней, '
+                     'размер уменьшен до {} объектов за {} дней'
+                     .format(n_ids, days, self.limit_in_request,
+                             self.interval))
+
+    def _target_cells(self):
+        targets = []
+        if self.seconds_per_cell:
+            targets.append(self.target_seconds / self.seconds_per_cell)
+        if self.bytes_per_cell:
+            targets.append(self.max_bytes / self.bytes_per_cell)
+        if not targets:
+            return self.limit_in_request * self.interval
+        return min(targets)
+
+    def _resize(self, cells, current):
+        cells = min(max(cells, current / self.max_step),
+                    current * self.max_step)
+        if self.max_cells:
+            cells = min(cells, self.max_cells)
+        limit = int(cells // self.interval)
+        if limit >= self.MAX_LIMIT_IN_REQUEST:
+            self.limit_in_request = self.MAX_LIMIT_IN_REQUEST
+            self.interval = min(
+                max(int(cells // self.MAX_LIMIT_IN_REQUEST), 1),
+                self.MAX_INTERVAL)
+        elif limit >= 1:
+            self.limit_in_request = limit
+        else:
+            # Меньше одного объекта за весь период - короче период.
+            self.limit_in_request = 1
+            self.interval = max(int(cells), 1)
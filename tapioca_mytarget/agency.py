@@ -0,0 +1,178 @@
+# coding: utf-8
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .rate_limit import RateLimiter
+from .tapioca_mytarget import MytargetAuth, MytargetLight, create_session
+
+
+class MytargetAgency:
+    """
+    Запросы по всем клиентам агентства одновременно.
+
+    Клиенты берутся из agency_clients2, для каждого клиента
+    берется свой токен через MytargetAuth.token_provider
+    и создается свой MytargetLight со своим RateLimiter,
+    т.к. квоты запросов у каждого клиента свои.
+    Токены хранятся в хранилище auth и обновляются автоматически.
+
+    agency = MytargetAgency(client_id, client_secret,
+                            access_token=AGENCY_ACCESS_TOKEN, max_clients=8)
+    df = agency.get_stats(date_from='2019-01-01', date_to='2019-01-31',
+                          as_dataframe=True)
+    """
+    light_api_class = MytargetLight
+
+    def __init__(self, client_id, client_secret, access_token=None,
+                 max_clients=4, is_sandbox=False, session=None, auth=None,
+                 **light_kwargs):
+        """
+        :param client_id: str : client_id приложения агентства
+        :param client_secret: str : client_secret приложения агентства
+        :param access_token: str : токен агентства, нужен для получения
+            списка клиентов, если он не передается в методы.
+        :param max_clients: int : кол-во клиентов, обрабатываемых одновременно
+        :param session: requests.Session : общая сессия для всех клиентов,
+            если не указана, то будет создана с пулом не меньше
+            max_clients * max_workers.
+        :param auth: MytargetAuth : с хранилищем токенов,
+            чтобы токены клиентов сохранялись между запусками.
+        :param light_kwargs: параметры MytargetLight для каждого клиента
+            и для запросов агентства, например max_workers, metric_types.
+        """
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.max_clients = max_clients
+        self.light_kwargs = light_kwargs
+        if session is None:
+            session = create_session(pool_maxsize=max(
+                max_clients * light_kwargs.get('max_workers', 1), 10))
+        self.session = session
+        self.auth = auth or MytargetAuth(is_sandbox=is_sandbox,
+                                         session=session)
+        self.agency_api = None
+        if access_token:
+            self.agency_api = self.light_api_class(
+                access_token=access_token, session=session,
+                **light_kwargs)
+        self.errors = {}
+        self._token_providers = {}
+        self._rate_limiters = {}
+        self._lock = threading.Lock()
+
+    def clients(self, statuses=('active',)):
+        """
+        Клиенты агентства.
+
+        :param statuses: list : статусы клиентов, None - все
+        :return: ['username', ...]
+        """
+        if self.agency_api is None:
+            raise ValueError('Для получения клиентов укажите access_token '
+                             'агентства или передайте usernames')
+        # Клиенты запрашиваются по страницам, как объекты.
+        data = self.agency_api._request_objects(
+            self.agency_api.low_api.agency_clients2(), as_dataframe=False)
+        return [i['user']['username'] for i in data
+                if not statuses or i.get('status') in statuses]
+
+    def client_token_provider(self, username):
+        """TokenProvider клиента, один на клиента."""
+        with self._lock:
+            if username not in self._token_providers:
+                self._token_providers[username] = self.auth.token_provider(
+                    self.client_id, self.client_secret,
+                    agency_client_name=username)
+            return self._token_providers[username]
+
+    def client_rate_limiter(self, username):
+        """
+        RateLimiter клиента, один на клиента,
+        чтобы повторные run по клиенту учитывали уже потраченную квоту.
+        """
+        with self._lock:
+            if username not in self._rate_limiters:
+                self._rate_limiters[username] = RateLimiter()
+            return self._rate_limiters[username]
+
+    def client_api(self, username):
+        """MytargetLight клиента со своим ограничителем запросов."""
+        return self.light_api_class(
+            access_token=None,
+            token_provider=self.client_token_provider(username),
+            session=self.session,
+            rate_limiter=self.client_rate_limiter(username),
+            **self.light_kwargs)
+
+    def run(self, func, usernames=None):
+        """
+        Вызывает func(light_api) для каждого клиента,
+        одновременно не больше max_clients клиентов.
+
+        Ошибка одного клиента не останавливает остальных,
+        ошибки сохраняются в self.errors.
+
+        :param func: callable : принимает MytargetLight клиента
+        :param usernames: list : клиенты, по умолчанию все активные
+        :return: {username: результат func, ...} без клиентов с ошибками
+        """
+        if usernames is None:
+            usernames = self.clients()
+        self.errors = {}
+
+        def run_client(username):
+            try:
+                return func(self.client_api(username))
+            except Exception as e:
+                logging.error('Клиент {}: {!r}'.format(username, e))
+                self.errors[username] = e
+
+        with ThreadPoolExecutor(max_workers=self.max_clients) as executor:
+            results = list(executor.map(run_client, usernames))
+        return {username: result
+                for username, result in zip(usernames, results)
+                if username not in self.errors}
+
+    def _union(self, results, as_dataframe):
+        """Объединяет результаты клиентов, добавляя username."""
+        if as_dataframe:
+            import pandas as pd
+
+            frames = [df.assign(username=username)
+                      for username, df in results.items()]
+            if not frames:
+                return pd.DataFrame()
+            return pd.concat(frames, sort=False).reset_index(drop=True)
+
+        union = []
+        for username, items in results.items():
+            union += [dict(item, username=username) for item in items]
+        return union
+
+    def get_stats(self, usernames=None, as_dataframe=False, **kwargs):
+        """
+        Статистика всех клиентов, параметры те же, что у
+        MytargetLight.get_stats, кроме is_union_results.
+
+        :return: DataFrame с колонкой username или
+            [{"id": ..., "rows": [...], "username": ...}, ...]
+        """
+        results = self.run(
+            lambda light_api: light_api.get_stats(
+                as_dataframe=as_dataframe, **kwargs), usernames)
+        return self._union(results, as_dataframe)
+
+    def get_campaigns(self, usernames=None, as_dataframe=False, **kwargs):
+        """Кампании всех клиентов, см. MytargetLight.get_campaigns"""
+        results = self.run(
+            lambda light_api: light_api.get_campaigns(
+                as_dataframe=as_dataframe, **kwargs), usernames)
+        return self._union(results, as_dataframe)
+
+    def get_banners(self, usernames=None, as_dataframe=False, **kwargs):
+        """Объявления всех клиентов, см. MytargetLight.get_banners"""
+        results = self.run(
+            lambda light_api: light_api.get_banners(
+                as_dataframe=as_dataframe, **kwargs), usernames)
+        return self._union(results, as_dataframe)
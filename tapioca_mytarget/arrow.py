@@ -0,0 +1,198 @@
+# coding: utf-8
+"""
+Вывод статистики и объектов в Apache Arrow и Parquet.
+
+pyarrow не обязательная зависимость и импортируется
+только при вызове этих функций.
+"""
+import json
+import logging
+from datetime import datetime
+
+from .schema import DATE, DATETIME, FLOAT, INT, column_type, stats_columns
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Для вывода в Arrow и Parquet установите pyarrow: '
+                          'pip install tapioca-mytarget[arrow]')
+    return pyarrow
+
+
+def _arrow_type(pa, kind):
+    return {INT: pa.int64(),
+            FLOAT: pa.float64(),
+            DATE: pa.date32(),
+            DATETIME: pa.timestamp('s')}.get(kind, pa.string())
+
+
+def _to_python(value, kind):
+    """Приведение одного значения, если колонку не удалось привести целиком."""
+    if value is None or value == '':
+        return None
+    if kind == INT:
+        return int(value)
+    if kind == FLOAT:
+        return float(value)
+    if kind == DATE:
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    if kind == DATETIME:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _array(pa, values, kind):
+    arrow_type = _arrow_type(pa, kind)
+    try:
+        # Строки с числами и датами приводятся средствами Arrow.
+        return pa.array(values).cast(arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError,
+            pa.ArrowTypeError, TypeError):
+        return pa.array([_to_python(v, kind) for v in values],
+                        type=arrow_type)
+
+
+def columns_table(columns, schema=None):
+    """
+    Таблица Arrow из колонок.
+
+    Типы колонок берутся из schema.column_type,
+    колонки с неизвестным типом сохраняются строками,
+    вложенные списки и словари - в JSON.
+
+    :param columns: dict : {'date': [...], 'base.shows': [...], ...}
+    :param schema: pyarrow.Schema : если указана, то таблица
+        приводится к ней, отсутствующие колонки заполняются null.
+    :return: pyarrow.Table
+    """
+    pa = _import_pyarrow()
+    table = pa.Table.from_arrays(
+        [_array(pa, values, column_type(name))
+         for name, values in columns.items()],
+        names=list(columns))
+    if schema is not None:
+        table = conform_table(table, schema)
+    return table
+
+
+def stats_schema(metrics=None, with_date=True):
+    """
+    Схема Arrow статистики по группам метрик из schema.METRICS,
+    колонки те же, что в schema.stats_columns.
+    Групп, которых нет в schema.METRICS, в схеме нет,
+    ParquetSink добавит их колонки из первой таблицы.
+
+    :param metrics: str, list : группы метрик, как в get_stats,
+        None - только base, как отдает API, 'all' - все группы
+    :param with_date: bool : с колонкой date, для статистики по дням
+    :return: pyarrow.Schema
+    """
+    pa = _import_pyarrow()
+    return pa.schema([pa.field(name, _arrow_type(pa, column_type(name)))
+                      for name in stats_columns(metrics, with_date)])
+
+
+def conform_table(table, schema, strict=False):
+    """
+    Приводит таблицу к схеме.
+
+    :param strict: bool : если в таблице есть колонки, которых нет
+        в схеме, то ValueError, иначе они отбрасываются с предупреждением.
+    """
+    pa = _import_pyarrow()
+    extra = set(table.column_names) - set(schema.names)
+    if extra and strict:
+        raise ValueError('Колонок {} нет в схеме файла. Укажите схему '
+                         'со всеми колонками, например stats_schema(metrics)'
+                         .format(', '.join(sorted(extra))))
+    if extra:
+        logging.warning('Колонок {} нет в схеме, они не будут записаны'
+                        .format(', '.join(sorted(extra))))
+    arrays = [table.column(field.name).cast(field.type)
+              if field.name in table.column_names
+              else pa.nulls(table.num_rows, field.type)
+              for field in schema]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class ParquetSink:
+    """
+    Запись таблиц Arrow в Parquet по мере их получения.
+
+    Схема файла задается заранее через schema или берется
+    из первой таблицы, следующие таблицы приводятся к ней.
+    Колонки первой таблицы, которых нет в schema, например метрики,
+    не известные schema.METRICS, добавляются в схему файла.
+    Если в таблице появились колонки, которых нет в схеме, например
+    группа метрик events началась не с первого дня, то ValueError,
+    чтобы данные не терялись молча.
+    Без partition_by все таблицы пишутся в один файл,
+    с partition_by - в папку по значениям колонок,
+    каждая таблица в отдельные файлы.
+
+    with ParquetSink('stats.parquet',
+                     schema=stats_schema('base,events')) as sink:
+        sink.write(table)
+    """
+
+    def __init__(self, path, partition_by=None, schema=None, strict=True):
+        """
+        :param path: str : путь к файлу или папке, если указан partition_by
+        :param partition_by: str, list : колонки для разбиения, например 'date'
+        :param schema: pyarrow.Schema : схема файла, см. stats_schema
+        :param strict: bool : False - колонки, которых нет в схеме,
+            отбрасываются с предупреждением, а не вызывают ValueError.
+        """
+        if isinstance(partition_by, str):
+            partition_by = [partition_by]
+        self.path = path
+        self.partition_by = partition_by
+        self.schema = schema
+        self.strict = strict
+        self.rows = 0
+        self._writer = None
+        self._parts = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, table):
+        pa = _import_pyarrow()
+        if self.schema is None:
+            self.schema = table.schema
+        elif self._writer is None and not self._parts:
+            # Файл еще не открыт, схему можно дополнить.
+            self.schema = pa.schema(
+                list(self.schema) + [field for field in table.schema
+                                     if field.name not in self.schema.names])
+            table = conform_table(table, self.schema, self.strict)
+        else:
+            table = conform_table(table, self.schema, self.strict)
+
+        if self.partition_by:
+            pa.parquet.write_to_dataset(
+                table, self.path, partition_cols=self.partition_by,
+                basename_template='part-{}-{{i}}.parquet'.format(self._parts))
+            self._parts += 1
+        else:
+            if self._writer is None:
+                self._writer = pa.parquet.ParquetWriter(self.path, self.schema)
+            self._writer.write_table(table)
+        self.rows += table.num_rows
+
+    def write_columns(self, columns):
+        """Запись порции колонок, см. export."""
+        self.write(columns_table(columns))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
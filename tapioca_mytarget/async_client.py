@@ -0,0 +1,460 @@
+# coding: utf-8
+import asyncio
+import functools
+import json
+import time
+
+from tapioca_mytarget import exceptions
+from .metrics import RESPONSE, RETRY, emit, request_event, resource_name
+from .rate_limit import RateLimiter
+from .resource_mapping import RESOURCE_MAPPING
+from .tapioca_mytarget import MytargetClientAdapter, MytargetLightBase
+
+
+def _import_aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise ImportError('Для асинхронного клиента установите aiohttp: '
+                          'pip install tapioca-mytarget[async]')
+    return aiohttp
+
+
+class AsyncResponse:
+    """
+    Ответ aiohttp, приведенный к интерфейсу requests.Response,
+    который используют исключения из exceptions.
+    """
+
+    def __init__(self, status_code, reason, headers, url, content):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.url = url
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AsyncResult:
+    """
+    Результат запроса асинхронного клиента.
+    Как и у Tapioca, данные доступны через result().data
+    """
+
+    def __init__(self, adapter, data, response):
+        self._adapter = adapter
+        self.data = data
+        self.response = response
+
+    def __call__(self):
+        return self
+
+    @property
+    def status_code(self):
+        return self.response.status_code
+
+    def to_df(self):
+        return self._adapter.to_df(self.data)
+
+
+class AsyncClientAdapter(MytargetClientAdapter):
+    def wait_rate_limit(self, api_params):
+        # Ожидание выполняет AsyncMytarget, не блокируя цикл событий.
+        pass
+
+
+class AsyncResource:
+    """Ресурс из RESOURCE_MAPPING с асинхронными методами запросов."""
+
+    def __init__(self, api, url, resource):
+        self._api = api
+        self._url = url
+        self._resource = resource
+
+    async def get(self, *args, **kwargs):
+        return await self._api.request('GET', self._url, *args, **kwargs)
+
+    async def post(self, *args, **kwargs):
+        return await self._api.request('POST', self._url, *args, **kwargs)
+
+    async def put(self, *args, **kwargs):
+        return await self._api.request('PUT', self._url, *args, **kwargs)
+
+    async def patch(self, *args, **kwargs):
+        return await self._api.request('PATCH', self._url, *args, **kwargs)
+
+    async def delete(self, *args, **kwargs):
+        return await self._api.request('DELETE', self._url, *args, **kwargs)
+
+
+class AsyncMytarget:
+    def __init__(self, access_token=None, retry_request_if_limit=True,
+                 language='ru', session=None, max_workers=10, **kwargs):
+        """
+        Асинхронный низкоуровневый API на aiohttp.
+
+        Ресурсы, заголовки авторизации и обработка ошибок
+        те же, что у Mytarget.
+
+        :param access_token: str : токен доступа
+        :param retry_request_if_limit: bool : ожидать и повторять запрос,
+            если закончилась квота запросов к апи.
+        :param language: str : ru|en|{other} :
+            язык в котором будут возвращены некоторые данные, например справочников.
+        :param session: aiohttp.ClientSession : если не указана,
+            будет создана и закрыта в close()
+        :param max_workers: int : макс. кол-во одновременных запросов
+        :param rate_limiter: RateLimiter : ограничитель частоты запросов
+        :param token_provider: TokenProvider : источник токена,
+            запрос с ответом 401 повторяется один раз с новым токеном.
+        :param retry_policy: RetryPolicy : повтор запросов при ответах 5xx,
+            обрывах соединения и таймаутах.
+
+        async with AsyncMytarget(access_token=ACCESS_TOKEN) as api:
+            result = await api.user2().get()
+            data = result().data
+        """
+        self._adapter = AsyncClientAdapter()
+        self._api_params = dict(access_token=access_token,
+                                retry_request_if_limit=retry_request_if_limit,
+                                language=language, **kwargs)
+        self._session = session
+        self._own_session = session is None
+        self.max_workers = max_workers
+        self._semaphore = None
+
+    def __getattr__(self, name):
+        if name not in RESOURCE_MAPPING:
+            raise AttributeError(name)
+        resource = RESOURCE_MAPPING[name]
+
+        def resource_client(**url_params):
+            url = self._adapter.get_api_root(self._api_params) + \
+                  self._adapter.fill_resource_template_url(
+                      resource['resource'], url_params)
+            return AsyncResource(self, url, resource)
+
+        return resource_client
+
+    def __dir__(self):
+        return list(super().__dir__()) + list(RESOURCE_MAPPING.keys())
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            aiohttp = _import_aiohttp()
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    def _get_semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        return self._semaphore
+
+    async def _wait_rate_limit(self):
+        rate_limiter = self._api_params.get('rate_limiter')
+        if rate_limiter:
+            while True:
+                wait = rate_limiter.reserve()
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+
+    async def _send(self, method, request_kwargs):
+        async with self._get_semaphore():
+            await self._wait_rate_limit()
+            async with self._get_session().request(
+                    method, **request_kwargs) as resp:
+                content = await resp.read()
+                return AsyncResponse(resp.status, resp.reason,
+                                     resp.headers, str(resp.url), content)
+
+    async def _send_with_retry(self, method, request_kwargs):
+        retry_policy = self._api_params.get('retry_policy')
+        if retry_policy is None:
+            return await self._send(method, request_kwargs)
+
+        def on_retry(error_class, delay):
+            url = request_kwargs['url']
+            emit(self._api_params.get('hooks'), {
+                'type': RETRY, 'resource': resource_name(url),
+                'method': method, 'url': url, 'delay': delay,
+                'reason': error_class, 'time': time.time()})
+
+        return await retry_policy.call_async(
+            method, lambda: self._send(method, request_kwargs), on_retry)
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        """
+        С token_provider получение токена может отправить
+        синхронный запрос, поэтому вызов выполняется в потоке,
+        чтобы не останавливать остальные запросы в цикле событий.
+        """
+        if not self._api_params.get('token_provider'):
+            return func(*args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(func, *args, **kwargs))
+
+    async def request(self, method, url, params=None, data=None, **kwargs):
+        request_kwargs = await self._run_blocking(
+            self._adapter.get_request_kwargs, self._api_params, method,
+            url=url, params=params, data=data, **kwargs)
+        token_refreshed = False
+        hooks = self._api_params.get('hooks')
+        while True:
+            started = time.perf_counter()
+            response = await self._send_with_retry(method, request_kwargs)
+            rate_limiter = self._api_params.get('rate_limiter')
+            if rate_limiter:
+                rate_limiter.update_from_headers(response.headers)
+            if hooks:
+                emit(hooks, request_event(
+                    RESPONSE, response, method=method,
+                    elapsed=time.perf_counter() - started))
+            if response.status_code < 400:
+                return AsyncResult(self._adapter,
+                                   self._adapter.loads(response.content),
+                                   response)
+
+            try:
+                response_data = self._adapter.loads(response.content)
+            except ValueError:
+                # Например HTML страница прокси при ответах 502 и 504.
+                response_data = None
+
+            if response.status_code == 429:
+                delay = self._adapter.limit_retry_delay(
+                    response_data, self._api_params)
+                if delay is not None:
+                    emit(hooks, request_event(
+                        RETRY, response, method=method, delay=delay,
+                        reason='limit'))
+                    await asyncio.sleep(delay)
+                    continue
+
+            if response.status_code == 401 and not token_refreshed and \
+                    await self._run_blocking(
+                        self._adapter.refresh_authentication,
+                        self._api_params):
+                # Повтор один раз с новым токеном.
+                token_refreshed = True
+                request_kwargs = await self._run_blocking(
+                    self._adapter.get_request_kwargs, self._api_params,
+                    method, url=url, params=params, data=data, **kwargs)
+                continue
+
+            self._adapter.wrapper_call_exception(
+                response, exceptions.MytargetApiError(response),
+                self._api_params)
+
+
+class AsyncMytargetLight(MytargetLightBase):
+    def __init__(self, access_token,
+                 as_dataframe=False,
+                 retry_request_if_limit=True,
+                 language='ru',
+                 max_workers=10,
+                 rate_limiter=None,
+                 metric_types=None,
+                 **kwargs):
+        """
+        Асинхронная обертка над классом AsyncMytarget.
+
+        Параметры те же, что у MytargetLight, кроме session, cache,
+        catalog и chunk_sizer: методы, которые их используют,
+        есть только у MytargetLight.
+        Страницы объектов и запросы статистики отправляются одновременно,
+        но не более max_workers запросов за раз.
+
+        async with AsyncMytargetLight(access_token=ACCESS_TOKEN) as light_api:
+            df = await light_api.get_stats(as_dataframe=True)
+        """
+        if rate_limiter is None and retry_request_if_limit:
+            rate_limiter = RateLimiter()
+        self.rate_limiter = rate_limiter
+        self.low_api = AsyncMytarget(
+            access_token=access_token,
+            retry_request_if_limit=retry_request_if_limit,
+            language=language, max_workers=max_workers,
+            rate_limiter=rate_limiter, **kwargs)
+        self.as_dataframe = as_dataframe
+        self.max_workers = max_workers
+        self.metric_types = metric_types
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        await self.low_api.close()
+
+    async def _request_objects(self, method, limit=None, params=None,
+                               limit_in_request=50, as_dataframe=False):
+        """
+        Метод запрашивает все объекты.
+        После первого запроса остальные страницы запрашиваются одновременно.
+        """
+        if params and params.get('limit'):
+            raise ValueError('Укажите limit при вызове метода, а не в параметре.')
+        params = params or {}
+        offset = params.get('offset') or 0
+        if limit and limit_in_request > limit:
+            limit_in_request = limit
+
+        first = await method.get(
+            params={**params, 'limit': limit_in_request, 'offset': offset})
+        results = [first]
+
+        count = first().data.get('count')
+        if count:
+            pages = self._page_offsets(count, offset, limit, limit_in_request)
+            results += await asyncio.gather(*[
+                method.get(params={**params, 'limit': page_limit,
+                                   'offset': page_offset})
+                for page_offset, page_limit in pages])
+
+        return self._to_format(self._request_objects.__name__,
+                               results, as_dataframe=as_dataframe)
+
+    async def _get_objects_for_request_stats(self, object_type, limit):
+        if object_type == self.CAMPAIGN_STATS:
+            data = await self.get_campaigns(
+                limit=limit, as_dataframe=False, params={'fields': 'id'})
+            ids = [i['id'] for i in data]
+
+        elif object_type == self.BANNER_STATS:
+            data = await self.get_banners(
+                limit=limit, as_dataframe=False, params={'fields': 'id'})
+            ids = [i['id'] for i in data]
+
+        elif object_type == self.USER_STATS:
+            r = await self.low_api.user2().get()
+            ids = [r().data['id']]
+        else:
+            raise ValueError('Не известный object_type, '
+                             'разерешены только: {}, {}, {}'
+                             .format(self.CAMPAIGN_STATS,
+                                     self.BANNER_STATS,
+                                     self.USER_STATS))
+        return ids
+
+    async def get_stats(self, object_type=MytargetLightBase.CAMPAIGN_STATS,
+                        date_from=None, date_to=None, metrics=None,
+                        ids=None, as_dataframe=None, limit=None,
+                        limit_in_request=200, interval=92,
+                        is_union_results=True):
+        """
+        https://target.my.com/adv/api-marketing/doc/stat-v2
+
+        Параметры и формат ответа те же, что у MytargetLight.get_stats
+        """
+        self._check_stats_params(limit_in_request, interval)
+
+        if not ids:
+            ids = await self._get_objects_for_request_stats(
+                object_type, limit=limit)
+
+        time_mode, requests_params = self._stats_requests_params(
+            ids, date_from, date_to, metrics, limit_in_request, interval)
+
+        results = await asyncio.gather(*[
+            self.low_api.stats2(object_type=object_type,
+                                time_mode=time_mode, ids=ids_str)
+                .get(params=params)
+            for ids_str, params in requests_params])
+
+        return self._to_format(self.get_stats.__name__, list(results),
+                               as_dataframe, is_union_results)
+
+    async def get_campaigns(self, params=None, as_dataframe=None,
+                            limit=None, limit_in_request=50):
+        """
+        https://target.my.com/doc/apiv2/ru/resources/campaigns.html
+
+        Параметры те же, что у MytargetLight.get_campaigns
+        """
+        return await self._request_objects(
+            method=self.low_api.campaigns2(), limit=limit, params=params,
+            limit_in_request=limit_in_request, as_dataframe=as_dataframe)
+
+    async def get_banners(self, params=None, as_dataframe=None,
+                          limit=None, limit_in_request=50):
+        """
+        https://target.my.com/doc/apiv2/ru/resources/banners.html
+
+        Параметры те же, что у MytargetLight.get_banners
+        """
+        return await self._request_objects(
+            method=self.low_api.banners2(), limit=limit, params=params,
+            limit_in_request=limit_in_request, as_dataframe=as_dataframe)
+
+    async def _mass_action(self, method, changes, limit_in_request=200,
+                           as_dataframe=None):
+        """
+        Изменение объектов через mass_action, см. MytargetLight._mass_action.
+        Запросы и части отклоненных запросов отправляются одновременно,
+        но не более max_workers запросов за раз.
+        """
+        async def send(chunk):
+            try:
+                await method().post(data=chunk)
+            except Exception as e:
+                return self._mass_action_failure(e)
+            return None
+
+        async def check(chunk, failure):
+            halves = self._mass_action_halves(chunk, failure)
+            if halves is None:
+                return self._mass_action_results(chunk, failure)
+            failures = self._mass_action_stop_split(
+                await asyncio.gather(*[send(half) for half in halves]))
+            first, second = await asyncio.gather(
+                check(halves[0], failures[0]), check(halves[1], failures[1]))
+            return first + second
+
+        async def run(chunk):
+            return await check(chunk, await send(chunk))
+
+        chunks = self._mass_action_chunks(changes, limit_in_request)
+        results = await asyncio.gather(*[run(chunk) for chunk in chunks])
+        return self._mass_action_report(results, as_dataframe)
+
+    async def update_campaigns(self, changes, limit_in_request=200,
+                               as_dataframe=None):
+        """
+        https://target.my.com/doc/apiv2/ru/resources/campaigns.mass_action.html
+
+        Параметры и формат отчета те же, что у MytargetLight.update_campaigns
+        """
+        return await self._mass_action(
+            self.low_api.campaigns_mass_action2, changes, limit_in_request,
+            as_dataframe)
+
+    async def update_banners(self, changes, limit_in_request=200,
+                             as_dataframe=None):
+        """
+        https://target.my.com/doc/apiv2/ru/resources/banners.mass_action.html
+
+        Параметры и формат отчета те же, что у MytargetLight.update_banners
+        """
+        return await self._mass_action(
+            self.low_api.banners_mass_action2, changes, limit_in_request,
+            as_dataframe)
@@ -0,0 +1,202 @@
+# coding: utf-8
+import gzip
+import json
+import logging
+import os
+from datetime import date, datetime
+
+from .tapioca_mytarget import LocalResult
+
+
+class StatsBackfill:
+    """
+    Загрузка статистики за большой период с сохранением прогресса.
+
+    План запросов (группы объектов x периоды) сохраняется в manifest.json,
+    ответ каждого запроса - в отдельный файл chunks/000001.json.gz
+    сразу после получения. При повторном запуске загруженные части
+    пропускаются и загрузка продолжается с первой незагруженной,
+    поэтому после сбоя квота не тратится на уже полученные данные.
+    В памяти одновременно не больше max_workers ответов.
+
+    backfill = StatsBackfill(light_api, 'backfill_banners_2018')
+    backfill.run(object_type=light_api.BANNER_STATS,
+                 date_from='2018-01-01', date_to='2019-12-31')
+    # После сбоя тот же вызов или просто backfill.run()
+    backfill.export(CsvSink('stats.csv'))
+    """
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, light_api, path):
+        """
+        :param light_api: MytargetLight
+        :param path: str : папка выгрузки
+        """
+        self.light_api = light_api
+        self.path = path
+        self.errors = {}
+        self._manifest = None
+
+    def _chunk_path(self, n):
+        return os.path.join(self.path, 'chunks', '{:06d}.json.gz'.format(n))
+
+    def _write(self, path, data, opener=open):
+        # Файл пишется во временный и заменяется целиком,
+        # поэтому после сбоя не остается недописанных частей.
+        tmp_path = path + '.tmp'
+        with opener(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def manifest(self):
+        """
+        План выгрузки или None, если его еще нет.
+
+        :return: {"job": {параметры}, "time_mode": "day",
+                  "chunks": [["1,2,3", {"date_from": ..., ...}], ...]}
+        """
+        if self._manifest is None:
+            path = os.path.join(self.path, self.MANIFEST)
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    self._manifest = json.load(f)
+        return self._manifest
+
+    def plan(self, object_type, date_from, date_to, metrics=None, ids=None,
+             limit_in_request=200, interval=92, plan_by_lifetime=False,
+             max_workers=None):
+        """
+        Создает план выгрузки, если его еще нет.
+        Параметры те же, что у MytargetLight.get_stats.
+
+        Список объектов запоминается в плане, поэтому объекты,
+        созданные после начала выгрузки, не сдвигают части.
+
+        :param date_to: str : YYYY-MM-DD : обязателен, чтобы при
+            продолжении на следующий день план не изменился.
+        :return: dict : см. manifest
+        """
+        if isinstance(date_from, (date, datetime)):
+            date_from = date_from.strftime('%Y-%m-%d')
+        if isinstance(date_to, (date, datetime)):
+            date_to = date_to.strftime('%Y-%m-%d')
+        if isinstance(metrics, list):
+            metrics = ','.join(map(str, metrics))
+        job = {'object_type': object_type, 'date_from': date_from,
+               'date_to': date_to, 'metrics': metrics,
+               'ids': list(ids) if ids else None,
+               'limit_in_request': limit_in_request, 'interval': interval,
+               'plan_by_lifetime': plan_by_lifetime}
+
+        manifest = self.manifest()
+        if manifest is not None:
+            if manifest['job'] != job:
+                raise ValueError('В папке {} уже есть выгрузка с другими '
+                                 'параметрами: {}'
+                                 .format(self.path, manifest['job']))
+            return manifest
+
+        time_mode, requests_params, _ = self.light_api._plan_stats(
+            object_type, date_from, date_to, metrics, ids, None,
+            limit_in_request, interval, max_workers, plan_by_lifetime)
+        manifest = {'job': job, 'time_mode': time_mode,
+                    'chunks': [[ids_str, params]
+                               for ids_str, params in requests_params]}
+        os.makedirs(os.path.join(self.path, 'chunks'), exist_ok=True)
+        self._write(os.path.join(self.path, self.MANIFEST), manifest)
+        self._manifest = manifest
+        logging.info('План выгрузки: {} запросов'
+                     .format(len(manifest['chunks'])))
+        return manifest
+
+    def pending(self):
+        """Номера незагруженных частей по порядку плана."""
+        manifest = self.manifest()
+        if manifest is None:
+            return []
+        return [n for n in range(len(manifest['chunks']))
+                if not os.path.exists(self._chunk_path(n))]
+
+    def status(self):
+        """:return: {"chunks": 100, "done": 40, "pending": 60}"""
+        manifest = self.manifest()
+        total = len(manifest['chunks']) if manifest else 0
+        pending = len(self.pending())
+        return {'chunks': total, 'done': total - pending, 'pending': pending}
+
+    def run(self, max_workers=None, **job):
+        """
+        Загружает незагруженные части плана.
+
+        Если часть не загрузилась, то новые запросы не отправляются,
+        уже отправленные дожидаются и сохраняются, а ошибка
+        пробрасывается. Следующий запуск начнется с этой части.
+
+        :param job: параметры plan, если план еще не создан
+        :return: int : кол-во загруженных частей
+        """
+        if job:
+            self.plan(max_workers=max_workers, **job)
+        manifest = self.manifest()
+        if manifest is None:
+            raise ValueError('Нет плана выгрузки, укажите параметры '
+                             'object_type, date_from, date_to')
+
+        object_type = manifest['job']['object_type']
+        request_stats = self.light_api._stats_request_func(
+            object_type, manifest['time_mode'])
+
+        def load_chunk(n):
+            ids_str, params = manifest['chunks'][n]
+            try:
+                result = request_stats((ids_str, params))
+                self._write(self._chunk_path(n), result().data, gzip.open)
+            except Exception as e:
+                return n, e
+            return n, None
+
+        pending = self.pending()
+        if pending:
+            logging.info('Выгрузка {} из {} запросов, начиная с {}'
+                         .format(len(pending), len(manifest['chunks']),
+                                 pending[0]))
+        self.errors = {}
+        loaded = 0
+        chunks = self.light_api._imap(load_chunk, pending, max_workers)
+        try:
+            for n, error in chunks:
+                if error is None:
+                    loaded += 1
+                    continue
+                logging.error('Часть {} не загружена: {!r}'.format(n, error))
+                self.errors[n] = error
+                break
+        finally:
+            # Части, которые уже были в работе, дожидаются и сохраняются.
+            chunks.close()
+        if self.errors:
+            raise next(iter(self.errors.values()))
+        return loaded
+
+    def results(self):
+        """Генератор ответов загруженных частей по порядку плана."""
+        manifest = self.manifest() or {'chunks': []}
+        for n in range(len(manifest['chunks'])):
+            path = self._chunk_path(n)
+            if os.path.exists(path):
+                with gzip.open(path, 'rt', encoding='utf-8') as f:
+                    yield LocalResult(json.load(f))
+
+    def export(self, sink, chunk_rows=100000):
+        """
+        Выгружает загруженную статистику порциями,
+        см. MytargetLight.export_stats.
+
+        :return: int : кол-во выгруженных строк
+        """
+        return self.light_api._export_results(sink, self.results(),
+                                              chunk_rows)
+
+    def to_df(self):
+        """Загруженная статистика в формате DataFrame."""
+        return self.light_api._stats_to_df(list(self.results()))
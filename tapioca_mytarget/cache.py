@@ -0,0 +1,83 @@
+# coding: utf-8
+import json
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+
+class StatsCache:
+    """
+    Кэш статистики по дням в SQLite.
+
+    Статистика за прошедшие дни почти не меняется, поэтому строки
+    за дни старше settled_days хранятся локально и повторно не запрашиваются.
+    Строки за последние дни всегда запрашиваются заново.
+
+    cache = StatsCache('stats_cache.sqlite', settled_days=3)
+    light_api = MytargetLight(access_token=ACCESS_TOKEN, cache=cache)
+    """
+
+    def __init__(self, path=':memory:', settled_days=3):
+        """
+        :param path: str : путь к файлу SQLite, по умолчанию кэш в памяти
+        :param settled_days: int : через сколько дней статистика за день
+            считается окончательной и сохраняется в кэш.
+        """
+        self.settled_days = settled_days
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS stats ('
+                'object_type TEXT, time_mode TEXT, id INTEGER, '
+                'date TEXT, metrics TEXT, row TEXT, '
+                'PRIMARY KEY (object_type, time_mode, metrics, id, date))')
+
+    def close(self):
+        self._connection.close()
+
+    def settled_date(self):
+        """Последний день, статистика за который считается окончательной."""
+        return (date.today() - timedelta(self.settled_days)) \
+            .strftime('%Y-%m-%d')
+
+    def get(self, object_type, time_mode, metrics, ids, date_from, date_to):
+        """
+        Строки статистики из кэша.
+
+        :return: {id: {'2019-01-01': row, ...}, ...}
+        """
+        ids = [int(i) for i in ids]
+        data = {}
+        with self._lock:
+            # Не больше 200 идентификаторов в запросе статистики,
+            # поэтому они помещаются в лимит параметров SQLite.
+            cursor = self._connection.execute(
+                'SELECT id, date, row FROM stats '
+                'WHERE object_type = ? AND time_mode = ? AND metrics = ? '
+                'AND date BETWEEN ? AND ? AND id IN ({})'
+                .format(','.join('?' * len(ids))),
+                [object_type, time_mode, metrics or '',
+                 date_from, date_to] + ids)
+            for object_id, day, row in cursor:
+                data.setdefault(object_id, {})[day] = json.loads(row)
+        return data
+
+    def put(self, object_type, time_mode, metrics, items):
+        """
+        Сохраняет строки статистики за окончательные дни.
+
+        :param items: [{"id": 857683, "rows": [{"date": "2017-09-20", ...}]}]
+        """
+        settled_date = self.settled_date()
+        values = [
+            (object_type, time_mode, metrics or '', item['id'],
+             row['date'], json.dumps(row))
+            for item in items
+            for row in item.get('rows') or []
+            if row.get('date') and row['date'] <= settled_date]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO stats '
+                '(object_type, time_mode, metrics, id, date, row) '
+                'VALUES (?, ?, ?, ?, ?, ?)', values)
@@ -0,0 +1,147 @@
+# coding: utf-8
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+
+class ObjectCatalog:
+    """
+    Локальный каталог кампаний и баннеров в SQLite.
+
+    При обновлении запрашиваются только объекты, измененные
+    после последнего сохраненного времени updated.
+    Если передать каталог в MytargetLight, то get_stats берет
+    идентификаторы объектов из него, а не запрашивает все объекты.
+
+    catalog = ObjectCatalog('objects.sqlite')
+    light_api = MytargetLight(access_token=ACCESS_TOKEN, catalog=catalog)
+    """
+    CAMPAIGNS = 'campaigns'
+    BANNERS = 'banners'
+    # Фильтр по времени изменения объекта.
+    UPDATED_FILTERS = {CAMPAIGNS: '_last_updated__gte',
+                       BANNERS: '_updated__gte'}
+    FIELDS = {CAMPAIGNS: 'id,status,updated,created,date_start,date_end',
+              BANNERS: 'id,campaign_id,status,updated,created'}
+    # Поля, без которых каталог не работает: updated нужен для
+    # обновления, status - для выбора объектов в get_stats.
+    REQUIRED_FIELDS = ('id', 'status', 'updated')
+    STATUSES = 'active,blocked,deleted'
+    # Статусы объектов, которые API отдает без фильтра по статусу.
+    DEFAULT_STATUSES = ('active', 'blocked')
+
+    def __init__(self, path=':memory:', fields=None, max_age=0):
+        """
+        :param path: str : путь к файлу SQLite
+        :param fields: dict : {'campaigns': 'id,updated,...', 'banners': ...}
+            поля объектов, которые хранятся в каталоге,
+            id, status и updated добавляются всегда.
+        :param max_age: int : сколько секунд после обновления
+            каталог не обновляется повторно.
+        """
+        self.fields = {
+            object_type: self._with_required_fields(value)
+            for object_type, value in dict(self.FIELDS,
+                                           **(fields or {})).items()}
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS objects ('
+                'object_type TEXT, id INTEGER, updated TEXT, data TEXT, '
+                'PRIMARY KEY (object_type, id))')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS refreshes ('
+                'object_type TEXT PRIMARY KEY, refreshed_at REAL)')
+
+    def _with_required_fields(self, fields):
+        fields = fields.split(',')
+        return ','.join(fields + [i for i in self.REQUIRED_FIELDS
+                                  if i not in fields])
+
+    def close(self):
+        self._connection.close()
+
+    def _last_updated(self, object_type):
+        with self._lock:
+            return self._connection.execute(
+                'SELECT MAX(updated) FROM objects WHERE object_type = ?',
+                (object_type,)).fetchone()[0]
+
+    def _refreshed_at(self, object_type):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT refreshed_at FROM refreshes WHERE object_type = ?',
+                (object_type,)).fetchone()
+        return row[0] if row else None
+
+    def refresh(self, light_api, object_type, force=False):
+        """
+        Запрашивает объекты, измененные после последнего обновления.
+
+        :param light_api: MytargetLight
+        :param object_type: str : campaigns|banners
+        :param force: bool : обновить, даже если не прошло max_age секунд
+        :return: int : кол-во новых и измененных объектов
+        """
+        if object_type not in self.UPDATED_FILTERS:
+            raise ValueError('Не известный object_type, '
+                             'разерешены только: {}, {}'
+                             .format(self.CAMPAIGNS, self.BANNERS))
+        refreshed_at = self._refreshed_at(object_type)
+        if not force and refreshed_at \
+                and time.time() - refreshed_at < self.max_age:
+            return 0
+
+        params = {'fields': self.fields[object_type],
+                  '_status__in': self.STATUSES}
+        last_updated = self._last_updated(object_type)
+        if last_updated:
+            # Объекты, измененные в ту же секунду, запрашиваются повторно,
+            # чтобы не пропустить их.
+            params[self.UPDATED_FILTERS[object_type]] = last_updated
+
+        started_at = time.time()
+        if object_type == self.CAMPAIGNS:
+            objects = light_api.get_campaigns(params=params,
+                                              as_dataframe=False)
+        else:
+            objects = light_api.get_banners(params=params,
+                                            as_dataframe=False)
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO objects '
+                '(object_type, id, updated, data) VALUES (?, ?, ?, ?)',
+                [(object_type, i['id'], i.get('updated'), json.dumps(i))
+                 for i in objects])
+            self._connection.execute(
+                'INSERT OR REPLACE INTO refreshes '
+                '(object_type, refreshed_at) VALUES (?, ?)',
+                (object_type, started_at))
+        logging.debug('Каталог {}: получено {} объектов'
+                      .format(object_type, len(objects)))
+        return len(objects)
+
+    def objects(self, object_type, statuses=None):
+        """
+        Объекты из каталога.
+
+        :param statuses: list : ['active', 'blocked'], по умолчанию все
+        :return: [{"id": ..., "updated": ..., ...}, ...]
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT data FROM objects WHERE object_type = ? ORDER BY id',
+                (object_type,)).fetchall()
+        objects = [json.loads(row[0]) for row in rows]
+        if statuses:
+            objects = [i for i in objects if i.get('status') in statuses]
+        return objects
+
+    def ids(self, object_type, statuses=None):
+        """Идентификаторы объектов из каталога."""
+        return [i['id'] for i in self.objects(object_type, statuses)]
@@ -0,0 +1,58 @@
+# coding: utf-8
+"""
+Разбор JSON ответов API.
+
+Ответ статистики на 200 объектов за 92 дня со всеми группами метрик
+весит несколько мегабайт, поэтому, если установлен orjson,
+ответы разбираются им, иначе стандартным json.
+"""
+import json
+
+AUTO = 'auto'
+ORJSON = 'orjson'
+STDLIB = 'json'
+
+_decoders = {}
+
+
+def _stdlib_loads(content):
+    if isinstance(content, bytes):
+        content = content.decode('utf-8')
+    return json.loads(content)
+
+
+def _orjson_loads():
+    try:
+        import orjson
+    except ImportError:
+        raise ImportError('Для разбора ответов через orjson установите его: '
+                          'pip install tapioca-mytarget[json]')
+    return orjson.loads
+
+
+def get_decoder(decoder=AUTO):
+    """
+    Функция разбора JSON.
+
+    :param decoder: str, callable : auto|orjson|json или функция,
+        принимающая bytes. auto - orjson, если установлен, иначе json.
+    :return: callable : bytes -> данные
+    """
+    if decoder is None:
+        decoder = AUTO
+    if callable(decoder):
+        return decoder
+    if decoder not in _decoders:
+        if decoder == STDLIB:
+            _decoders[decoder] = _stdlib_loads
+        elif decoder == ORJSON:
+            _decoders[decoder] = _orjson_loads()
+        elif decoder == AUTO:
+            try:
+                _decoders[decoder] = _orjson_loads()
+            except ImportError:
+                _decoders[decoder] = _stdlib_loads
+        else:
+            raise ValueError('json_decoder может быть {}, {}, {} '
+                             'или функцией'.format(AUTO, ORJSON, STDLIB))
+    return _decoders[decoder]
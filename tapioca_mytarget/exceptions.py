@@ -51,3 +51,14 @@ class MytargetLimitError(MytargetApiError):
             .format(self.response.status_code,
                     self.response.reason,
                     self.response.text)
+
+
+class MytargetCircuitOpenError(Exception):
+    def __init__(self, failures, retry_after, *args, **kwargs):
+        self.failures = failures
+        self.retry_after = max(retry_after, 0)
+
+    def __str__(self):
+        return 'API не отвечает, {} сбоев подряд. ' \
+               'Запросы остановлены, повторите через {:.0f} сек.' \
+            .format(self.failures, self.retry_after)
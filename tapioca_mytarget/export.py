@@ -0,0 +1,110 @@
+# coding: utf-8
+"""
+Приемники для выгрузки статистики порциями.
+
+Приемник получает колонки порции через write_columns(columns)
+и закрывается через close(). ParquetSink из arrow тоже приемник.
+"""
+import logging
+
+from .schema import coerce_frame
+
+
+class CsvSink:
+    """
+    Запись порций статистики в один CSV файл.
+
+    Колонки файла задаются заранее через columns или берутся
+    из первой порции, следующие порции приводятся к ним.
+    Если в порции появились колонки, которых нет в файле, например
+    группа метрик events началась не с первого дня, то ValueError,
+    чтобы данные не терялись молча.
+
+    sink = CsvSink('stats.csv', columns=stats_columns('base,events'))
+    """
+
+    def __init__(self, path, encoding='utf-8', columns=None, strict=True,
+                 **kwargs):
+        """
+        :param path: str : путь к файлу
+        :param columns: list : колонки файла, см. schema.stats_columns
+        :param strict: bool : False - колонки, которых нет в файле,
+            отбрасываются с предупреждением, а не вызывают ValueError.
+        :param kwargs: параметры DataFrame.to_csv, например sep=';'
+        """
+        self.path = path
+        self.kwargs = kwargs
+        self.columns = list(columns) if columns else None
+        self.strict = strict
+        self.rows = 0
+        self._header = True
+        self._file = open(path, 'w', encoding=encoding, newline='')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write_columns(self, columns):
+        import pandas as pd
+
+        df = pd.DataFrame(columns)
+        if self.columns is None:
+            self.columns = list(df.columns)
+        extra = set(df.columns) - set(self.columns)
+        if extra and self._header:
+            # Файл еще пуст, колонки можно дополнить.
+            self.columns += [c for c in df.columns if c not in self.columns]
+        elif extra and self.strict:
+            raise ValueError('Колонок {} нет в файле. Укажите все колонки '
+                             'заранее, например stats_columns(metrics)'
+                             .format(', '.join(sorted(extra))))
+        elif extra:
+            logging.warning('Колонок {} нет в файле, они не будут записаны'
+                            .format(', '.join(sorted(extra))))
+        df = df.reindex(columns=self.columns)
+        df.to_csv(self._file, header=self._header, index=False,
+                  **self.kwargs)
+        self._header = False
+        self.rows += len(df)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class CallbackSink:
+    """
+    Передает каждую порцию статистики в функцию в виде DataFrame.
+
+    sink = CallbackSink(lambda df: df.to_sql('stats', engine, if_exists='append'))
+    """
+
+    def __init__(self, func, metric_types=None):
+        """
+        :param func: callable : функция, принимающая DataFrame
+        :param metric_types: str : float|decimal : привести метрики
+            к числам, см. schema.coerce_frame
+        """
+        self.func = func
+        self.metric_types = metric_types
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write_columns(self, columns):
+        import pandas as pd
+
+        df = pd.DataFrame(columns)
+        if self.metric_types:
+            df = coerce_frame(df, self.metric_types)
+        self.func(df)
+        self.rows += len(df)
+
+    def close(self):
+        pass
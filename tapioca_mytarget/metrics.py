@@ -0,0 +1,225 @@
+# coding: utf-8
+"""
+События запросов и сборщик метрик.
+
+Хуки передаются в Mytarget и MytargetLight через hooks=[функция, ...],
+каждая функция получает событие по каждому ответу и повтору запроса:
+
+{"type": "response",  # response|retry|token_refresh
+ "resource": "stats2",  # ключ из RESOURCE_MAPPING
+ "method": "GET",
+ "url": "https://target.my.com/api/v2/statistics/banners/day.json?...",
+ "status": 200,
+ "elapsed": 0.153,  # секунд от запроса до ответа
+ "wait": 0.0,  # секунд ожидания квоты перед запросом
+ "bytes": 48213,
+ "remaining": {1: 9, 60: 295},  # остатки квоты из X-RateLimit-*
+ "limits": {1: 10, 60: 300},
+ "time": 1554000000.0}
+
+У события retry есть delay и reason: limit.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+
+from .rate_limit import RateLimiter
+from .resource_mapping import RESOURCE_MAPPING
+
+RESPONSE = 'response'
+RETRY = 'retry'
+TOKEN_REFRESH = 'token_refresh'
+
+
+def _resource_patterns():
+    patterns = []
+    for name, resource in RESOURCE_MAPPING.items():
+        path = resource['resource'].split('?')[0]
+        regex = re.sub(r'\\{\w+\\}', r'[^/]+', re.escape(path))
+        patterns.append((path.count('{'),
+                         re.compile('(?:^|/)' + regex + '$'), name))
+    # Сначала ресурсы без параметров: banners/count.json,
+    # а не banners/{banner_id}.json
+    return [(regex, name) for _, regex, name in sorted(
+        patterns, key=lambda i: i[0])]
+
+
+_RESOURCE_PATTERNS = _resource_patterns()
+
+
+def resource_name(url):
+    """
+    Ключ ресурса из RESOURCE_MAPPING по url запроса.
+
+    :return: str : 'stats2' или None
+    """
+    path = url.split('?')[0]
+    for regex, name in _RESOURCE_PATTERNS:
+        if regex.search(path):
+            return name
+    return None
+
+
+def request_event(event_type, response, method=None, elapsed=None,
+                  **kwargs):
+    """Событие по ответу requests или AsyncResponse."""
+    remaining, limits = RateLimiter.parse_headers(response.headers)
+    if elapsed is None and getattr(response, 'elapsed', None) is not None:
+        elapsed = response.elapsed.total_seconds()
+    if method is None and getattr(response, 'request', None) is not None:
+        method = response.request.method
+    event = {'type': event_type,
+             'resource': resource_name(response.url),
+             'method': method,
+             'url': response.url,
+             'status': response.status_code,
+             'elapsed': elapsed,
+             'bytes': len(response.content or b''),
+             'remaining': remaining,
+             'limits': limits,
+             'time': time.time()}
+    event.update(kwargs)
+    return event
+
+
+def emit(hooks, event):
+    """Передает событие в хуки, ошибки хуков не прерывают запрос."""
+    for hook in hooks or ():
+        try:
+            hook(event)
+        except Exception:
+            logging.exception('Ошибка в хуке {}'.format(hook))
+
+
+class MetricsCollector:
+    """
+    Счетчики и гистограммы по событиям запросов.
+
+    collector = MetricsCollector()
+    light_api = MytargetLight(access_token=ACCESS_TOKEN, hooks=[collector])
+    light_api.get_stats(...)
+    collector.summary()
+    print(collector.prometheus())
+    """
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, buckets=BUCKETS):
+        """:param buckets: tuple : границы гистограммы времени ответа, сек."""
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # {(resource, status): кол-во}
+            self.requests = {}
+            # {(resource, reason): кол-во}
+            self.retries = {}
+            self.token_refreshes = 0
+            # {resource: байт}
+            self.bytes = {}
+            # {resource: [кол-во по корзинам + inf, сумма, кол-во]}
+            self.latency = {}
+            self.wait = 0.0
+            # {секунд в окне: последний остаток}
+            self.remaining = {}
+            # {секунд в окне: мин. остаток}
+            self.min_remaining = {}
+
+    def __call__(self, event):
+        resource = event.get('resource') or 'unknown'
+        with self._lock:
+            if event['type'] == RETRY:
+                key = (resource, event.get('reason'))
+                self.retries[key] = self.retries.get(key, 0) + 1
+                return
+            if event['type'] == TOKEN_REFRESH:
+                self.token_refreshes += 1
+                return
+
+            key = (resource, event.get('status'))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.bytes[resource] = \
+                self.bytes.get(resource, 0) + (event.get('bytes') or 0)
+            self.wait += event.get('wait') or 0
+            elapsed = event.get('elapsed')
+            if elapsed is not None:
+                histogram = self.latency.setdefault(
+                    resource, [[0] * (len(self.buckets) + 1), 0.0, 0])
+                histogram[0][bisect.bisect_left(self.buckets, elapsed)] += 1
+                histogram[1] += elapsed
+                histogram[2] += 1
+            for seconds, count in (event.get('remaining') or {}).items():
+                self.remaining[seconds] = count
+                self.min_remaining[seconds] = min(
+                    count, self.min_remaining.get(seconds, count))
+
+    def summary(self):
+        """
+        Сводка по ресурсам.
+
+        :return: {"stats2": {"requests": 10, "errors": 1, "retries": 1,
+                             "bytes": ..., "latency_avg": 0.15}, ...,
+                  "_quota": {"remaining": {...}, "min_remaining": {...},
+                             "wait": 0.0, "token_refreshes": 0}}
+        """
+        with self._lock:
+            summary = {}
+            for (resource, status), count in self.requests.items():
+                item = summary.setdefault(resource, {
+                    'requests': 0, 'errors': 0, 'retries': 0,
+                    'bytes': self.bytes.get(resource, 0),
+                    'latency_avg': None})
+                item['requests'] += count
+                if status is None or status >= 400:
+                    item['errors'] += count
+            for (resource, _), count in self.retries.items():
+                if resource in summary:
+                    summary[resource]['retries'] += count
+            for resource, (_, total, count) in self.latency.items():
+                if count and resource in summary:
+                    summary[resource]['latency_avg'] = total / count
+            summary['_quota'] = {'remaining': dict(self.remaining),
+                                 'min_remaining': dict(self.min_remaining),
+                                 'wait': self.wait,
+                                 'token_refreshes': self.token_refreshes}
+            return summary
+
+    def prometheus(self, prefix='mytarget'):
+        """Метрики в текстовом формате Prometheus."""
+        lines = []
+        with self._lock:
+            for (resource, status), count in sorted(
+                    self.requests.items(), key=str):
+                lines.append('{}_requests_total{{resource="{}",status="{}"}} {}'
+                             .format(prefix, resource, status, count))
+            for (resource, reason), count in sorted(
+                    self.retries.items(), key=str):
+                lines.append('{}_retries_total{{resource="{}",reason="{}"}} {}'
+                             .format(prefix, resource, reason, count))
+            for resource, count in sorted(self.bytes.items()):
+                lines.append('{}_response_bytes_total{{resource="{}"}} {}'
+                             .format(prefix, resource, count))
+            for resource, (counts, total, count) in sorted(
+                    self.latency.items()):
+                cumulative = 0
+                for bound, bucket in zip(
+                        [str(b) for b in self.buckets] + ['+Inf'], counts):
+                    cumulative += bucket
+                    lines.append(
+                        '{}_request_seconds_bucket{{resource="{}",le="{}"}} {}'
+                        .format(prefix, resource, bound, cumulative))
+                lines.append('{}_request_seconds_sum{{resource="{}"}} {}'
+                             .format(prefix, resource, total))
+                lines.append('{}_request_seconds_count{{resource="{}"}} {}'
+                             .format(prefix, resource, count))
+            for seconds, count in sorted(self.remaining.items()):
+                lines.append('{}_quota_remaining{{window="{}"}} {}'
+                             .format(prefix, seconds, count))
+            lines.append('{}_quota_wait_seconds_total {}'
+                         .format(prefix, self.wait))
+            lines.append('{}_token_refreshes_total {}'
+                         .format(prefix, self.token_refreshes))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,146 @@
+# coding: utf-8
+"""
+Планирование запросов статистики.
+
+Объекты делятся на группы не больше limit_in_request,
+период делится на части не больше interval дней.
+Если известно время жизни объектов, то для каждой части периода
+в запросы попадают только объекты, которые существовали в этот период.
+"""
+
+LIFETIME_FIELDS = {
+    'campaigns': 'id,status,created,updated,date_start,date_end',
+    'banners': 'id,status,created,updated',
+}
+
+
+def grouper_list(arr, size):
+    """
+    Делит список на минимальное кол-во частей не больше size элементов,
+    части идут подряд и отличаются по размеру не больше чем на 1.
+    """
+    arr = list(arr)
+    if not arr:
+        return []
+    count = -(-len(arr) // size)
+    chunk, rest = divmod(len(arr), count)
+    groups, start = [], 0
+    for i in range(count):
+        end = start + chunk + (1 if i < rest else 0)
+        groups.append(arr[start:end])
+        start = end
+    return groups
+
+
+def _date(value):
+    """'2019-01-01 12:00:00' -> '2019-01-01'"""
+    return value[:10] if value else None
+
+
+def object_lifetime(obj):
+    """
+    Период, в котором объект мог показываться.
+
+    Начало - дата создания или начала кампании,
+    конец - дата окончания кампании, а для остановленных
+    и удаленных объектов - дата последнего изменения.
+
+    :param obj: dict : кампания или баннер
+    :return: ('2019-01-01' или None, '2019-02-01' или None)
+    """
+    starts = [d for d in (_date(obj.get('created')),
+                          _date(obj.get('date_start'))) if d]
+    ends = [d for d in (_date(obj.get('date_end')),) if d]
+    if obj.get('status') and obj.get('status') != 'active' \
+            and obj.get('updated'):
+        ends.append(_date(obj['updated']))
+    return (max(starts) if starts else None,
+            min(ends) if ends else None)
+
+
+def _active_ids(ids, period, lifetimes):
+    """Объекты, существовавшие в период, с их временем жизни."""
+    period_from, period_to = period
+    active = []
+    for object_id in ids:
+        start, end = lifetimes.get(object_id, (None, None))
+        if (start is None or start <= period_to) and \
+                (end is None or end >= period_from):
+            active.append((object_id, start, end))
+    return active
+
+
+def _group_period(group, period):
+    """Период, суженный до времени жизни объектов группы."""
+    period_from, period_to = period
+    starts = [start for _, start, _ in group]
+    ends = [end for _, _, end in group]
+    if None not in starts:
+        period_from = max(period_from, min(starts))
+    if None not in ends:
+        period_to = min(period_to, max(ends))
+    return period_from, period_to
+
+
+def plan_requests(ids, periods, limit_in_request, lifetimes=None):
+    """
+    План запросов статистики.
+
+    :param ids: list : идентификаторы объектов
+    :param periods: list : [('2019-01-01', '2019-03-01'), ...]
+        или [{}] для суммарной статистики
+    :param lifetimes: dict : {id: (начало, конец)}, см. object_lifetime
+    :return: [(ids, period), ...]
+    """
+    if not lifetimes or periods == [{}]:
+        return [(group, period)
+                for group in grouper_list(ids, limit_in_request)
+                for period in periods]
+
+    plan = []
+    for period in periods:
+        active = _active_ids(ids, period, lifetimes)
+        for group in grouper_list(active, limit_in_request):
+            plan.append(([object_id for object_id, _, _ in group],
+                         _group_period(group, period)))
+    return plan
+
+
+def plan_adaptive_requests(ids, dates, sizer, lifetimes=None):
+    """
+    План запросов статистики, размер запросов берется из sizer
+    в момент формирования каждого запроса, поэтому генератор
+    нужно читать по мере отправки запросов.
+
+    Длина периода меняется между периодами, размер группы объектов -
+    между любыми запросами.
+
+    :param dates: list : ['2019-01-01', '2019-01-02', ...]
+        или None для суммарной статистики
+    :param sizer: adaptive.ChunkSizer
+    :return: генератор (ids, period), period {} для суммарной статистики
+    """
+    if not dates:
+        periods = iter([{}])
+    else:
+        def periods_gen():
+            start = 0
+            while start < len(dates):
+                end = min(start + sizer.interval, len(dates)) - 1
+                yield dates[start], dates[end]
+                start = end + 1
+        periods = periods_gen()
+
+    for period in periods:
+        if lifetimes and period:
+            objects = _active_ids(ids, period, lifetimes)
+        else:
+            objects = [(object_id, None, None) for object_id in ids]
+        start = 0
+        while start < len(objects):
+            group = objects[start:start + sizer.limit_in_request]
+            start += len(group)
+            group_period = period
+            if lifetimes and period:
+                group_period = _group_period(group, period)
+            yield [object_id for object_id, _, _ in group], group_period
@@ -0,0 +1,143 @@
+# coding: utf-8
+import logging
+import re
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты запросов по окнам квоты myTarget.
+
+    Для каждого окна (1, 60, 3600 секунд и т.д.) хранится остаток запросов
+    и время сброса окна. Остаток уменьшается перед каждым запросом
+    и уточняется по квоте из ответов API: заголовков X-RateLimit-*
+    и поля remaining в ответе 429.
+    Если в каком-то окне запросов не осталось, запрос ждет
+    ровно до сброса этого окна.
+
+    Один объект можно передать в несколько клиентов и потоков,
+    если они используют один токен.
+
+    rate_limiter = RateLimiter(limits={1: 10})
+    api = Mytarget(access_token=ACCESS_TOKEN, rate_limiter=rate_limiter)
+    """
+    HEADER_WINDOWS = {'rps': 1, 'minute': 60, 'hourly': 3600, 'daily': 86400}
+    HEADER_RE = re.compile(r'^x-ratelimit-(\w+)-(limit|remaining)$', re.I)
+
+    def __init__(self, limits=None, max_wait=3600,
+                 clock=time.time, sleep=time.sleep):
+        """
+        :param limits: dict : {секунд в окне: макс. кол-во запросов},
+            если известны заранее. Иначе узнаются из ответов API.
+        :param max_wait: int : макс. кол-во секунд ожидания сброса окна
+            после ответа 429, если больше, то запрос не повторяется.
+        :param clock: функция текущего времени в секундах
+        :param sleep: функция ожидания
+        """
+        self.limits = {int(k): int(v) for k, v in (limits or {}).items()}
+        self.max_wait = max_wait
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        # {секунд в окне: [остаток запросов или None, время сброса окна]}
+        self._windows = {}
+
+    def _window(self, seconds, now):
+        window = self._windows.get(seconds)
+        if window is None or now >= window[1]:
+            reset_at = (now // seconds + 1) * seconds
+            window = [self.limits.get(seconds), reset_at]
+            self._windows[seconds] = window
+        return window
+
+    def _wait_time(self, now):
+        wait = 0
+        for seconds in set(self.limits) | set(self._windows):
+            remaining, reset_at = self._window(seconds, now)
+            if remaining is not None and remaining <= 0:
+                wait = max(wait, reset_at - now)
+        return wait
+
+    def wait_time(self):
+        """Сколько секунд осталось до появления свободного запроса."""
+        with self._lock:
+            return self._wait_time(self._clock())
+
+    def reserve(self):
+        """
+        Резервирует запрос, если во всех окнах есть остаток.
+
+        :return: float : 0, если запрос зарезервирован,
+            иначе сколько секунд ждать до повторной попытки.
+        """
+        with self._lock:
+            now = self._clock()
+            wait = self._wait_time(now)
+            if wait:
+                return wait
+            for window in self._windows.values():
+                if window[0] is not None:
+                    window[0] -= 1
+            return 0
+
+    def acquire(self):
+        """Ждет, пока во всех окнах не появится свободный запрос."""
+        while True:
+            wait = self.reserve()
+            if not wait:
+                return
+            logging.debug('Исчерпан лимит запросов, '
+                          'ожидание {:.2f} сек.'.format(wait))
+            self._sleep(wait)
+
+    def update(self, remaining, limits=None):
+        """
+        Уточняет остатки квоты по данным из ответа API.
+
+        :param remaining: dict : {'1': 0, '60': 10, '3600': 100}
+        :param limits: dict : {'1': 10, '60': 100, '3600': 1000}
+        """
+        with self._lock:
+            now = self._clock()
+            for seconds, limit in (limits or {}).items():
+                self.limits[int(seconds)] = int(limit)
+            for seconds, count in remaining.items():
+                window = self._window(int(seconds), now)
+                if window[0] is None:
+                    window[0] = int(count)
+                else:
+                    # Ответы на запросы, которые еще выполняются,
+                    # сервер пока не учел, поэтому берется меньший остаток.
+                    window[0] = min(window[0], int(count))
+
+    @classmethod
+    def parse_headers(cls, headers):
+        """
+        Квота из заголовков X-RateLimit-* ответа.
+
+        :return: ({секунд в окне: остаток}, {секунд в окне: лимит})
+        """
+        remaining, limits = {}, {}
+        for name, value in (headers or {}).items():
+            match = cls.HEADER_RE.match(name)
+            if not match:
+                continue
+            seconds = cls.HEADER_WINDOWS.get(match.group(1).lower())
+            if seconds is None:
+                continue
+            try:
+                value = int(value)
+            except ValueError:
+                continue
+            if match.group(2).lower() == 'limit':
+                limits[seconds] = value
+            else:
+                remaining[seconds] = value
+        return remaining, limits
+
+    def update_from_headers(self, headers):
+        """Уточняет квоту по заголовкам X-RateLimit-* ответа."""
+        remaining, limits = self.parse_headers(headers)
+        if remaining or limits:
+            self.update(remaining, limits)
@@ -0,0 +1,387 @@
+# coding: utf-8
+"""
+Повтор запросов при временных сбоях и автоматический выключатель.
+
+Ответы 5xx, обрывы соединения и таймауты повторяются
+с экспоненциально растущей паузой со случайным разбросом,
+правила повтора свои для каждого класса ошибок.
+Если API явно недоступен, выключатель (CircuitBreaker)
+на время перестает пропускать запросы всех потоков,
+чтобы они не заваливали API повторами.
+
+Ответы 429 повторяются отдельно, по квоте запросов, см. RateLimiter.
+"""
+import logging
+import random
+import sys
+import threading
+import time
+
+import requests
+
+from .exceptions import MytargetCircuitOpenError
+from .metrics import RETRY, emit, resource_name
+
+SERVER = 'server'
+CONNECTION = 'connection'
+TIMEOUT = 'timeout'
+
+
+def _async_errors():
+    """
+    Таймауты и ошибки соединения asyncio и aiohttp,
+    если они уже импортированы асинхронным клиентом.
+    """
+    timeouts, connection = (), ()
+    asyncio = sys.modules.get('asyncio')
+    if asyncio is not None:
+        timeouts += (asyncio.TimeoutError,)
+    aiohttp = sys.modules.get('aiohttp')
+    if aiohttp is not None:
+        timeouts += (aiohttp.ServerTimeoutError,)
+        connection += (aiohttp.ClientConnectionError,)
+    return timeouts, connection
+
+
+class RetryRule:
+    """Правило повтора для одного класса ошибок."""
+
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=30.0,
+                 multiplier=2.0, jitter=0.5):
+        """
+        :param max_attempts: int : макс. кол-во повторов
+        :param base_delay: float : пауза перед первым повтором, сек.
+        :param max_delay: float : макс. пауза, сек.
+        :param multiplier: float : во сколько раз растет пауза
+        :param jitter: float : от 0 до 1, доля паузы, на которую
+            она случайно уменьшается, чтобы потоки не повторяли
+            запросы одновременно.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def delay(self, attempt, rand=random.random):
+        """
+        :param attempt: int : номер повтора, с 1
+        :return: float : пауза в секундах
+        """
+        delay = min(self.base_delay * self.multiplier ** (attempt - 1),
+                    self.max_delay)
+        return delay * (1 - self.jitter * rand())
+
+
+class CircuitBreaker:
+    """
+    Выключатель запросов.
+
+    После failure_threshold сбоев подряд выключатель размыкается
+    и запросы не отправляются. Через reset_timeout секунд
+    пропускается один пробный запрос: если он успешен,
+    то выключатель замыкается, иначе снова размыкается.
+    RetryPolicy ждет замыкания не дольше max_total_time,
+    после чего запрос получает MytargetCircuitOpenError.
+
+    Один объект общий для всех потоков и клиентов одного API.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0,
+                 clock=time.monotonic):
+        """
+        :param failure_threshold: int : кол-во сбоев подряд до размыкания
+        :param reset_timeout: float : через сколько секунд
+            пропустить пробный запрос
+        :param clock: функция текущего времени в секундах
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = None
+        self._probe = False
+
+    def before_request(self):
+        """Пропускает запрос или вызывает MytargetCircuitOpenError."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and \
+                    self._clock() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe = False
+            if self.state == self.HALF_OPEN:
+                if not self._probe:
+                    self._probe = True
+                    return
+                # Ждать результата пробного запроса.
+                retry_after = min(self.reset_timeout, 1.0)
+            else:
+                retry_after = self.reset_timeout - \
+                    (self._clock() - self._opened_at)
+            raise MytargetCircuitOpenError(self.failures, retry_after)
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info('API снова отвечает, запросы возобновлены')
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (
+                    self.state == self.CLOSED and
+                    self.failures >= self.failure_threshold):
+                if self.state == self.CLOSED:
+                    logging.warning('API не отвечает, {} сбоев подряд, '
+                                    'запросы остановлены на {} сек.'
+                                    .format(self.failures,
+                                            self.reset_timeout))
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+                self._probe = False
+
+    def release_probe(self):
+        """
+        Пробный запрос завершился без ответа API, например отменой
+        или ошибкой в коде: это не сбой API, но следующий запрос
+        снова может стать пробным.
+        """
+        with self._lock:
+            self._probe = False
+
+
+class RetryPolicy:
+    """
+    Правила повтора запросов по классам ошибок:
+    server - ответы 5xx, connection - обрывы соединения,
+    timeout - таймауты запроса.
+
+    policy = RetryPolicy(max_total_time=300, breaker=CircuitBreaker())
+    light_api = MytargetLight(access_token=ACCESS_TOKEN,
+                              retry_policy=policy, timeout=60)
+    """
+    RULES = {
+        SERVER: RetryRule(max_attempts=4, base_delay=1, max_delay=30),
+        CONNECTION: RetryRule(max_attempts=4, base_delay=0.5, max_delay=10),
+        TIMEOUT: RetryRule(max_attempts=2, base_delay=1, max_delay=10),
+    }
+    # Запросы, которые безопасно повторять.
+    METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+    def __init__(self, rules=None, max_total_time=120.0, breaker=None,
+                 methods=METHODS, clock=time.monotonic, sleep=time.sleep):
+        """
+        :param rules: dict : {класс ошибки: RetryRule}, дополняют
+            и заменяют правила по умолчанию, None вместо правила -
+            не повторять этот класс ошибок.
+        :param max_total_time: float : макс. кол-во секунд
+            от первой попытки до последнего повтора
+        :param breaker: CircuitBreaker : общий выключатель,
+            сбоем считается ошибка любого из классов
+        :param methods: tuple : HTTP методы, которые можно повторять
+        :param clock: функция текущего времени в секундах
+        :param sleep: функция ожидания
+        """
+        self.rules = dict(self.RULES, **(rules or {}))
+        self.max_total_time = max_total_time
+        self.breaker = breaker
+        self.methods = tuple(m.upper() for m in methods)
+        self._clock = clock
+        self._sleep = sleep
+
+    def classify(self, exception=None, response=None):
+        """
+        Класс ошибки или None, если это не временный сбой.
+
+        :param exception: исключение при отправке запроса
+        :param response: ответ с кодом status_code
+        """
+        if exception is not None:
+            async_timeouts, async_connection = _async_errors()
+            if isinstance(exception, (requests.exceptions.Timeout,
+                                      TimeoutError) + async_timeouts):
+                return TIMEOUT
+            if isinstance(exception, (requests.exceptions.ConnectionError,
+                                      ConnectionError) + async_connection):
+                return CONNECTION
+            return None
+        if response is not None and response.status_code == 504:
+            return TIMEOUT
+        if response is not None and response.status_code >= 500:
+            return SERVER
+        return None
+
+    def next_delay(self, error_class, attempt, started):
+        """
+        Пауза перед повтором или None, если повторять нельзя.
+
+        :param attempt: int : номер повтора, с 1
+        :param started: float : время первой попытки по clock
+        """
+        rule = self.rules.get(error_class)
+        if rule is None or attempt > rule.max_attempts:
+            return None
+        delay = rule.delay(attempt)
+        if self._clock() - started + delay > self.max_total_time:
+            return None
+        return delay
+
+    def _breaker_delay(self, started):
+        """
+        Пауза до пробного запроса, если выключатель разомкнут.
+        Если ждать дольше max_total_time, то MytargetCircuitOpenError.
+        """
+        if self.breaker is None:
+            return 0
+        try:
+            self.breaker.before_request()
+        except MytargetCircuitOpenError as e:
+            if self._clock() - started + e.retry_after > self.max_total_time:
+                raise
+            return e.retry_after
+        return 0
+
+    def _release_probe(self):
+        """
+        Запрос завершился исключением, которое не говорит о состоянии API,
+        например отменой корутины или ошибкой разбора ответа.
+        Сбоем оно не считается, но пробный запрос освобождается,
+        иначе выключатель никогда не замкнется.
+        """
+        if self.breaker is not None:
+            self.breaker.release_probe()
+
+    def _attempt_failed(self, method, error_class, attempt, started,
+                        on_retry):
+        """Учитывает сбой, возвращает паузу перед повтором или None."""
+        if self.breaker is not None:
+            self.breaker.record_failure()
+        if method.upper() not in self.methods:
+            return None
+        delay = self.next_delay(error_class, attempt, started)
+        if delay is not None:
+            logging.debug('Сбой {}, повтор {} через {:.2f} сек.'
+                          .format(error_class, attempt, delay))
+            if on_retry is not None:
+                on_retry(error_class, delay)
+        return delay
+
+    def call(self, method, send, on_retry=None):
+        """
+        Отправляет запрос, повторяя его при временных сбоях.
+
+        :param method: str : HTTP метод
+        :param send: функция без параметров, отправляющая запрос
+        :param on_retry: функция (класс ошибки, пауза) перед повтором
+        :return: ответ send(), после исчерпания повторов - последний ответ
+            или исключение последней попытки
+        """
+        started = self._clock()
+        attempt = 0
+        while True:
+            attempt += 1
+            delay = self._breaker_delay(started)
+            while delay:
+                self._sleep(delay)
+                delay = self._breaker_delay(started)
+            try:
+                response = send()
+            except Exception as e:
+                error_class = self.classify(exception=e)
+                if error_class is None:
+                    self._release_probe()
+                    raise
+                delay = self._attempt_failed(
+                    method, error_class, attempt, started, on_retry)
+                if delay is None:
+                    raise
+            except BaseException:
+                # KeyboardInterrupt, отмена корутины.
+                self._release_probe()
+                raise
+            else:
+                error_class = self.classify(response=response)
+                if error_class is None:
+                    if self.breaker is not None:
+                        self.breaker.record_success()
+                    return response
+                delay = self._attempt_failed(
+                    method, error_class, attempt, started, on_retry)
+                if delay is None:
+                    return response
+            self._sleep(delay)
+
+    async def call_async(self, method, send, on_retry=None):
+        """Как call, но send - корутина, пауза не блокирует цикл событий."""
+        import asyncio
+
+        started = self._clock()
+        attempt = 0
+        while True:
+            attempt += 1
+            delay = self._breaker_delay(started)
+            while delay:
+                await asyncio.sleep(delay)
+                delay = self._breaker_delay(started)
+            try:
+                response = await send()
+            except Exception as e:
+                error_class = self.classify(exception=e)
+                if error_class is None:
+                    self._release_probe()
+                    raise
+                delay = self._attempt_failed(
+                    method, error_class, attempt, started, on_retry)
+                if delay is None:
+                    raise
+            except BaseException:
+                # KeyboardInterrupt, отмена корутины.
+                self._release_probe()
+                raise
+            else:
+                error_class = self.classify(response=response)
+                if error_class is None:
+                    if self.breaker is not None:
+                        self.breaker.record_success()
+                    return response
+                delay = self._attempt_failed(
+                    method, error_class, attempt, started, on_retry)
+                if delay is None:
+                    return response
+            await asyncio.sleep(delay)
+
+
+class RetrySession:
+    """
+    Обертка над requests.Session, повторяющая запросы по RetryPolicy.
+    Создается в Mytarget, если указан retry_policy.
+    """
+
+    def __init__(self, session, policy, hooks=None):
+        self.session = session
+        self.policy = policy
+        self.hooks = hooks
+
+    def request(self, method, url, *args, **kwargs):
+        def on_retry(error_class, delay):
+            emit(self.hooks, {'type': RETRY, 'resource': resource_name(url),
+                              'method': method, 'url': url,
+                              'delay': delay, 'reason': error_class,
+                              'time': time.time()})
+
+        return self.policy.call(
+            method, lambda: self.session.request(method, url, *args, **kwargs),
+            on_retry)
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
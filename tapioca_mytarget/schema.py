@@ -0,0 +1,123 @@
+# coding: utf-8
+"""
+Типы полей статистики и объектов.
+
+Счетчики API отдает целыми числами, а деньги и коэффициенты
+строками: "spent": "155.8", "cpm": "1.25".
+Колонки называются как после json_normalize: 'base.spent'.
+"""
+from decimal import Decimal
+
+INT = 'int'
+FLOAT = 'float'
+DECIMAL = 'decimal'
+DATE = 'date'
+DATETIME = 'datetime'
+
+_EVENTS = {name: INT for name in (
+    'opening_app', 'opening_post', 'moving_into_group',
+    'clicks_on_external_url', 'launching_video', 'comments',
+    'joinings', 'likes', 'shares', 'votes', 'sending_form')}
+
+_VIDEO_POINTS = ('viewed_10_seconds', 'viewed_25_percent',
+                 'viewed_50_percent', 'viewed_75_percent',
+                 'viewed_100_percent')
+
+METRICS = {
+    'base': {'shows': INT, 'clicks': INT, 'goals': INT,
+             'spent': FLOAT, 'cpm': FLOAT, 'cpc': FLOAT, 'cpa': FLOAT,
+             'ctr': FLOAT, 'cr': FLOAT},
+    'events': dict(_EVENTS),
+    'uniques': {'reach': INT, 'total': INT, 'increment': INT,
+                'frequency': FLOAT},
+    'video': dict(
+        {name: INT for name in (
+            'started', 'paused', 'resumed_after_pause', 'fullscreen_on',
+            'fullscreen_off', 'sound_turned_off', 'sound_turned_on')
+         + _VIDEO_POINTS},
+        depth_of_view=FLOAT, started_cost=FLOAT,
+        **{name + '_rate': FLOAT for name in _VIDEO_POINTS},
+        **{name + '_cost': FLOAT for name in _VIDEO_POINTS}),
+    'viral': dict(_EVENTS, impressions=INT, reach=INT, total=INT,
+                  increment=INT, frequency=FLOAT),
+    'tps': {'tps': FLOAT, 'tpd': FLOAT},
+}
+
+FIELDS = {
+    'id': INT,
+    'date': DATE,
+    'campaign_id': INT,
+    'package_id': INT,
+    'created': DATETIME,
+    'updated': DATETIME,
+    'date_start': DATE,
+    'date_end': DATE,
+    'budget_limit': FLOAT,
+    'budget_limit_day': FLOAT,
+    'price': FLOAT,
+    'max_price': FLOAT,
+}
+
+
+def column_type(name):
+    """
+    Тип колонки по ее названию.
+
+    :param name: str : 'base.spent', 'date', 'id'
+    :return: str : int|float|date|datetime или None, если тип не известен
+    """
+    if name in FIELDS:
+        return FIELDS[name]
+    group, _, metric = name.partition('.')
+    return METRICS.get(group, {}).get(metric)
+
+
+def stats_columns(metrics=None, with_date=True):
+    """
+    Колонки статистики по группам метрик из METRICS,
+    в том же порядке, что и в ответе API.
+
+    :param metrics: str, list : группы метрик, как в get_stats,
+        None - только base, как отдает API, 'all' - все группы.
+        Групп, которых нет в METRICS, в списке нет.
+    :param with_date: bool : с колонкой date, для статистики по дням
+    :return: list : ['date', 'base.shows', ..., 'id']
+    """
+    if isinstance(metrics, str):
+        metrics = metrics.split(',')
+    if not metrics:
+        metrics = ['base']
+    elif 'all' in metrics:
+        metrics = list(METRICS)
+    columns = ['date'] if with_date else []
+    for group in metrics:
+        columns += [group + '.' + name for name in METRICS.get(group, {})]
+    columns.append('id')
+    return columns
+
+
+def coerce_frame(df, float_type=FLOAT):
+    """
+    Приводит колонки метрик DataFrame к числам, каждую колонку целиком.
+
+    Счетчики становятся int64 (Int64, если есть пропуски),
+    деньги и коэффициенты - float64 или Decimal.
+
+    :param df: DataFrame : колонки как после json_normalize
+    :param float_type: str : float|decimal : тип денег и коэффициентов
+    :return: DataFrame
+    """
+    import pandas as pd
+
+    for name in df.columns:
+        kind = column_type(name)
+        if kind == INT:
+            values = pd.to_numeric(df[name], errors='coerce')
+            df[name] = values.astype(
+                'Int64' if values.isna().any() else 'int64')
+        elif kind == FLOAT and float_type == DECIMAL:
+            df[name] = df[name].map(
+                lambda v: None if pd.isna(v) or v == '' else Decimal(str(v)))
+        elif kind == FLOAT:
+            df[name] = pd.to_numeric(df[name], errors='coerce')
+    return df
@@ -0,0 +1,181 @@
+# coding: utf-8
+import json
+import logging
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+
+from .tapioca_mytarget import LocalResult
+
+
+class StatsSync:
+    """
+    Инкрементальная загрузка статистики по дням в локальную базу SQLite.
+
+    Для каждого объекта хранится последний загруженный день.
+    При каждом запуске запрашиваются только недостающие дни
+    и еще lookback_days дней перед ними, т.к. статистика
+    за последние дни может уточняться. Строки перезаписываются.
+
+    sync = StatsSync(light_api, 'stats.sqlite', lookback_days=3)
+    sync.run(object_type=light_api.BANNER_STATS, date_from='2019-01-01')
+    df = sync.to_df(object_type=light_api.BANNER_STATS)
+    """
+
+    def __init__(self, light_api, path=':memory:', lookback_days=3):
+        """
+        :param light_api: MytargetLight
+        :param path: str : путь к файлу SQLite
+        :param lookback_days: int : сколько уже загруженных дней
+            запрашивать повторно
+        """
+        self.light_api = light_api
+        self.lookback_days = lookback_days
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS watermarks ('
+                'object_type TEXT, metrics TEXT, id INTEGER, last_date TEXT, '
+                'PRIMARY KEY (object_type, metrics, id))')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS stats ('
+                'object_type TEXT, metrics TEXT, id INTEGER, '
+                'date TEXT, row TEXT, '
+                'PRIMARY KEY (object_type, metrics, id, date))')
+
+    def close(self):
+        self._connection.close()
+
+    def _metrics_key(self, metrics):
+        if isinstance(metrics, list):
+            metrics = ','.join(map(str, metrics))
+        return metrics or ''
+
+    def watermarks(self, object_type, metrics=None):
+        """
+        Последний загруженный день по каждому объекту.
+
+        :return: {id: '2019-01-01', ...}
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                'SELECT id, last_date FROM watermarks '
+                'WHERE object_type = ? AND metrics = ?',
+                (object_type, self._metrics_key(metrics)))
+            return dict(cursor.fetchall())
+
+    def _date_from(self, last_date, default):
+        if not last_date:
+            return default
+        last_date = datetime.strptime(last_date, '%Y-%m-%d')
+        date_from = last_date + timedelta(1 - self.lookback_days)
+        return max(date_from.strftime('%Y-%m-%d'), default)
+
+    def _save(self, object_type, metrics, items):
+        values = [(object_type, metrics, item['id'], row['date'],
+                   json.dumps(row))
+                  for item in items
+                  for row in item.get('rows') or []]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO stats '
+                '(object_type, metrics, id, date, row) '
+                'VALUES (?, ?, ?, ?, ?)', values)
+        return len(values)
+
+    def _save_watermarks(self, object_type, metrics, ids, last_date):
+        # Загрузка с более ранним date_to, например за прошлый год,
+        # не сдвигает последний загруженный день назад.
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO watermarks '
+                '(object_type, metrics, id, last_date) '
+                'VALUES (?, ?, ?, MAX(?, COALESCE('
+                '(SELECT last_date FROM watermarks WHERE object_type = ? '
+                'AND metrics = ? AND id = ?), \'\')))',
+                [(object_type, metrics, int(i), last_date,
+                  object_type, metrics, int(i)) for i in ids])
+
+    def run(self, object_type, date_from, date_to=None, ids=None,
+            metrics=None, limit_in_request=200, interval=92,
+            max_workers=None):
+        """
+        Загружает недостающую статистику.
+
+        :param object_type: str : banners|campaigns|users
+        :param date_from: str : YYYY-MM-DD : с какого дня загружать
+            статистику объектов, которые еще не загружались.
+        :param date_to: str : YYYY-MM-DD : по какой день, по умолчанию сегодня
+        :param ids: list : идентификаторы объектов, если не указаны,
+            то будут запрошены все объекты.
+        :return: int : кол-во записанных строк
+        """
+        date_to = date_to or date.today().strftime('%Y-%m-%d')
+        if isinstance(date_to, (date, datetime)):
+            date_to = date_to.strftime('%Y-%m-%d')
+        if isinstance(date_from, (date, datetime)):
+            date_from = date_from.strftime('%Y-%m-%d')
+        metrics_key = self._metrics_key(metrics)
+
+        if not ids:
+            ids = self.light_api._get_objects_for_request_stats(
+                object_type, limit=None, max_workers=max_workers)
+        watermarks = self.watermarks(object_type, metrics)
+
+        # Объекты группируются по дню, с которого нужно загружать.
+        groups = {}
+        for object_id in ids:
+            group_date_from = self._date_from(
+                watermarks.get(int(object_id)), date_from)
+            if group_date_from <= date_to:
+                groups.setdefault(group_date_from, []).append(object_id)
+
+        count = 0
+        for group_date_from, group_ids in sorted(groups.items()):
+            logging.info('Загрузка статистики {} объектов с {} по {}'
+                         .format(len(group_ids), group_date_from, date_to))
+            results = self.light_api._iter_stats_results(
+                object_type, group_date_from, date_to, metrics, group_ids,
+                None, limit_in_request, interval, max_workers)
+            for result in results:
+                count += self._save(object_type, metrics_key,
+                                    result().data['items'])
+            self._save_watermarks(object_type, metrics_key,
+                                  group_ids, date_to)
+        return count
+
+    def rows(self, object_type, metrics=None, ids=None,
+             date_from=None, date_to=None):
+        """
+        Строки статистики из базы.
+
+        :return: [{"id": 857683, "rows": [{"date": "2017-09-20", ...}]}]
+        """
+        query = ('SELECT id, row FROM stats '
+                 'WHERE object_type = ? AND metrics = ?')
+        args = [object_type, self._metrics_key(metrics)]
+        if ids:
+            query += ' AND id IN ({})'.format(','.join('?' * len(ids)))
+            args += [int(i) for i in ids]
+        if date_from:
+            query += ' AND date >= ?'
+            args.append(date_from)
+        if date_to:
+            query += ' AND date <= ?'
+            args.append(date_to)
+        query += ' ORDER BY id, date'
+
+        items = []
+        with self._lock:
+            for object_id, row in self._connection.execute(query, args):
+                if not items or items[-1]['id'] != object_id:
+                    items.append({'id': object_id, 'rows': []})
+                items[-1]['rows'].append(json.loads(row))
+        return items
+
+    def to_df(self, object_type, metrics=None, ids=None,
+              date_from=None, date_to=None):
+        """Строки статистики из базы в формате DataFrame."""
+        items = self.rows(object_type, metrics, ids, date_from, date_to)
+        return self.light_api._stats_to_df([LocalResult({'items': items})])
@@ -1,20 +1,92 @@
 # coding: utf-8
 import logging
+import threading
 import time
 import datetime as datetime_
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
-import pandas as pd
 import requests
-from dateutil import parser
-from pandas.io.json import json_normalize
-from tapioca import (
-    TapiocaAdapter, generate_wrapper_from_adapter, JSONAdapterMixin)
+from requests.adapters import HTTPAdapter
+from tapioca import TapiocaAdapter, JSONAdapterMixin
+from tapioca.exceptions import ResponseProcessException
+from tapioca.tapioca import (
+    TapiocaClient, TapiocaClientExecutor, TapiocaInstantiator)
 
 from tapioca_mytarget import exceptions
+from .adaptive import is_timeout, split_request
+from .arrow import ParquetSink, columns_table, stats_schema
+from .decoder import get_decoder
+from .export import CallbackSink
+from .metrics import RESPONSE, RETRY, TOKEN_REFRESH, emit, request_event
+from .planner import (
+    LIFETIME_FIELDS, grouper_list, object_lifetime, plan_adaptive_requests,
+    plan_requests)
+from .rate_limit import RateLimiter
 from .resource_mapping import RESOURCE_MAPPING
-
-logging.basicConfig(level=logging.INFO)
+from .retry import RetrySession
+from .schema import DECIMAL, FLOAT, coerce_frame
+from .tokens import MemoryTokenStore, TokenProvider, is_expiring
+
+
+def _json_normalize(data):
+    # pandas импортируется при первом преобразовании в DataFrame,
+    # а не при импорте модуля, т.к. это занимает сотни миллисекунд.
+    try:
+        from pandas import json_normalize
+    except ImportError:
+        # pandas < 1.0
+        from pandas.io.json import json_normalize
+
+    return json_normalize(data)
+
+
+def _flatten(data, prefix=''):
+    """
+    Разворачивает вложенные словари в один,
+    ключи объединяются через точку, как в json_normalize.
+    """
+    flat = {}
+    for key, value in data.items():
+        key = prefix + key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, key + '.'))
+        else:
+            flat[key] = value
+    return flat
+
+
+def _is_zero(data):
+    """Все числовые значения метрик равны нулю."""
+    if isinstance(data, dict):
+        return all(_is_zero(value) for value in data.values())
+    try:
+        return float(data) == 0
+    except (TypeError, ValueError):
+        return True
+
+
+def create_session(pool_connections=10, pool_maxsize=10, pool_block=False):
+    """
+    Сессия requests с пулом постоянных соединений.
+    Одну сессию можно передать в Mytarget, MytargetLight и MytargetAuth,
+    тогда соединения и TLS рукопожатия будут переиспользоваться.
+
+    :param pool_connections: int : кол-во хостов, для которых хранится пул
+    :param pool_maxsize: int : макс. кол-во соединений с одним хостом
+    :param pool_block: bool : если все соединения с хостом заняты,
+        ждать освобождения, а не открывать временное соединение.
+    :return: requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections,
+                          pool_maxsize=pool_maxsize,
+                          pool_block=pool_block)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
 
 
 class MytargetClientAdapter(JSONAdapterMixin, TapiocaAdapter):
@@ -25,6 +97,10 @@ class MytargetClientAdapter(JSONAdapterMixin, TapiocaAdapter):
     PRODUCTION_HOST = 'target.my.com'
     SANDBOX_HOST = 'target-sandbox.my.com'
 
+    _rate_limiter = None
+    _hooks = None
+    _decoder = None
+
     def __init__(self, *args, **kwargs):
         """
         Низкоуровневый API.
@@ -34,6 +110,23 @@ class MytargetClientAdapter(JSONAdapterMixin, TapiocaAdapter):
             если закончилась квота запросов к апи.
         :param language: str : ru|en|{other} :
             язык в котором будут возвращены некоторые данные, например справочников.
+        :param rate_limiter: RateLimiter : ограничитель частоты запросов,
+            запросы ожидают заранее, не дожидаясь ответа 429.
+        :param token_provider: TokenProvider : источник токена,
+            токен обновляется перед истечением, а запрос с ответом 401
+            повторяется один раз с новым токеном.
+            Нужен refresh_token_by_default=True.
+        :param timeout: float : таймаут запроса в секундах
+        :param retry_policy: RetryPolicy : повтор запросов при ответах 5xx,
+            обрывах соединения и таймаутах, с выключателем CircuitBreaker.
+        :param url_root: str : адрес API вместо target.my.com,
+            например 'http://127.0.0.1:8000/'
+        :param json_decoder: str, callable : auto|orjson|json
+            или функция разбора ответов из bytes.
+            По умолчанию orjson, если установлен, иначе json.
+        :param hooks: list : функции, получающие событие по каждому ответу
+            и повтору запроса: ресурс, статус, время, размер, квота.
+            См. metrics.MetricsCollector.
 
         low_api = Mytarget(access_token=ACCESS_TOKEN,
                        retry_request_if_limit=True)
@@ -42,22 +135,32 @@ class MytargetClientAdapter(JSONAdapterMixin, TapiocaAdapter):
         df = result().to_df()  # данные в формате pandas dataframe
         """
         super().__init__(*args, **kwargs)
+        # Один адаптер может использоваться из нескольких потоков.
+        self._local = threading.local()
 
     def get_url_root(self, api_params):
+        if api_params.get('url_root'):
+            # Например локальный сервер из testing.FakeMytargetServer.
+            return api_params['url_root']
         if api_params.get('is_sandbox', False):
             return self.end_point.format(self.SANDBOX_HOST)
         return self.end_point.format(self.PRODUCTION_HOST)
 
-    def get_api_root(self, api_params):
+    def get_api_root(self, api_params, **kwargs):
         return self.get_url_root(api_params) + 'api/'
 
     def get_request_kwargs(self, api_params, *args, **kwargs):
         params = super().get_request_kwargs(api_params, *args, **kwargs)
 
+        token_provider = api_params.get('token_provider')
+        if token_provider:
+            api_params['access_token'] = token_provider()
         token = api_params.get('access_token')
         if token:
             params['headers'].update(
                 {'Authorization': 'Bearer {}'.format(token)})
+        if api_params.get('timeout'):
+            params['timeout'] = api_params['timeout']
 
         if api_params.get('language', False):
             params['headers'].update(
@@ -65,8 +168,37 @@ class MytargetClientAdapter(JSONAdapterMixin, TapiocaAdapter):
         else:
             params['headers'].update({'Accept-Language': 'ru'})
 
+        self._hooks = api_params.get('hooks')
+        self._decoder = get_decoder(api_params.get('json_decoder'))
+        started = time.perf_counter()
+        self.wait_rate_limit(api_params)
+        self._local.wait = time.perf_counter() - started
+
         return params
 
+    def wait_rate_limit(self, api_params):
+        """Ожидание перед запросом, если исчерпана квота запросов."""
+        self._rate_limiter = api_params.get('rate_limiter')
+        if self._rate_limiter:
+            self._rate_limiter.acquire()
+
+    def process_response(self, response):
+        if self._rate_limiter:
+            self._rate_limiter.update_from_headers(response.headers)
+        if self._hooks:
+            emit(self._hooks, request_event(
+                RESPONSE, response, wait=getattr(self._local, 'wait', 0)))
+        return super().process_response(response)
+
+    def response_to_native(self, response):
+        return self.loads(response.content)
+
+    def loads(self, content):
+        """Разбор JSON ответа через json_decoder."""
+        if not content.strip():
+            return None
+        return (self._decoder or get_decoder())(content)
+
     def wrapper_call_exception(self, response, tapioca_exception,
                                api_params, *args, **kwargs):
         if response.status_code == 400:
@@ -79,6 +211,21 @@ class MytargetClientAdapter(JSONAdapterMixin, TapiocaAdapter):
             raise exceptions.MytargetApiError(response)
         raise tapioca_exception
 
+    def is_authentication_expired(self, exception, *args, **kwargs):
+        return exception.status_code == 401
+
+    def refresh_authentication(self, api_params, *args, **kwargs):
+        """Новый токен после ответа 401, если есть token_provider."""
+        token_provider = api_params.get('token_provider')
+        if not token_provider:
+            return None
+        logging.info('Токен не принят, запрос нового токена')
+        api_params['access_token'] = token_provider(
+            expired_token=api_params.get('access_token'))
+        emit(api_params.get('hooks'), {'type': TOKEN_REFRESH,
+                                       'time': time.time()})
+        return api_params['access_token']
+
     def retry_request(self, response, tapioca_exception, api_params,
                       *args, **kwargs):
         """
@@ -89,75 +236,178 @@ class MytargetClientAdapter(JSONAdapterMixin, TapiocaAdapter):
         response_data = tapioca_exception.client().data
         """
         response_data = tapioca_exception.client().data
-        remaining = response_data.get('remaining')
-        if remaining:
+        delay = self.limit_retry_delay(response_data, api_params)
+        if delay is not None:
+            emit(api_params.get('hooks'), request_event(
+                RETRY, response, delay=delay, reason='limit'))
+            time.sleep(delay)
+            return True
+        return False
+
+    def limit_retry_delay(self, response_data, api_params):
+        """
+        Через сколько секунд повторить запрос, получивший ответ 429.
+
+        :return: int, None : None, если запрос повторять не нужно.
+        """
+        remaining = (response_data or {}).get('remaining')
+        rate_limiter = api_params.get('rate_limiter')
+        if remaining and rate_limiter:
+            rate_limiter.update(remaining, response_data.get('limits'))
+            if api_params.get('retry_request_if_limit', False):
+                # Если по остаткам не видно исчерпанного окна,
+                # то повтор через 1 секунду, как и без ограничителя.
+                delay = rate_limiter.wait_time() or 1
+                if delay <= rate_limiter.max_wait:
+                    logging.debug('Исчерпан лимит запросов, '
+                                  'повтор через {:.2f} сек.'.format(delay))
+                    return delay
+                logging.info('Исчерпан лимит запросов')
+        elif remaining:
             if api_params.get('retry_request_if_limit', False):
                 if remaining.get('3600', remaining.get('60', True)):
                     if remaining.get('1') == 0:
                         logging.debug('Исчерпан лимит запросов, '
                                       'повтор через 1 секунду')
-                        time.sleep(1)
-                        return True
+                        return 1
                 else:
                     logging.info('Исчерпан лимит запросов')
-        return False
+        return None
 
     def to_df(self, data, *args, **kwargs):
         """Преобразование в DataFrame"""
         try:
-            df = json_normalize(data.get('items') or data)
+            df = _json_normalize(data.get('items') or data)
         except Exception:
             raise TypeError('Не удалось преобразовать в DataFrame')
         else:
             return df
 
 
-Mytarget = generate_wrapper_from_adapter(MytargetClientAdapter)
+class MytargetClient(TapiocaClient):
+    """
+    Клиент Tapioca, ресурсы которого выполняют запросы
+    через MytargetClientExecutor.
+    """
+
+    def _wrap_in_tapioca(self, data, *args, **kwargs):
+        request_kwargs = kwargs.pop('request_kwargs', self._request_kwargs)
+        return MytargetClient(
+            self._instatiate_api(), data=data, api_params=self._api_params,
+            request_kwargs=request_kwargs,
+            refresh_token_by_default=self._refresh_token_default,
+            refresh_data=self._refresh_data, session=self._session,
+            *args, **kwargs)
+
+    def _wrap_in_tapioca_executor(self, data, *args, **kwargs):
+        request_kwargs = kwargs.pop('request_kwargs', self._request_kwargs)
+        return MytargetClientExecutor(
+            self._instatiate_api(), data=data, api_params=self._api_params,
+            request_kwargs=request_kwargs,
+            refresh_token_by_default=self._refresh_token_default,
+            refresh_data=self._refresh_data, session=self._session,
+            *args, **kwargs)
+
+
+class MytargetClientExecutor(MytargetClient, TapiocaClientExecutor):
+    """
+    Выполняет запрос, как TapiocaClientExecutor, но ответ с ошибкой
+    передается адаптеру: retry_request решает, повторить ли запрос,
+    а wrapper_call_exception выбирает исключение.
+    В tapioca-wrapper 2.x эти методы адаптера не вызываются.
+    """
 
+    def _make_request(self, request_method, refresh_token=None,
+                      *args, **kwargs):
+        if 'url' not in kwargs:
+            kwargs['url'] = self._data
+
+        request_kwargs = self._api.get_request_kwargs(
+            self._api_params, request_method, *args, **kwargs)
+        response = self._session.request(request_method, **request_kwargs)
 
-class MytargetLight:
+        try:
+            data = self._api.process_response(response)
+        except ResponseProcessException as e:
+            client = self._wrap_in_tapioca(e.data, response=response,
+                                           request_kwargs=request_kwargs)
+            error_message = self._api.get_error_message(data=e.data,
+                                                        response=response)
+            tapioca_exception = e.tapioca_exception(message=error_message,
+                                                    client=client)
+
+            should_refresh_token = (refresh_token is not False and
+                                    self._refresh_token_default)
+            if (should_refresh_token and
+                    self._api.is_authentication_expired(tapioca_exception)):
+                self._refresh_data = self._api.refresh_authentication(
+                    self._api_params)
+                if self._refresh_data:
+                    return self._make_request(request_method,
+                                              refresh_token=False,
+                                              *args, **kwargs)
+
+            if self._api.retry_request(response, tapioca_exception,
+                                       self._api_params, *args, **kwargs):
+                return self._make_request(request_method, *args, **kwargs)
+            self._api.wrapper_call_exception(response, tapioca_exception,
+                                             self._api_params,
+                                             *args, **kwargs)
+
+        return self._wrap_in_tapioca(data, response=response,
+                                     request_kwargs=request_kwargs)
+
+
+class MytargetInstantiator(TapiocaInstantiator):
+    """
+    Создает клиент Mytarget.
+    С retry_policy сессия оборачивается в RetrySession.
+    """
+
+    def __call__(self, serializer_class=None, session=None, **kwargs):
+        retry_policy = kwargs.get('retry_policy')
+        if retry_policy is not None and not isinstance(session, RetrySession):
+            session = RetrySession(session or create_session(), retry_policy,
+                                   kwargs.get('hooks'))
+        refresh_token_default = kwargs.pop('refresh_token_by_default', False)
+        return MytargetClient(
+            self.adapter_class(serializer_class=serializer_class),
+            api_params=kwargs, refresh_token_by_default=refresh_token_default,
+            session=session)
+
+
+Mytarget = MytargetInstantiator(MytargetClientAdapter)
+
+
+class LocalResult:
+    """
+    Данные, собранные без запроса к API, например из кэша.
+    Как и у Tapioca, данные доступны через result().data
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    def __call__(self):
+        return self
+
+
+class MytargetLightBase:
+    """
+    Общие для MytargetLight и AsyncMytargetLight методы,
+    не отправляющие запросов: план запросов статистики
+    и преобразование ответов.
+    """
     CAMPAIGN_STATS = 'campaigns'
     BANNER_STATS = 'banners'
     USER_STATS = 'users'
     _SUMMARY_STATS = 'summary'
     _DAY_STATS = 'day'
-
-    def __init__(self, access_token,
-                 as_dataframe=False,
-                 retry_request_if_limit=True,
-                 language='ru',
-                 *args, **kwargs):
-        """
-        Обертка над классом Mytarget (низкоуровневой оберткой).
-
-        :param access_token: str : токен доступа
-        :param as_dataframe: bool : преобразовывать в DataFrame
-        :param retry_request_if_limit: bool : ожидать и повторять запрос,
-            если закончилась квота запросов к апи.
-        :param default_url_params: dict : параметры по умолчанию для вставки в url
-        :param language: str : ru|en|{other} :
-            язык в котором будут возвращены некоторые данные, например справочников.
-        :param args:
-        :param kwargs:
-        """
-        self._adapter = MytargetClientAdapter(
-            access_token=access_token,
-            retry_request_if_limit=retry_request_if_limit,
-            language=language,
-            *args, **kwargs)
-        self.low_api = Mytarget(
-            access_token=access_token,
-            retry_request_if_limit=retry_request_if_limit,
-            language=language,
-            *args, **kwargs)
-        self.as_dataframe = as_dataframe
+    metric_types = None
+    as_dataframe = False
 
     def _grouper_list(self, arr, count):
-        if count == 1:
-            return [[i] for i in arr]
-        else:
-            count = len(arr) // count + 1
-            return [arr[i::count] for i in range(count)]
+        return grouper_list(arr, count)
 
     def _period_range(self, date_from, date_to, delta):
         """
@@ -166,11 +416,13 @@ class MytargetLight:
         :param delta: int : кол-во дней в одном периоде
         :return: [..., ('2019-01-01', '2019-01-01')]
         """
+        from dateutil import parser
+
         if not isinstance(date_from, datetime) and \
             not isinstance(date_from, datetime_.date):
             date_from = parser.parse(date_from)
-        if not isinstance(date_from, datetime) and \
-            not isinstance(date_from, datetime_.date):
+        if not isinstance(date_to, datetime) and \
+            not isinstance(date_to, datetime_.date):
             date_to = parser.parse(date_to)
 
         periods = []
@@ -187,18 +439,91 @@ class MytargetLight:
                             dt2.strftime('%Y-%m-%d')))
         return periods
 
+    def _stats_to_columns(self, results):
+        """
+        Раскладывает строки статистики по колонкам.
+        Колонки те же, что дал бы json_normalize по каждому объекту.
+
+        :return: ({'date': [...], 'base.shows': [...], ..., 'id': [...]}, кол-во строк)
+        """
+        columns = {}
+        n = 0
+
+        def column(name):
+            values = columns.get(name)
+            if values is None:
+                values = columns[name] = []
+            if len(values) < n:
+                values.extend([None] * (n - len(values)))
+            return values
+
+        for result in results:
+            for i in result().data['items']:
+                rows = i.get('rows') or [i.get('total')]
+                fields = self._stats_fields(rows)
+                if fields is None:
+                    # Строки отличаются набором метрик, разворачиваются по одной.
+                    for row_n, row in enumerate(rows):
+                        for name, value in _flatten(row).items():
+                            values = column(name)
+                            if len(values) < n + row_n:
+                                values.extend(
+                                    [None] * (n + row_n - len(values)))
+                            values.append(value)
+                else:
+                    # Группы метрик base, events, uniques, video, viral, tps
+                    # одинаковые во всех строках, колонка берется целиком.
+                    for key, metrics in fields:
+                        if metrics is None:
+                            column(key).extend([row[key] for row in rows])
+                        else:
+                            for metric in metrics:
+                                column(key + '.' + metric).extend(
+                                    [row[key][metric] for row in rows])
+                column('id').extend([i['id']] * len(rows))
+                n += len(rows)
+
+        for values in columns.values():
+            if len(values) < n:
+                values.extend([None] * (n - len(values)))
+        return columns, n
+
+    def _stats_fields(self, rows):
+        """
+        Набор полей строк статистики: [(ключ, метрики группы или None), ...]
+        None, если строки различаются набором полей
+        или вложенность метрик больше одного уровня.
+        """
+        first = rows[0]
+        fields = []
+        for key, value in first.items():
+            if isinstance(value, dict):
+                if any(isinstance(v, dict) for v in value.values()):
+                    return None
+                fields.append((key, tuple(value)))
+            else:
+                fields.append((key, None))
+        for row in rows:
+            if len(row) != len(first):
+                return None
+            for key, metrics in fields:
+                if key not in row:
+                    return None
+                if metrics is not None and (
+                        not isinstance(row[key], dict)
+                        or len(row[key]) != len(metrics)):
+                    return None
+        return fields
+
     def _stats_to_df(self, results):
         """Преобразует данные статистики в dataframe."""
+        import pandas as pd
+
         try:
-            df_list = []
-            for result in results:
-                result = result().data
-                for i in result['items']:
-                    rows = i.get('rows') or i.get('total')
-                    df_ = json_normalize(rows)
-                    df_['id'] = i['id']
-                    df_list.append(df_)
-            df = pd.concat(df_list, sort=False).reset_index(drop=True)
+            columns, _ = self._stats_to_columns(results)
+            df = pd.DataFrame(columns)
+            if self.metric_types:
+                df = coerce_frame(df, self.metric_types)
         except Exception:
             raise TypeError('Не удалось преобразовать в DataFrame')
         else:
@@ -206,11 +531,13 @@ class MytargetLight:
 
     def _objects_to_df(self, results):
         """Преобразует данные объектов в dataframe."""
+        import pandas as pd
+
         try:
             df_list = []
             for result in results:
                 data = result().data
-                df_ = json_normalize(data.get('items') or result)
+                df_ = _json_normalize(data.get('items') or result)
                 df_list.append(df_)
             df = pd.concat(df_list, sort=False).reset_index(drop=True)
         except Exception:
@@ -218,12 +545,52 @@ class MytargetLight:
         else:
             return df
 
+    def _objects_to_columns(self, results):
+        """
+        Раскладывает объекты по колонкам, вложенные поля
+        разворачиваются как в json_normalize.
+
+        :return: ({'id': [...], 'name': [...], ...}, кол-во объектов)
+        """
+        columns = {}
+        n = 0
+        for result in results:
+            data = result().data
+            for item in data.get('items') or [data]:
+                for name, value in _flatten(item).items():
+                    values = columns.setdefault(name, [])
+                    if len(values) < n:
+                        values.extend([None] * (n - len(values)))
+                    values.append(value)
+                n += 1
+
+        for values in columns.values():
+            if len(values) < n:
+                values.extend([None] * (n - len(values)))
+        return columns, n
+
+    def _stats_to_arrow(self, results):
+        """Преобразует данные статистики в таблицу pyarrow."""
+        columns, _ = self._stats_to_columns(results)
+        return columns_table(columns)
+
+    def _objects_to_arrow(self, results):
+        """Преобразует данные объектов в таблицу pyarrow."""
+        columns, _ = self._objects_to_columns(results)
+        return columns_table(columns)
+
     def _to_format(self, method, results, as_dataframe=None,
-                   is_union_results=True):
+                   is_union_results=True, as_arrow=False):
         """Преобразует в указанный формат."""
-        if (self.as_dataframe and as_dataframe is not False) \
+        if as_arrow:
+            if method == 'get_stats':
+                return self._stats_to_arrow(results)
+            else:
+                return self._objects_to_arrow(results)
+
+        elif (self.as_dataframe and as_dataframe is not False) \
             or as_dataframe:
-            if method == self.get_stats.__name__:
+            if method == 'get_stats':
                 return self._stats_to_df(results)
             else:
                 return self._objects_to_df(results)
@@ -243,64 +610,356 @@ class MytargetLight:
             # Каждый ответ отдельно, в списке.
             return results
 
+    def _page_offsets(self, count, offset, limit, limit_in_request):
+        """
+        Список (offset, limit) для запросов оставшихся страниц объектов,
+        после первого запроса, в ответе которого стало известно count.
+        """
+        end = min(count, offset + limit) if limit else count
+        offsets = range(offset + limit_in_request, end, limit_in_request)
+        return [(i, min(limit_in_request, end - i)) for i in offsets]
+
+    def _period_dates(self, date_from, date_to):
+        """Список дней периода: ['2019-01-01', '2019-01-02', ...]"""
+        date_from = datetime.strptime(date_from, '%Y-%m-%d')
+        date_to = datetime.strptime(date_to, '%Y-%m-%d')
+        return [(date_from + timedelta(i)).strftime('%Y-%m-%d')
+                for i in range((date_to - date_from).days + 1)]
+
+    def _stats_to_rows(self, result):
+        """Строки статистики из одного ответа."""
+        for i in result().data['items']:
+            rows = i.get('rows') or [i.get('total')]
+            for row in rows:
+                row = _flatten(row)
+                row['id'] = i['id']
+                yield row
+
+    def _check_stats_params(self, limit_in_request, interval):
+        if limit_in_request > 200:
+            raise ValueError('limit_in_request должен быть <= 200')
+        if interval > 92:
+            raise ValueError('delta_period должен быть <= 92')
+        if interval < 1:
+            raise ValueError('interval должен быть больше 0')
+
+    def _stats_requests_params(self, ids, date_from, date_to, metrics,
+                               limit_in_request, interval, lifetimes=None,
+                               sizer=None):
+        """
+        Параметры запросов статистики.
+
+        :param lifetimes: dict : {id: (начало, конец)} время жизни объектов,
+            объекты не запрашиваются за периоды вне времени жизни.
+        :param sizer: ChunkSizer : размер запросов берется из него
+            по ходу запросов, вместо limit_in_request и interval.
+        :return: (time_mode, [(ids_str, params), ...]),
+            с sizer вместо списка генератор
+        """
+        get_params = {}
+        if metrics:
+            if isinstance(metrics, list):
+                metrics = ','.join(map(str, metrics))
+            get_params.update(metrics=metrics)
+
+        if date_from or date_to:
+            time_mode = self._DAY_STATS
+        else:
+            time_mode = self._SUMMARY_STATS
+
+        # Объекты делятся на группы для запросов.
+        # Макс. кол-во объектов для запроса 200.
+        if lifetimes is not None:
+            lifetimes = {str(k): v for k, v in lifetimes.items()}
+            ids = [str(i) for i in ids]
+        if sizer is not None:
+            dates = None
+            if time_mode == self._DAY_STATS:
+                dates = [period[0] for period in self._period_range(
+                    date_from, date_to, delta=0)]
+            plan = plan_adaptive_requests(ids, dates, sizer, lifetimes)
+        else:
+            periods = [{}]
+            if time_mode == self._DAY_STATS:
+                # Макс. период запроса 92 дня.
+                # Если запрашиваемый интервал превышает,
+                # то разделяется на несколько перидов.
+                periods = self._period_range(
+                    date_from, date_to, delta=interval - 1)
+            plan = plan_requests(ids, periods, limit_in_request, lifetimes)
+
+        def request_params(ids, period):
+            params = dict(get_params)
+            if period:
+                params.update(date_from=period[0])
+                params.update(date_to=period[1])
+            return ','.join(map(str, ids)), params
+
+        requests_params = (request_params(ids, period)
+                           for ids, period in plan)
+        if sizer is None:
+            requests_params = list(requests_params)
+        return time_mode, requests_params
+
+    def _mass_action_chunks(self, changes, limit_in_request):
+        """Проверяет изменения mass_action и делит их на запросы."""
+        changes = list(changes)
+        for change in changes:
+            if 'id' not in change:
+                raise ValueError('У каждого изменения должен быть id: {}'
+                                 .format(change))
+        if not 0 < limit_in_request <= 200:
+            raise ValueError('limit_in_request должен быть от 1 до 200')
+        return [changes[i:i + limit_in_request]
+                for i in range(0, len(changes), limit_in_request)]
+
+    def _mass_action_failure(self, exception):
+        """
+        Ошибка запроса mass_action, завершившегося exception.
+
+        :return: (ошибка, bool : запрос отклонен API с ответом 400,
+            и его можно делить, чтобы найти объекты с ошибкой)
+        """
+        response = getattr(exception, 'response', None)
+        if response is None and getattr(exception, 'client', None):
+            # ClientError и ServerError из tapioca.
+            response = exception.client().response
+        if getattr(response, 'status_code', None) != 400:
+            return repr(exception), False
+        try:
+            error = response.json()
+        except ValueError:
+            error = response.text
+        return error, True
+
+    def _mass_action_halves(self, chunk, failure):
+        """
+        Половины отклоненного запроса mass_action для повторной отправки
+        или None, если запрос принят или ошибку не найти делением.
+        """
+        if failure is None or not failure[1] or len(chunk) == 1:
+            return None
+        middle = len(chunk) // 2
+        return chunk[:middle], chunk[middle:]
+
+    def _mass_action_stop_split(self, failures):
+        """
+        Если отклонены обе половины запроса, то ошибка относится
+        ко всему запросу, а не к отдельным объектам,
+        и дальнейшее деление только тратит квоту.
+        """
+        if all(failure and failure[1] for failure in failures):
+            return [(error, False) for error, rejected in failures]
+        return failures
+
+    def _mass_action_results(self, chunk, failure):
+        error = failure[0] if failure else None
+        return [(change['id'], error) for change in chunk]
+
+    def _mass_action_report(self, results, as_dataframe=None):
+        """
+        Отчет по объектам из результатов запросов mass_action.
+
+        :param results: [[(id, ошибка или None), ...], ...]
+        """
+        report = [{'id': object_id, 'ok': error is None, 'error': error}
+                  for chunk_results in results
+                  for object_id, error in chunk_results]
+        errors = sum(not i['ok'] for i in report)
+        if errors:
+            logging.warning('Не изменено {} из {} объектов'
+                            .format(errors, len(report)))
+
+        if (self.as_dataframe and as_dataframe is not False) or \
+                as_dataframe:
+            import pandas as pd
+
+            return pd.DataFrame(report, columns=['id', 'ok', 'error'])
+        return report
+
+
+class MytargetLight(MytargetLightBase):
+    def __init__(self, access_token,
+                 as_dataframe=False,
+                 retry_request_if_limit=True,
+                 language='ru',
+                 max_workers=1,
+                 rate_limiter=None,
+                 session=None,
+                 cache=None,
+                 catalog=None,
+                 metric_types=None,
+                 token_provider=None,
+                 chunk_sizer=None,
+                 retry_policy=None,
+                 *args, **kwargs):
+        """
+        Обертка над классом Mytarget (низкоуровневой оберткой).
+
+        :param access_token: str : токен доступа
+        :param as_dataframe: bool : преобразовывать в DataFrame
+        :param retry_request_if_limit: bool : ожидать и повторять запрос,
+            если закончилась квота запросов к апи.
+        :param default_url_params: dict : параметры по умолчанию для вставки в url
+        :param language: str : ru|en|{other} :
+            язык в котором будут возвращены некоторые данные, например справочников.
+        :param max_workers: int : кол-во одновременно отправляемых запросов,
+            при значении больше 1 запросы выполняются в пуле потоков.
+        :param rate_limiter: RateLimiter : ограничитель частоты запросов,
+            общий для всех потоков. Если не указан и retry_request_if_limit,
+            то будет создан.
+        :param session: requests.Session : сессия с пулом соединений,
+            если не указана, то будет создана через create_session
+            с пулом не меньше max_workers.
+        :param cache: StatsCache : кэш статистики по дням,
+            строки за прошедшие дни берутся из него.
+        :param catalog: ObjectCatalog : каталог кампаний и баннеров,
+            get_stats берет из него идентификаторы объектов,
+            обновляя только измененные объекты.
+        :param metric_types: str : float|decimal : приводить метрики
+            статистики в DataFrame к числам: счетчики к int64,
+            деньги и коэффициенты к float64 или Decimal.
+            По умолчанию остаются как в ответе API, деньги строками.
+        :param token_provider: TokenProvider : источник токена
+            из MytargetAuth.token_provider, access_token можно не указывать.
+            Токен обновляется перед истечением, а запрос с ответом 401
+            повторяется один раз с новым токеном.
+        :param chunk_sizer: ChunkSizer : подбирать кол-во объектов и дней
+            в запросах статистики по времени и размеру ответов,
+            вместо limit_in_request и interval. Запрос, не дождавшийся
+            ответа, делится пополам и повторяется.
+            Таймаут задается через timeout.
+        :param retry_policy: RetryPolicy : повторять запросы при ответах 5xx,
+            обрывах соединения и таймаутах с растущей паузой,
+            с CircuitBreaker останавливать запросы всех потоков,
+            если API не отвечает.
+        :param args:
+        :param kwargs:
+        """
+        if rate_limiter is None and retry_request_if_limit:
+            rate_limiter = RateLimiter()
+        self.rate_limiter = rate_limiter
+        if session is None:
+            session = create_session(pool_maxsize=max(max_workers, 10))
+        self.session = session
+        self.cache = cache
+        self.catalog = catalog
+        self.chunk_sizer = chunk_sizer
+        if metric_types not in (None, FLOAT, DECIMAL):
+            raise ValueError('metric_types может быть только {} или {}'
+                             .format(FLOAT, DECIMAL))
+        self.metric_types = metric_types
+        if token_provider is not None:
+            kwargs.update(token_provider=token_provider,
+                          refresh_token_by_default=True)
+        if retry_policy is not None:
+            kwargs.update(retry_policy=retry_policy)
+        # Общий список хуков, get_stats(plan_only=True)
+        # временно добавляет в него счетчик запросов.
+        self._hooks = list(kwargs.pop('hooks', None) or [])
+        self.low_api = Mytarget(
+            access_token=access_token,
+            retry_request_if_limit=retry_request_if_limit,
+            language=language,
+            rate_limiter=rate_limiter,
+            session=session,
+            hooks=self._hooks,
+            *args, **kwargs)
+        self.as_dataframe = as_dataframe
+        self.max_workers = max_workers
+
+    def _map(self, func, iterable, max_workers=None):
+        """
+        Вызывает func для каждого элемента iterable.
+        Если max_workers больше 1, то вызовы выполняются в пуле потоков.
+        Результаты возвращаются в том же порядке, что и элементы iterable.
+        """
+        return list(self._imap(func, iterable, max_workers))
+
+    def _imap(self, func, iterable, max_workers=None):
+        """
+        Генератор, как _map, но результаты отдаются по мере готовности,
+        а в работе одновременно не больше max_workers вызовов.
+        """
+        max_workers = max_workers or self.max_workers
+        if max_workers <= 1:
+            yield from map(func, iterable)
+            return
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = deque()
+            for item in iterable:
+                futures.append(executor.submit(func, item))
+                if len(futures) >= max_workers:
+                    yield futures.popleft().result()
+            while futures:
+                yield futures.popleft().result()
+
     def _request_objects(self, method, limit=None, params=None,
-                         limit_in_request=50, as_dataframe=False):
+                         limit_in_request=50, as_dataframe=False,
+                         max_workers=None, as_arrow=False):
         """
         Метод запрашивает все объекты.
+
+        Из первого ответа становится известно кол-во объектов,
+        после чего остальные страницы запрашиваются одновременно,
+        если max_workers больше 1.
         """
         if params and params.get('limit'):
             raise ValueError('Укажите limit при вызове метода, а не в параметре.')
         params = params or {}
         offset = params.get('offset') or 0
-        # 1 ставим, чтоб сделать первый запрос,
-        # а в ответе станет ясно, сколько сделать запросов.
-        count = limit or 1
-        results = []
-        while count > offset:
-            if limit and limit_in_request > limit:
-                limit_in_request = limit
-            if limit and (count - offset) / limit_in_request < 1:
-                # При последнем запросе, нужно ограничить
-                # кол-во запрашиваемых объектов до оставшегося кол-ва.
-                limit_in_request = count - offset
-            result = method.get(
-                params={'limit': limit_in_request,
-                        'offset': offset,
-                        **params})
-            data = result().data
-            results.append(result)
-
-            if not data.get('count'):
-                # Есть нет count, значит в ответе только один объект.
-                break
-            elif limit and data.get('count') < limit:
-                # Если объектов меньше, чем указанный limit,
-                # то он уменьшается до count.
-                count = data.get('count')
-            elif limit:
-                # Ограничение по указанному limit.
-                count = limit
-            else:
-                # Получение всех объектов.
-                count = data.get('count')
-            offset = data['offset'] + limit_in_request
+        if limit and limit_in_request > limit:
+            limit_in_request = limit
+
+        result = method.get(
+            params={'limit': limit_in_request,
+                    'offset': offset,
+                    **params})
+        results = [result]
+
+        count = result().data.get('count')
+        # Есть нет count, значит в ответе только один объект.
+        if count:
+            def request_page(page):
+                page_offset, page_limit = page
+                return method.get(
+                    params={**params,
+                            'limit': page_limit,
+                            'offset': page_offset})
+
+            pages = self._page_offsets(count, offset, limit, limit_in_request)
+            results += self._map(request_page, pages, max_workers)
 
         return self._to_format(self._request_objects.__name__,
-                               results, as_dataframe=as_dataframe)
+                               results, as_dataframe=as_dataframe,
+                               as_arrow=as_arrow)
 
-    def _get_objects_for_request_stats(self, object_type, limit):
+    def _get_objects_for_request_stats(self, object_type, limit,
+                                       max_workers=None):
         """
         Получение идентификаторов объектов,
         по которым будет запрошена статистика.
         """
+        if self.catalog is not None and \
+                object_type in (self.CAMPAIGN_STATS, self.BANNER_STATS):
+            self.catalog.refresh(self, object_type)
+            # Удаленные объекты хранятся в каталоге для plan_by_lifetime,
+            # а статистика, как и без каталога, только по активным
+            # и остановленным.
+            ids = self.catalog.ids(object_type,
+                                   statuses=self.catalog.DEFAULT_STATUSES)
+            return ids[:limit] if limit else ids
+
         if object_type == self.CAMPAIGN_STATS:
             data = self.get_campaigns(
-                limit=limit, as_dataframe=False, params={'fields': 'id'})
+                limit=limit, as_dataframe=False, params={'fields': 'id'},
+                max_workers=max_workers)
             ids = [i['id'] for i in data]
 
         elif object_type == self.BANNER_STATS:
             data = self.get_banners(
-                limit=limit, as_dataframe=False, params={'fields': 'id'})
+                limit=limit, as_dataframe=False, params={'fields': 'id'},
+                max_workers=max_workers)
             ids = [i['id'] for i in data]
 
         elif object_type == self.USER_STATS:
@@ -315,11 +974,13 @@ class MytargetLight:
                                      self.USER_STATS))
         return ids
 
-    def get_stats(self, object_type=CAMPAIGN_STATS,
+    def get_stats(self, object_type=MytargetLightBase.CAMPAIGN_STATS,
                   date_from=None, date_to=None, metrics=None,
                   ids=None, as_dataframe=None, limit=None,
                   limit_in_request=200, interval=92,
-                  is_union_results=True):
+                  is_union_results=True, max_workers=None,
+                  plan_by_lifetime=False, plan_only=False,
+                  prune_inactive=False, dense=False, as_arrow=False):
         """
         https://target.my.com/adv/api-marketing/doc/stat-v2
 
@@ -343,9 +1004,36 @@ class MytargetLight:
             для которых запросить статистику. Например для теста.
         :param interval: int : кол-во дней в периоде в одном запросе, максимум 92
         :param is_union_results: bool : объединить результаты в один список
+        :param max_workers: int : кол-во одновременно отправляемых запросов,
+            по умолчанию берется из max_workers при создании класса.
+        :param plan_by_lifetime: bool : для статистики по дням не запрашивать
+            объекты за периоды, когда они не существовали или были остановлены.
+            Время жизни берется из каталога, а без него запрашивается
+            вместе со списком объектов.
+        :param plan_only: bool : не запрашивать статистику,
+            а вернуть план запросов:
+            {"time_mode": "day",
+             "requests": [{"ids": [...], "date_from": ..., "date_to": ...}],
+             "planning_requests": 4,
+             "quota_cost": 6,
+             "inactive_ids": [...]}
+            Для плана отправляются запросы списка объектов, если не
+            указаны ids, и суммарной статистики с prune_inactive,
+            их кол-во в planning_requests. quota_cost - запросы плана
+            и запросы статистики по плану.
+        :param prune_inactive: bool : для статистики по дням сначала
+            запросить суммарную статистику объектов, по дням запрашивать
+            только объекты, у которых она не нулевая.
+            Суммарная статистика - за все время, т.к. она не принимает даты.
+        :param dense: bool : вместе с prune_inactive, добавить
+            нулевые строки по дням для объектов без статистики.
+        :param as_arrow: bool : вернуть таблицу pyarrow.Table
+            с типизированными колонками, нужен pyarrow.
         :return dict, list :
 
-        if as_dataframe True:
+        if as_arrow True:
+            pyarrow.Table
+        elif as_dataframe True:
             DataFrame
         elif is_union_results True:
             [{"items": [...], "total": [...]},
@@ -407,58 +1095,416 @@ class MytargetLight:
             }
         }
         """
-        if limit_in_request > 200:
-            raise ValueError('limit_in_request должен быть <= 200')
-        if interval > 92:
-            raise ValueError('delta_period должен быть <= 92')
-        if interval < 1:
-            raise ValueError('interval должен быть больше 0')
+        if plan_only:
+            responses = []
 
-        if not ids:
-            ids = self._get_objects_for_request_stats(
-                object_type, limit=limit)
+            def count_response(event):
+                if event['type'] == RESPONSE:
+                    responses.append(event['status'])
 
-        get_params = {}
-        if metrics:
-            if isinstance(metrics, list):
-                metrics = ','.join(map(str, metrics))
-            get_params.update(metrics=metrics)
+            self._hooks.append(count_response)
+            try:
+                time_mode, requests_params, inactive = self._plan_stats(
+                    object_type, date_from, date_to, metrics, ids, limit,
+                    limit_in_request, interval, max_workers,
+                    plan_by_lifetime, prune_inactive)
+            finally:
+                self._hooks.remove(count_response)
+            plan = [dict(params, ids=ids_str.split(','))
+                    for ids_str, params in requests_params]
+            return {'time_mode': time_mode, 'requests': plan,
+                    'planning_requests': len(responses),
+                    'quota_cost': len(responses) + len(plan),
+                    'inactive_ids': list(inactive)}
+
+        results = list(self._iter_stats_results(
+            object_type, date_from, date_to, metrics, ids, limit,
+            limit_in_request, interval, max_workers, plan_by_lifetime,
+            prune_inactive, dense))
 
-        if date_from or date_to:
-            # Макс. период запроса 92 дня.
-            # Если запрашиваемый интервал превышает,
-            # то разделяется на несколько перидов.
-            time_mode = self._DAY_STATS
-            periods = self._period_range(
-                date_from, date_to, delta=interval - 1)
+        return self._to_format(self.get_stats.__name__, results,
+                               as_dataframe, is_union_results, as_arrow)
+
+    def iter_stats(self, object_type=MytargetLightBase.CAMPAIGN_STATS,
+                   date_from=None, date_to=None, metrics=None,
+                   ids=None, as_dataframe=None, limit=None,
+                   limit_in_request=200, interval=92, max_workers=None,
+                   plan_by_lifetime=False, prune_inactive=False, dense=False,
+                   as_arrow=False):
+        """
+        Генератор статистики, параметры те же, что у get_stats.
+
+        Данные отдаются сразу после получения каждого ответа,
+        поэтому в памяти не копятся все ответы.
+
+        :return:
+        if as_arrow True:
+            pyarrow.Table по каждому ответу
+        elif as_dataframe True:
+            DataFrame по каждому ответу
         else:
-            time_mode = self._SUMMARY_STATS
-            periods = [{}]
+            строки статистики, вложенные метрики развернуты:
+            {"date": "2017-09-20", "base.shows": 123757, ..., "id": 857683}
+        """
+        results = self._iter_stats_results(
+            object_type, date_from, date_to, metrics, ids, limit,
+            limit_in_request, interval, max_workers, plan_by_lifetime,
+            prune_inactive, dense)
+        for result in results:
+            if as_arrow:
+                yield self._stats_to_arrow([result])
+            elif (self.as_dataframe and as_dataframe is not False) \
+                or as_dataframe:
+                yield self._stats_to_df([result])
+            else:
+                yield from self._stats_to_rows(result)
+
+    def to_parquet(self, path,
+                   object_type=MytargetLightBase.CAMPAIGN_STATS,
+                   date_from=None, date_to=None, metrics=None,
+                   ids=None, limit=None, limit_in_request=200, interval=92,
+                   max_workers=None, plan_by_lifetime=False,
+                   prune_inactive=False, dense=False, partition_by=None,
+                   chunk_rows=100000):
+        """
+        Записывает статистику в Parquet, параметры те же, что у get_stats.
+
+        Строки записываются порциями по мере получения ответов,
+        см. export_stats. Нужен pyarrow.
+        Схема файла строится заранее по группам метрик metrics,
+        без metrics - по группе base, поэтому группы, появившиеся
+        не в первом ответе, не теряются. Метрики, которых нет
+        в schema.METRICS, берутся из первой порции, а появившиеся
+        позже не записываются, с предупреждением в лог.
+
+        :param path: str : путь к файлу или к папке, если указан partition_by
+        :param partition_by: str, list : колонки для разбиения на папки,
+            например 'date'
+        :param chunk_rows: int : макс. кол-во строк в одной порции
+        :return: int : кол-во записанных строк
+        """
+        schema = stats_schema(metrics, with_date=bool(date_from or date_to))
+        return self.export_stats(
+            ParquetSink(path, partition_by, schema, strict=False),
+            chunk_rows, object_type, date_from, date_to, metrics, ids, limit,
+            limit_in_request, interval, max_workers, plan_by_lifetime,
+            prune_inactive, dense)
+
+    def export_stats(self, sink, chunk_rows=100000,
+                     object_type=MytargetLightBase.CAMPAIGN_STATS,
+                     date_from=None, date_to=None, metrics=None,
+                     ids=None, limit=None, limit_in_request=200,
+                     interval=92, max_workers=None, plan_by_lifetime=False,
+                     prune_inactive=False, dense=False):
+        """
+        Выгружает статистику порциями, параметры те же, что у get_stats.
 
-        # Создаются список списков из объектов, для запросов.
-        # Макс. кол-во объектов для запроса 200 дня.
-        ids_groups = self._grouper_list(ids, limit_in_request)
+        Строки копятся в буфере не больше chunk_rows строк,
+        заполненный буфер передается в приемник и очищается.
+        В памяти одновременно только буфер и не больше
+        max_workers ответов, сколько бы ни было объектов и дней.
 
-        results = []
-        for ids in ids_groups:
-            ids_str = ','.join(map(str, ids))
+        sink = CsvSink('stats.csv')
+        light_api.export_stats(sink, date_from='2019-01-01',
+                               date_to='2019-12-31')
 
-            for period in periods:
-                if period:
-                    get_params.update(date_from=period[0])
-                    get_params.update(date_to=period[1])
+        :param sink: CsvSink, ParquetSink, CallbackSink или функция,
+            принимающая DataFrame. Закрывается после выгрузки.
+        :param chunk_rows: int : макс. кол-во строк в одной порции
+        :return: int : кол-во выгруженных строк
+        """
+        results = self._iter_stats_results(
+            object_type, date_from, date_to, metrics, ids, limit,
+            limit_in_request, interval, max_workers, plan_by_lifetime,
+            prune_inactive, dense)
+        return self._export_results(sink, results, chunk_rows)
+
+    def _export_results(self, sink, results, chunk_rows):
+        """Передает строки ответов статистики в приемник порциями."""
+        if callable(sink) and not hasattr(sink, 'write_columns'):
+            sink = CallbackSink(sink, self.metric_types)
+        rows = 0
+        try:
+            if chunk_rows < 1:
+                raise ValueError('chunk_rows должен быть больше 0')
+            for columns, n in self._iter_stats_chunks(results, chunk_rows):
+                sink.write_columns(columns)
+                rows += n
+        finally:
+            sink.close()
+        return rows
+
+    def _iter_stats_chunks(self, results, chunk_rows):
+        """
+        Колонки строк статистики порциями не больше chunk_rows строк.
 
-                result = self.low_api.stats2(object_type=object_type,
-                                             time_mode=time_mode, ids=ids_str) \
-                    .get(params=get_params)
+        :return: генератор ({'date': [...], ..., 'id': [...]}, кол-во строк)
+        """
+        buffer = {}
+        n = 0
+        for result in results:
+            columns, rows = self._stats_to_columns([result])
+            for name in list(buffer) + [c for c in columns
+                                        if c not in buffer]:
+                values = buffer.setdefault(name, [None] * n)
+                values.extend(columns.get(name) or [None] * rows)
+            n += rows
+            while n >= chunk_rows:
+                yield ({name: values[:chunk_rows]
+                        for name, values in buffer.items()}, chunk_rows)
+                buffer = {name: values[chunk_rows:]
+                          for name, values in buffer.items()}
+                n -= chunk_rows
+        if n:
+            yield buffer, n
+
+    def _plan_stats(self, object_type, date_from, date_to, metrics, ids,
+                    limit, limit_in_request, interval, max_workers,
+                    plan_by_lifetime=False, prune_inactive=False,
+                    sizer=None):
+        """
+        План запросов статистики.
+        С sizer план - генератор, размер запросов подбирается по ходу.
 
-                results.append(result)
+        :return: (time_mode, [(ids_str, params), ...],
+                  {id объекта без статистики: его нулевая статистика})
+        """
+        self._check_stats_params(limit_in_request, interval)
 
-        return self._to_format(self.get_stats.__name__, results,
-                               as_dataframe, is_union_results)
+        use_lifetimes = plan_by_lifetime and (date_from or date_to) and \
+            object_type in (self.CAMPAIGN_STATS, self.BANNER_STATS)
+
+        if not ids and not (use_lifetimes and self.catalog is None):
+            ids = self._get_objects_for_request_stats(
+                object_type, limit=limit, max_workers=max_workers)
+
+        lifetimes = None
+        if use_lifetimes:
+            lifetimes = self._get_objects_lifetimes(object_type, ids,
+                                                    max_workers)
+            if not ids:
+                # Список объектов получен вместе со временем жизни.
+                ids = list(lifetimes)
+                ids = ids[:limit] if limit else ids
+
+        inactive = {}
+        if prune_inactive and (date_from or date_to):
+            inactive = self._get_inactive_objects(
+                object_type, ids, metrics, limit_in_request, max_workers)
+            ids = [i for i in ids if str(i) not in inactive]
+
+        time_mode, requests_params = self._stats_requests_params(
+            ids, date_from, date_to, metrics, limit_in_request, interval,
+            lifetimes, sizer)
+        return time_mode, requests_params, inactive
+
+    def _get_inactive_objects(self, object_type, ids, metrics,
+                              limit_in_request, max_workers=None):
+        """
+        Объекты, у которых вся суммарная статистика нулевая.
+        Один запрос суммарной статистики на группу объектов.
+
+        :return: {'id': нулевая статистика total объекта}
+        """
+        _, requests_params = self._stats_requests_params(
+            ids, None, None, metrics, limit_in_request, interval=92)
+
+        def request_summary(request_params):
+            ids_str, params = request_params
+            return self._request_stats(
+                object_type, self._SUMMARY_STATS, ids_str, params)
+
+        inactive = {}
+        for result in self._imap(request_summary, requests_params,
+                                 max_workers):
+            for item in result().data['items']:
+                if _is_zero(item.get('total') or {}):
+                    inactive[str(item['id'])] = item.get('total') or {}
+        logging.debug('Объектов без статистики: {}'.format(len(inactive)))
+        return inactive
+
+    def _zero_stats_result(self, inactive, date_from, date_to):
+        """Нулевые строки по дням для объектов без статистики."""
+        periods = self._period_range(date_from, date_to, delta=0)
+        dates = [period[0] for period in periods]
+        items = [{'id': int(object_id),
+                  'rows': [dict({'date': day}, **total) for day in dates]}
+                 for object_id, total in inactive.items()]
+        return LocalResult({'items': items})
+
+    def _get_objects_lifetimes(self, object_type, ids=None, max_workers=None):
+        """
+        Время жизни объектов из каталога или из списка объектов.
+        Если ids известны, то запрашиваются только они,
+        через фильтр _id__in по одной странице на запрос.
+
+        :return: {id: ('2019-01-01' или None, '2019-02-01' или None)}
+        """
+        if self.catalog is not None:
+            objects = self.catalog.objects(object_type)
+            return {i['id']: object_lifetime(i) for i in objects}
+
+        if object_type == self.CAMPAIGN_STATS:
+            get_objects = self.get_campaigns
+        else:
+            get_objects = self.get_banners
+        params = {'fields': LIFETIME_FIELDS[object_type]}
+        if ids:
+            def get_page(page_ids):
+                return get_objects(
+                    params=dict(params,
+                                _id__in=','.join(map(str, page_ids)),
+                                _status__in='active,blocked,deleted'),
+                    as_dataframe=False, max_workers=1)
+
+            pages = self._map(get_page, self._grouper_list(ids, 50),
+                              max_workers)
+            objects = [i for page in pages for i in page]
+        else:
+            objects = get_objects(params=params, as_dataframe=False,
+                                  max_workers=max_workers)
+        return {i['id']: object_lifetime(i) for i in objects}
+
+    def _iter_stats_results(self, object_type, date_from, date_to, metrics,
+                            ids, limit, limit_in_request, interval,
+                            max_workers, plan_by_lifetime=False,
+                            prune_inactive=False, dense=False):
+        """Генератор ответов на запросы статистики."""
+        time_mode, requests_params, inactive = self._plan_stats(
+            object_type, date_from, date_to, metrics, ids, limit,
+            limit_in_request, interval, max_workers, plan_by_lifetime,
+            prune_inactive, self.chunk_sizer)
+
+        request_stats = self._stats_request_func(object_type, time_mode)
+        results = self._imap(request_stats, requests_params, max_workers)
+        if dense and inactive:
+            return itertools.chain(results, [self._zero_stats_result(
+                inactive, date_from, date_to)])
+        return results
+
+    def _stats_request_func(self, object_type, time_mode):
+        """
+        Функция запроса статистики по (ids_str, params) из плана,
+        с кэшем и chunk_sizer, если они указаны.
+        """
+        def request(ids_str, params):
+            if self.cache is not None and time_mode == self._DAY_STATS:
+                return self._request_stats_cached(
+                    object_type, time_mode, ids_str, params)
+            return self._request_stats(
+                object_type, time_mode, ids_str, params)
+
+        def request_stats(request_params):
+            ids_str, params = request_params
+            if self.chunk_sizer is not None:
+                return self._request_stats_adaptive(request, ids_str, params)
+            return request(ids_str, params)
+
+        return request_stats
+
+    def _request_stats(self, object_type, time_mode, ids_str, params):
+        return self.low_api.stats2(object_type=object_type,
+                                   time_mode=time_mode, ids=ids_str) \
+            .get(params=params)
+
+    def _request_stats_adaptive(self, request, ids_str, params):
+        """
+        Запрос статистики с учетом ответа в chunk_sizer.
+
+        Запрос, не дождавшийся ответа, делится пополам по объектам,
+        а для одного объекта - по дням, части запрашиваются заново.
+        Ответы частей объединяются без total.
+        """
+        ids = ids_str.split(',')
+        period = None
+        if params.get('date_from'):
+            period = self._period_dates(params['date_from'],
+                                        params['date_to'])
+        days = len(period) if period else 1
+        started = time.perf_counter()
+        try:
+            result = request(ids_str, params)
+        except Exception as e:
+            parts = split_request(ids, period) if is_timeout(e) else []
+            if not parts:
+                raise
+            self.chunk_sizer.on_timeout(len(ids), days)
+            results = []
+            for part_ids, part_period in parts:
+                part_params = dict(params)
+                if part_period:
+                    part_params.update(date_from=part_period[0],
+                                       date_to=part_period[-1])
+                results.append(self._request_stats_adaptive(
+                    request, ','.join(part_ids), part_params))
+            return self._merge_stats_results(results)
+
+        response = getattr(result, '_response', None)
+        items = result().data['items']
+        self.chunk_sizer.record(
+            len(ids), days, time.perf_counter() - started,
+            size=len(response.content) if response is not None else None,
+            rows=sum(len(i.get('rows') or ()) for i in items) if period
+            else len(items))
+        return result
+
+    def _merge_stats_results(self, results):
+        """Объединяет ответы частей запроса, строки объекта по порядку."""
+        items = {}
+        for result in results:
+            for item in result().data['items']:
+                if item['id'] in items:
+                    merged = items[item['id']]
+                    merged['rows'] = (merged.get('rows') or []) + \
+                        (item.get('rows') or [])
+                    # total только за часть периода.
+                    merged.pop('total', None)
+                else:
+                    items[item['id']] = dict(item)
+        return LocalResult({'items': list(items.values())})
+
+    def _request_stats_cached(self, object_type, time_mode, ids_str, params):
+        """
+        Запрос статистики по дням с использованием кэша.
+
+        Запрашиваются только объекты, по которым в кэше не хватает дней,
+        и только за период от первого до последнего недостающего дня.
+        В ответе нет total, только строки по дням.
+        """
+        ids = [int(i) for i in ids_str.split(',')]
+        dates = self._period_dates(params['date_from'], params['date_to'])
+        metrics = params.get('metrics')
+        rows = self.cache.get(object_type, time_mode, metrics, ids,
+                              dates[0], dates[-1])
+
+        # Объекты группируются по недостающему периоду.
+        missing = {}
+        for object_id in ids:
+            cached_rows = rows.get(object_id, {})
+            missing_dates = [d for d in dates if d not in cached_rows]
+            if missing_dates:
+                period = (missing_dates[0], missing_dates[-1])
+                missing.setdefault(period, []).append(object_id)
+
+        for (period_from, period_to), missing_ids in missing.items():
+            result = self._request_stats(
+                object_type, time_mode, ','.join(map(str, missing_ids)),
+                dict(params, date_from=period_from, date_to=period_to))
+            items = result().data['items']
+            self.cache.put(object_type, time_mode, metrics, items)
+            for item in items:
+                object_rows = rows.setdefault(item['id'], {})
+                for row in item.get('rows') or []:
+                    object_rows[row['date']] = row
+
+        items = [{'id': object_id,
+                  'rows': [rows[object_id][d] for d in sorted(rows[object_id])]}
+                 for object_id in ids if rows.get(object_id)]
+        return LocalResult({'items': items})
 
     def get_campaigns(self, params=None, as_dataframe=None,
-                      limit=None, limit_in_request=50):
+                      limit=None, limit_in_request=50, max_workers=None,
+                      as_arrow=False):
         """
         https://target.my.com/doc/apiv2/ru/resources/campaigns.html
         https://target.my.com/doc/apiv2/ru/objects/ads2.api_v2.campaigns.CampaignResource.html
@@ -488,15 +1534,21 @@ class MytargetLight:
                 sorting=status,name,-id
         :param limit_in_request: int : кол-во объектов в одном запросе
         :param as_dataframe: bool : вернуть в формате dataframe
-        :return: list, dataframe
+        :param max_workers: int : кол-во одновременно запрашиваемых страниц,
+            по умолчанию берется из max_workers при создании класса.
+        :param as_arrow: bool : вернуть таблицу pyarrow.Table, нужен pyarrow
+        :return: list, dataframe, pyarrow.Table
         """
         return self._request_objects(method=self.low_api.campaigns2(),
                                      limit=limit, params=params,
                                      limit_in_request=limit_in_request,
-                                     as_dataframe=as_dataframe)
+                                     as_dataframe=as_dataframe,
+                                     max_workers=max_workers,
+                                     as_arrow=as_arrow)
 
     def get_banners(self, params=None, as_dataframe=None,
-                    limit=None, limit_in_request=50):
+                    limit=None, limit_in_request=50, max_workers=None,
+                    as_arrow=False):
         """
         https://target.my.com/doc/apiv2/ru/resources/banners.html
         https://target.my.com/doc/apiv2/ru/objects/ads2.api_v2.banners.BannerResource.html
@@ -525,12 +1577,93 @@ class MytargetLight:
                 _textblock=купить насос
         :param limit_in_request: int : кол-во объектов в одном запросе
         :param as_dataframe: bool : вернуть в формате dataframe
-        :return: list, dataframe
+        :param max_workers: int : кол-во одновременно запрашиваемых страниц,
+            по умолчанию берется из max_workers при создании класса.
+        :param as_arrow: bool : вернуть таблицу pyarrow.Table, нужен pyarrow
+        :return: list, dataframe, pyarrow.Table
         """
         return self._request_objects(method=self.low_api.banners2(),
                                      limit=limit, params=params,
                                      limit_in_request=limit_in_request,
-                                     as_dataframe=as_dataframe)
+                                     as_dataframe=as_dataframe,
+                                     max_workers=max_workers,
+                                     as_arrow=as_arrow)
+
+    def _mass_action(self, method, changes, limit_in_request=200,
+                     max_workers=None, as_dataframe=None):
+        """
+        Изменение объектов через mass_action.
+
+        Изменения делятся на запросы не больше limit_in_request объектов,
+        запросы отправляются одновременно, если max_workers больше 1,
+        с учетом квоты запросов. Если API отклонил запрос с ответом 400,
+        то он делится пополам и части отправляются заново,
+        пока ошибка не будет найдена у конкретных объектов.
+        Если отклонены обе половины, то деление прекращается, и все объекты
+        запроса попадают в отчет с ошибкой своей половины.
+        Изменения в mass_action идемпотентны, поэтому повтор безопасен.
+
+        :return: [{"id": 1, "ok": True, "error": None}, ...]
+            в порядке changes
+        """
+        def send(chunk):
+            try:
+                method().post(data=chunk)
+            except Exception as e:
+                return self._mass_action_failure(e)
+            return None
+
+        def check(chunk, failure):
+            halves = self._mass_action_halves(chunk, failure)
+            if halves is None:
+                return self._mass_action_results(chunk, failure)
+            failures = self._mass_action_stop_split(
+                [send(half) for half in halves])
+            return check(halves[0], failures[0]) + \
+                check(halves[1], failures[1])
+
+        chunks = self._mass_action_chunks(changes, limit_in_request)
+        return self._mass_action_report(
+            self._map(lambda chunk: check(chunk, send(chunk)), chunks,
+                      max_workers),
+            as_dataframe)
+
+    def update_campaigns(self, changes, limit_in_request=200,
+                         max_workers=None, as_dataframe=None):
+        """
+        https://target.my.com/doc/apiv2/ru/resources/campaigns.mass_action.html
+
+        Изменение кампаний, по 200 кампаний в запросе.
+
+        light_api.update_campaigns([{"id": 1, "status": "blocked"},
+                                    {"id": 2, "price": "10.5"}])
+
+        :param changes: list : [{"id": ..., поле: значение, ...}, ...]
+        :param limit_in_request: int : кол-во кампаний в одном запросе
+        :param max_workers: int : кол-во одновременно отправляемых запросов,
+            по умолчанию берется из max_workers при создании класса.
+        :param as_dataframe: bool : вернуть отчет в формате dataframe
+        :return: отчет по каждой кампании в порядке changes:
+            [{"id": 1, "ok": True, "error": None},
+             {"id": 2, "ok": False, "error": {ответ API}}]
+        """
+        return self._mass_action(self.low_api.campaigns_mass_action2,
+                                 changes, limit_in_request, max_workers,
+                                 as_dataframe)
+
+    def update_banners(self, changes, limit_in_request=200,
+                       max_workers=None, as_dataframe=None):
+        """
+        https://target.my.com/doc/apiv2/ru/resources/banners.mass_action.html
+
+        Изменение объявлений, по 200 объявлений в запросе,
+        см. update_campaigns.
+
+        light_api.update_banners([{"id": 1, "status": "active"}])
+        """
+        return self._mass_action(self.low_api.banners_mass_action2,
+                                 changes, limit_in_request, max_workers,
+                                 as_dataframe)
 
 
 class MytargetAuth:
@@ -549,9 +1682,18 @@ class MytargetAuth:
         'read_manager_clients', 'edit_manager_clients', 'read_payments'
     )
 
-    def __init__(self, is_sandbox=False):
+    def __init__(self, is_sandbox=False, session=None, store=None):
+        """
+        :param is_sandbox: bool : запросы к песочнице
+        :param session: requests.Session : сессия с пулом соединений,
+            можно передать ту же, что и в MytargetLight.
+        :param store: MemoryTokenStore, FileTokenStore, SQLiteTokenStore :
+            хранилище токенов для get_token, по умолчанию в памяти.
+        """
         self.adapter = MytargetClientAdapter(access_token=None)
         self.is_sandbox = is_sandbox
+        self.session = session or create_session()
+        self.store = store if store is not None else MemoryTokenStore()
 
     def _request_oauth(self, scheme, **kwargs):
         """
@@ -560,7 +1702,7 @@ class MytargetAuth:
         :return: str, json
         """
         url = self.adapter.get_url_root(kwargs) + scheme
-        response = requests.post(url, data=kwargs)
+        response = self.session.post(url, data=kwargs)
 
         if response.status_code == 403:
             raise exceptions.MytargetTokenLimitError(response)
@@ -703,8 +1845,84 @@ class MytargetAuth:
             client_secret=client_secret, is_sandbox=self.is_sandbox,
             **kwargs)
 
+    def _token_key(self, client_id, agency_client_name=None):
+        key = '{}:{}'.format('sandbox' if self.is_sandbox else 'production',
+                             client_id)
+        if agency_client_name:
+            key += ':' + agency_client_name
+        return key
+
+    def _token_record(self, data, old_token=None):
+        """Токен для хранилища, с временем истечения вместо expires_in."""
+        expires_in = data.get('expires_in')
+        try:
+            expires_at = time.time() + int(expires_in)
+        except (TypeError, ValueError):
+            # У вечных токенов expires_in "None".
+            expires_at = None
+        refresh_token = data.get('refresh_token') or \
+            (old_token or {}).get('refresh_token')
+        return {'access_token': data['access_token'],
+                'refresh_token': refresh_token,
+                'expires_at': expires_at}
+
+    def get_token(self, client_id, client_secret, agency_client_name=None,
+                  refresh_before=300, expired_token=None, **kwargs):
+        """
+        Действующий токен из хранилища.
+
+        Если токена нет, то он будет получен через get_client_token
+        или get_agency_client_token, если до истечения токена
+        осталось меньше refresh_before секунд или его не принимает API,
+        то он будет обновлен через refresh_token.
+        Так токены не расходуют лимит tokens_left при каждом запуске.
+
+        :param agency_client_name: str : username клиента агентства
+        :param refresh_before: int : за сколько секунд до истечения обновлять
+        :param expired_token: str : access_token, который не принял API
+        :return: {"access_token": ..., "refresh_token": ..., "expires_at": ...}
+        """
+        key = self._token_key(client_id, agency_client_name)
+        token = self.store.get(key)
+        if token and token['access_token'] != expired_token \
+                and not is_expiring(token, refresh_before):
+            return token
+
+        data = None
+        if token and token.get('refresh_token'):
+            try:
+                data = self.refresh_token(client_id, client_secret,
+                                          token['refresh_token'])
+            except exceptions.MytargetTokenError:
+                logging.info('Не удалось обновить токен, запрос нового')
+
+        if data is None and agency_client_name:
+            data = self.get_agency_client_token(
+                client_id, client_secret, agency_client_name, **kwargs)
+        elif data is None:
+            data = self.get_client_token(client_id, client_secret, **kwargs)
+
+        token = self._token_record(data, token)
+        self.store.put(key, token)
+        return token
+
+    def token_provider(self, client_id, client_secret,
+                       agency_client_name=None, refresh_before=300):
+        """
+        Источник токена для Mytarget и MytargetLight.
+
+        light_api = MytargetLight(
+            access_token=None,
+            token_provider=auth.token_provider(CLIENT_ID, CLIENT_SECRET))
+
+        :return: TokenProvider
+        """
+        return TokenProvider(self, client_id, client_secret,
+                             agency_client_name, refresh_before)
+
     def delete_tokens(self, client_id, client_secret):
         """https://target.my.com/adv/api-marketing/doc/authorization"""
+        self.store.delete(self._token_key(client_id))
         return self._request_oauth(scheme=self.DELETE_TOKEN_URL,
                                    client_id=client_id,
                                    client_secret=client_secret,
@@ -0,0 +1,403 @@
+# coding: utf-8
+"""
+Локальный сервер, имитирующий API myTarget.
+
+Нужен для тестов и бенчмарков без токена и доступа к API.
+Реализованы ресурсы user2, campaigns2, banners2, stats2, agency_clients2
+и mass_action кампаний и объявлений с пагинацией, ограничениями API,
+квотой запросов и задержкой ответа.
+
+with FakeMytargetServer(n_banners=1000, latency=0.05, limits={1: 10}) as server:
+    light_api = MytargetLight(access_token='fake', url_root=server.url_root)
+    light_api.get_stats(object_type='banners', date_from='2019-01-01',
+                        date_to='2019-03-31')
+    server.requests
+"""
+import json
+import re
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .schema import INT, METRICS
+
+STATS_RE = re.compile(r'^/api/v2/statistics/(\w+)/(\w+)\.json$')
+OBJECTS_RE = re.compile(r'^/api/v2/(campaigns|banners)\.json$')
+MASS_ACTION_RE = re.compile(
+    r'^/api/v2/(campaigns|banners)/mass_action\.json$')
+STATUSES = ('active', 'blocked', 'deleted')
+HEADER_WINDOWS = {1: 'RPS', 60: 'Minute', 3600: 'Hourly', 86400: 'Daily'}
+STATS_EPOCH = datetime(2019, 1, 1)
+
+
+def stats_row(seed, day=None, groups=None):
+    """
+    Строка статистики с группами метрик groups,
+    по умолчанию со всеми группами из schema.METRICS.
+    """
+    row = {} if day is None else {'date': day}
+    for n, (group, metrics) in enumerate(METRICS.items()):
+        if groups is not None and group not in groups:
+            continue
+        value = seed % (n + 7)
+        row[group] = {name: value if kind == INT
+                      else '{:.2f}'.format(value * 0.37)
+                      for name, kind in metrics.items()}
+    return row
+
+
+def stats_response(ids, date_from=STATS_EPOCH, days=1, groups=None):
+    """
+    Ответ статистики по дням, как у statistics/{type}/day.json.
+    Статистика за день не зависит от периода запроса.
+    Используется и в бенчмарках, без HTTP сервера.
+
+    :param date_from: datetime : первый день
+    :param days: int : кол-во дней
+    :param groups: list : группы метрик, по умолчанию все
+    """
+    first_day = (date_from - STATS_EPOCH).days
+    dates = [(date_from + timedelta(n)).strftime('%Y-%m-%d')
+             for n in range(days)]
+    return {
+        'items': [{'id': i,
+                   'rows': [stats_row(i + first_day + n, day, groups)
+                            for n, day in enumerate(dates)],
+                   'total': stats_row(i, None, groups)} for i in ids],
+        'total': stats_row(0, None, groups)}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Соединения переиспользуются, как в пуле requests.
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        # Обработчик один на соединение, тело прошлого POST не нужно.
+        self.body = None
+        self.server.fake.handle(self)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body = self.rfile.read(length)
+        self.server.fake.handle(self)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeMytargetServer:
+    """
+    HTTP сервер в отдельном потоке.
+
+    Счетчики: requests - все запросы, throttled - ответы 429,
+    bytes_sent - размер отданных ответов.
+    Запросы статистики копятся в stats_requests:
+    [(time_mode, [id, ...], date_from, date_to), ...].
+    Принятые изменения mass_action копятся в updates:
+    {"campaigns": {id: {поле: значение}}, "banners": {...}},
+    статус и время изменения объекта после них отдаются в списке объектов.
+    Сбои API имитируются через fail_next.
+    """
+
+    def __init__(self, n_campaigns=100, n_banners=1000, latency=0.0,
+                 limits=None, max_cells=None, n_deleted=0, n_clients=0,
+                 host='127.0.0.1', port=0):
+        """
+        :param n_campaigns: int : кол-во кампаний
+        :param n_banners: int : кол-во объявлений
+        :param latency: float : задержка ответа в секундах
+        :param limits: dict : квота запросов {секунд в окне: кол-во запросов},
+            например {1: 10, 3600: 1000}. Сверх квоты ответ 429.
+        :param max_cells: int : на запросы статистики больше чем
+            max_cells объектов x дней ответ 504, как при таймауте.
+        :param n_deleted: int : кол-во удаленных кампаний и объявлений
+            сверх n_campaigns и n_banners. Как и в API, они отдаются,
+            только если указаны в фильтре _status__in или _status.
+        :param n_clients: int : кол-во клиентов агентства client1, ...,
+            каждый десятый заблокирован.
+        :param port: int : 0 - любой свободный порт
+        """
+        self.n_campaigns = n_campaigns
+        self.n_banners = n_banners
+        self.latency = latency
+        self.limits = {int(k): int(v) for k, v in (limits or {}).items()}
+        self.max_cells = max_cells
+        self.n_deleted = n_deleted
+        self.n_clients = n_clients
+        self.requests = 0
+        self.throttled = 0
+        self.bytes_sent = 0
+        self.stats_requests = []
+        self.updates = {'campaigns': {}, 'banners': {}}
+        self._updated_at = {'campaigns': {}, 'banners': {}}
+        self._windows = {}
+        # Статусы сбоев для следующих запросов, None - обрыв соединения.
+        self._failures = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def url_root(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}/'.format(host, port)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def fail_next(self, count=1, status=503, content=None, after=0):
+        """
+        Следующие count запросов завершатся сбоем.
+
+        :param status: int : код ответа, None - соединение
+            закрывается без ответа.
+        :param content: bytes : тело ответа, по умолчанию JSON с ошибкой,
+            например b'<html>502 Bad Gateway</html>' как у прокси.
+        :param after: int : сколько запросов до сбоя выполнятся успешно
+        """
+        with self._lock:
+            self._failures += [(False, None)] * after + \
+                [(status, content)] * count
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = self.throttled = self.bytes_sent = 0
+            self.stats_requests = []
+
+    def _quota(self):
+        """
+        Учитывает запрос в окнах квоты.
+
+        :return: (запрос разрешен, {окно: остаток})
+        """
+        now = time.time()
+        with self._lock:
+            self.requests += 1
+            remaining = {}
+            allowed = True
+            for seconds, limit in self.limits.items():
+                start = now // seconds * seconds
+                window = self._windows.get(seconds)
+                if window is None or window[0] != start:
+                    window = self._windows[seconds] = [start, 0]
+                if window[1] >= limit:
+                    allowed = False
+                remaining[seconds] = limit - window[1]
+            if allowed:
+                for seconds in self.limits:
+                    self._windows[seconds][1] += 1
+                    remaining[seconds] -= 1
+            else:
+                self.throttled += 1
+        return allowed, remaining
+
+    def handle(self, request):
+        url = urlparse(request.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        with self._lock:
+            failure, content = self._failures.pop(0) if self._failures \
+                else (False, None)
+        if failure is None:
+            with self._lock:
+                self.requests += 1
+            request.close_connection = True
+            request.connection.shutdown(socket.SHUT_RDWR)
+            return
+        allowed, remaining = self._quota()
+        headers = {}
+        for seconds, left in remaining.items():
+            name = HEADER_WINDOWS.get(seconds)
+            if name:
+                headers['X-RateLimit-{}-Limit'.format(name)] = \
+                    str(self.limits[seconds])
+                headers['X-RateLimit-{}-Remaining'.format(name)] = \
+                    str(max(left, 0))
+
+        if self.latency:
+            time.sleep(self.latency)
+        if failure:
+            status, body = failure, {'error': {'code': 'server_error',
+                                               'message': 'Server Error'}}
+        elif allowed:
+            body = getattr(request, 'body', None)
+            if body is not None:
+                status, body = self.route_post(url.path, json.loads(body))
+            else:
+                status, body = self.route(url.path, query)
+        else:
+            status, body = 429, {
+                'error': {'code': 'throttling_exception',
+                          'message': 'Too many requests'},
+                'remaining': {str(k): max(v, 0)
+                              for k, v in remaining.items()},
+                'limits': {str(k): v for k, v in self.limits.items()}}
+
+        if content is None:
+            content = b'' if body is None \
+                else json.dumps(body).encode('utf-8')
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(content)
+        with self._lock:
+            self.bytes_sent += len(content)
+
+    def route(self, path, query):
+        if path == '/api/v2/user.json':
+            return 200, {'id': 1, 'username': 'fake'}
+        if path == '/api/v2/agency/clients.json':
+            return self.agency_clients(query)
+        match = OBJECTS_RE.match(path)
+        if match:
+            return self.objects(match.group(1), query)
+        match = STATS_RE.match(path)
+        if match:
+            return self.stats(match.group(2), query)
+        return 404, {'error': {'code': 'not_found', 'message': path}}
+
+    def route_post(self, path, data):
+        match = MASS_ACTION_RE.match(path)
+        if match:
+            return self.mass_action(match.group(1), data)
+        return 404, {'error': {'code': 'not_found', 'message': path}}
+
+    def mass_action(self, object_type, changes):
+        """
+        Изменения применяются, только если все объекты прошли проверку,
+        иначе ответ 400 с ошибками по индексам объектов.
+        """
+        if not isinstance(changes, list) or not 0 < len(changes) <= 200:
+            return 400, {'error': {'code': 'invalid_objects',
+                                   'message': 'from 1 to 200 objects'}}
+        errors = {}
+        for n, change in enumerate(changes):
+            if 'status' in change and change['status'] not in STATUSES:
+                errors[str(n)] = {'status': {'code': 'invalid_choice',
+                                             'message': 'Invalid status'}}
+        if errors:
+            return 400, {'error': {'code': 'validation_error',
+                                   'fields': errors}}
+        updated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            for change in changes:
+                self.updates[object_type].setdefault(
+                    change['id'], {}).update(change)
+                self._updated_at[object_type][change['id']] = updated_at
+        return 204, None
+
+    def objects(self, object_type, query):
+        limit = int(query.get('limit', 20))
+        offset = int(query.get('offset', 0))
+        if limit > 50:
+            return 400, {'error': {'code': 'invalid_limit',
+                                   'message': 'limit must be <= 50'}}
+        n_objects = self.n_campaigns if object_type == 'campaigns' \
+            else self.n_banners
+        # Удаленные объекты идут после n_objects.
+        statuses = (query.get('_status__in') or query.get('_status') or
+                    'active,blocked').split(',')
+
+        updates = self.updates[object_type]
+        updated_at = self._updated_at[object_type]
+
+        def status(i):
+            if 'status' in updates.get(i, {}):
+                return updates[i]['status']
+            if i > n_objects:
+                return 'deleted'
+            return 'active' if i % 4 else 'blocked'
+
+        def updated(i):
+            return updated_at.get(i) or \
+                '2019-01-{:02d} 00:00:00'.format(1 + i % 28)
+
+        all_ids = [i for i in range(1, n_objects + self.n_deleted + 1)
+                   if status(i) in statuses]
+        if query.get('_id__in'):
+            filter_ids = {int(i) for i in query['_id__in'].split(',')}
+            all_ids = [i for i in all_ids if i in filter_ids]
+        updated_gte = query.get('_updated__gte') or \
+            query.get('_last_updated__gte')
+        if updated_gte:
+            all_ids = [i for i in all_ids if updated(i) >= updated_gte]
+        count = len(all_ids)
+        ids = all_ids[offset:offset + limit]
+        items = [{'id': i,
+                  'status': status(i),
+                  'created': '2018-06-01 00:00:00',
+                  'updated': updated(i)}
+                 for i in ids]
+        if object_type == 'banners':
+            for item in items:
+                item['campaign_id'] = 1 + item['id'] % max(
+                    self.n_campaigns, 1)
+        if query.get('fields'):
+            fields = query['fields'].split(',')
+            items = [{k: v for k, v in item.items() if k in fields}
+                     for item in items]
+        return 200, {'count': count, 'offset': offset, 'limit': limit,
+                     'items': items}
+
+    def agency_clients(self, query):
+        limit = int(query.get('limit', 20))
+        offset = int(query.get('offset', 0))
+        if limit > 50:
+            return 400, {'error': {'code': 'invalid_limit',
+                                   'message': 'limit must be <= 50'}}
+        ids = range(offset + 1, min(offset + limit, self.n_clients) + 1)
+        items = [{'user': {'id': i, 'username': 'client{}'.format(i)},
+                  'status': 'blocked' if i % 10 == 0 else 'active'}
+                 for i in ids]
+        return 200, {'count': self.n_clients, 'offset': offset,
+                     'limit': limit, 'items': items}
+
+    def stats(self, time_mode, query):
+        ids = [int(i) for i in query.get('id', '').split(',') if i]
+        with self._lock:
+            self.stats_requests.append((time_mode, ids,
+                                        query.get('date_from'),
+                                        query.get('date_to')))
+        if not ids or len(ids) > 200:
+            return 400, {'error': {'code': 'invalid_ids',
+                                   'message': 'from 1 to 200 ids'}}
+        # Как и API, без metrics отдается только группа base.
+        groups = query.get('metrics', 'base').split(',')
+        if 'all' in groups:
+            groups = None
+        if time_mode == 'summary':
+            return 200, {'items': [{'id': i, 'total': stats_row(i, None,
+                                                                groups)}
+                                   for i in ids],
+                         'total': stats_row(0, None, groups)}
+
+        date_from = datetime.strptime(query['date_from'], '%Y-%m-%d')
+        date_to = datetime.strptime(query['date_to'], '%Y-%m-%d')
+        days = (date_to - date_from).days + 1
+        if not 0 < days <= 92:
+            return 400, {'error': {'code': 'invalid_period',
+                                   'message': 'max 92 days'}}
+        if self.max_cells and len(ids) * days > self.max_cells:
+            return 504, {'error': {'code': 'gateway_timeout',
+                                   'message': 'Gateway Timeout'}}
+        return 200, stats_response(ids, date_from, days, groups)
@@ -0,0 +1,154 @@
+# coding: utf-8
+"""
+Хранилища токенов и автоматическое обновление токена.
+
+Кол-во токенов одного приложения ограничено (tokens_left),
+поэтому полученный токен сохраняется и используется повторно,
+а перед истечением expires_in обновляется через refresh_token.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class MemoryTokenStore:
+    """Токены в памяти, на время работы процесса."""
+
+    def __init__(self):
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._tokens.get(key)
+
+    def put(self, key, token):
+        with self._lock:
+            self._tokens[key] = token
+
+    def delete(self, key):
+        with self._lock:
+            self._tokens.pop(key, None)
+
+
+class FileTokenStore:
+    """Токены в JSON файле."""
+
+    def __init__(self, path):
+        """:param path: str : путь к файлу"""
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write(self, tokens):
+        # Файл заменяется целиком, чтобы не оставить его недописанным.
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(tokens, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key):
+        with self._lock:
+            return self._read().get(key)
+
+    def put(self, key, token):
+        with self._lock:
+            tokens = self._read()
+            tokens[key] = token
+            self._write(tokens)
+
+    def delete(self, key):
+        with self._lock:
+            tokens = self._read()
+            if tokens.pop(key, None) is not None:
+                self._write(tokens)
+
+
+class SQLiteTokenStore:
+    """Токены в SQLite."""
+
+    def __init__(self, path=':memory:'):
+        """:param path: str : путь к файлу SQLite"""
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS tokens ('
+                'key TEXT PRIMARY KEY, data TEXT)')
+
+    def close(self):
+        self._connection.close()
+
+    def get(self, key):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT data FROM tokens WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, token):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO tokens (key, data) VALUES (?, ?)',
+                (key, json.dumps(token)))
+
+    def delete(self, key):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM tokens WHERE key = ?', (key,))
+
+
+def is_expiring(token, refresh_before=300):
+    """
+    Истекает ли токен в ближайшие refresh_before секунд.
+
+    :param token: dict : {"access_token": ..., "expires_at": 1554000000.0}
+        expires_at None у вечных токенов
+    """
+    expires_at = token.get('expires_at')
+    return expires_at is not None and \
+        expires_at - refresh_before <= time.time()
+
+
+class TokenProvider:
+    """
+    Отдает действующий токен, при необходимости обновляя его
+    через MytargetAuth.get_token. Токен кэшируется в памяти,
+    поэтому хранилище читается только при обновлении.
+
+    Передается в Mytarget и MytargetLight через token_provider,
+    при ответе 401 запрос один раз повторяется с новым токеном.
+    """
+
+    def __init__(self, auth, client_id, client_secret,
+                 agency_client_name=None, refresh_before=300):
+        self.auth = auth
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.agency_client_name = agency_client_name
+        self.refresh_before = refresh_before
+        self._token = None
+        self._lock = threading.Lock()
+
+    def __call__(self, expired_token=None):
+        """
+        :param expired_token: str : токен, который API не принял,
+            если его уже обновил другой поток, то вернется новый токен.
+        :return: str : access_token
+        """
+        with self._lock:
+            token = self._token
+            if token is None or is_expiring(token, self.refresh_before) \
+                    or token['access_token'] == expired_token:
+                token = self._token = self.auth.get_token(
+                    self.client_id, self.client_secret,
+                    agency_client_name=self.agency_client_name,
+                    refresh_before=self.refresh_before,
+                    expired_token=expired_token)
+            return token['access_token']
@@ -0,0 +1,53 @@
+# coding: utf-8
+from tapioca_mytarget import ChunkSizer, MytargetLight
+from tapioca_mytarget.adaptive import split_request
+from tapioca_mytarget.testing import FakeMytargetServer
+
+
+def test_split_request():
+    days = ['2019-01-01', '2019-01-02', '2019-01-03']
+    assert split_request(['1', '2', '3'], days) == [
+        (['1'], days), (['2', '3'], days)]
+    assert split_request(['1'], days) == [
+        (['1'], days[:1]), (['1'], days[1:])]
+    assert split_request(['1'], days[:1]) == []
+    assert split_request(['1'], None) == []
+
+
+def test_chunk_sizer_grows_and_shrinks():
+    sizer = ChunkSizer(limit_in_request=10, interval=10, target_seconds=1)
+    # Быстрые маленькие ответы - размер растет не больше чем вдвое.
+    sizer.record(10, 10, elapsed=0.01, size=1000, rows=100)
+    assert (sizer.limit_in_request, sizer.interval) == (20, 10)
+    for _ in range(10):
+        sizer.record(sizer.limit_in_request, sizer.interval,
+                     elapsed=0.01, size=1000, rows=0)
+    # Сначала до 200 объектов, потом длиннее период.
+    assert (sizer.limit_in_request, sizer.interval) == (200, 92)
+
+    # Ответ больше max_bytes - размер уменьшается.
+    sizer.max_bytes = 1000
+    sizer.record(200, 92, elapsed=0.01, size=200 * 92 * 100, rows=200 * 92)
+    assert sizer.limit_in_request * sizer.interval <= 200 * 92 // 2
+
+    sizer.on_timeout(20, 10)
+    assert sizer.limit_in_request * sizer.interval <= 100
+    assert sizer.max_cells == 100
+    sizer.record(10, 10, elapsed=0.001, size=10, rows=0)
+    assert sizer.limit_in_request * sizer.interval <= 100
+
+
+def test_adaptive_stats_split_on_timeout():
+    sizer = ChunkSizer(limit_in_request=100, interval=30)
+    with FakeMytargetServer(n_banners=150, max_cells=1000) as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root,
+                                  chunk_sizer=sizer)
+        rows = list(light_api.iter_stats(
+            object_type=light_api.BANNER_STATS, ids=list(range(1, 151)),
+            date_from='2019-01-01', date_to='2019-03-31'))
+
+    assert sizer.timeouts
+    assert sizer.limit_in_request * sizer.interval <= 1000
+    assert len(rows) == 150 * 90
+    assert len({(row['id'], row['date']) for row in rows}) == 150 * 90
@@ -0,0 +1,73 @@
+# coding: utf-8
+from tapioca_mytarget import MytargetAgency, MytargetAuth, MytargetLight
+from tapioca_mytarget.tapioca_mytarget import LocalResult
+from tapioca_mytarget.testing import FakeMytargetServer
+
+
+class AuthStub(MytargetAuth):
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def get_agency_client_token(self, client_id, client_secret,
+                                agency_client_name, **kwargs):
+        self.requests.append(agency_client_name)
+        return {'access_token': 'token-' + agency_client_name,
+                'expires_in': '86400'}
+
+
+class LightApiStub(MytargetLight):
+    """Статистика, в которой id объекта - длина токена клиента."""
+
+    def __init__(self, access_token, token_provider=None, **kwargs):
+        super().__init__(access_token=access_token,
+                         token_provider=token_provider, **kwargs)
+        self.access_token = token_provider()
+
+    def get_stats(self, as_dataframe=False, **kwargs):
+        if self.access_token == 'token-broken':
+            raise ValueError('broken')
+        result = LocalResult({'items': [
+            {'id': len(self.access_token),
+             'rows': [{'date': '2019-01-01', 'base': {'shows': 1}}]}]})
+        return self._to_format('get_stats', [result], as_dataframe)
+
+
+class AgencyStub(MytargetAgency):
+    light_api_class = LightApiStub
+
+
+def test_get_stats_tagged_with_username():
+    auth = AuthStub()
+    agency = AgencyStub('id', 'secret', auth=auth, max_clients=2)
+
+    data = agency.get_stats(usernames=['a', 'bb', 'broken'],
+                            date_from='2019-01-01', date_to='2019-01-01')
+    assert [(i['id'], i['username']) for i in data] == [(7, 'a'), (8, 'bb')]
+    assert list(agency.errors) == ['broken']
+
+    df = agency.get_stats(usernames=['a', 'bb'], as_dataframe=True)
+    assert df['username'].tolist() == ['a', 'bb']
+    # Токены запрашиваются один раз.
+    assert sorted(auth.requests) == ['a', 'bb', 'broken']
+
+
+def test_client_api_has_own_rate_limiter():
+    agency = AgencyStub('id', 'secret', auth=AuthStub(), max_workers=3)
+    first, second = agency.client_api('a'), agency.client_api('b')
+    assert first.rate_limiter is not second.rate_limiter
+    # Квота клиента общая для всех запусков.
+    assert agency.client_api('a').rate_limiter is first.rate_limiter
+    assert first.session is second.session is agency.session
+    assert first.max_workers == 3
+
+
+def test_clients_all_pages():
+    with FakeMytargetServer(n_clients=120) as server:
+        agency = MytargetAgency('id', 'secret', access_token='fake',
+                                url_root=server.url_root)
+        clients = agency.clients()
+        assert server.requests == 3
+    assert len(clients) == 108
+    assert clients[-1] == 'client119'
+    assert 'client10' not in clients
@@ -0,0 +1,145 @@
+# coding: utf-8
+from datetime import date
+
+import pytest
+
+from tapioca_mytarget import MytargetLight, ParquetSink
+from tapioca_mytarget.arrow import stats_schema
+from tapioca_mytarget.tapioca_mytarget import LocalResult
+from tapioca_mytarget.testing import FakeMytargetServer
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+STATS = {'items': [
+    {'id': 1, 'rows': [
+        {'date': '2019-01-01',
+         'base': {'shows': 10, 'clicks': 1, 'spent': '155.8'}},
+        {'date': '2019-01-02',
+         'base': {'shows': 0, 'clicks': 0, 'spent': 0}}]},
+    {'id': 2, 'rows': [
+        {'date': '2019-01-01',
+         'base': {'shows': 5, 'clicks': 0, 'spent': '1.25'},
+         'custom': {'metric': 'x'}}]},
+]}
+
+
+def test_stats_as_arrow():
+    light_api = MytargetLight(access_token=None)
+    table = light_api._to_format('get_stats', [LocalResult(STATS)],
+                                 as_arrow=True)
+
+    assert table.schema.field('date').type == pa.date32()
+    assert table.schema.field('id').type == pa.int64()
+    assert table.schema.field('base.shows').type == pa.int64()
+    assert table.schema.field('base.spent').type == pa.float64()
+    assert table.schema.field('custom.metric').type == pa.string()
+    assert table.column('base.spent').to_pylist() == [155.8, 0.0, 1.25]
+    assert table.column('date').to_pylist()[0] == date(2019, 1, 1)
+    assert table.column('custom.metric').to_pylist() == [None, None, 'x']
+
+
+def test_objects_as_arrow():
+    light_api = MytargetLight(access_token=None)
+    campaigns = {'count': 2, 'items': [
+        {'id': 1, 'name': 'a', 'date_end': '',
+         'created': '2019-01-01 12:00:00', 'targetings': {'age': [18, 19]}},
+        {'id': 2, 'name': 'b', 'date_end': '2019-02-01'}]}
+    table = light_api._to_format('_request_objects',
+                                 [LocalResult(campaigns)], as_arrow=True)
+
+    assert table.num_rows == 2
+    assert table.column('date_end').to_pylist() == [None, date(2019, 2, 1)]
+    assert table.column('targetings.age').to_pylist() == ['[18, 19]', None]
+    assert table.schema.field('created').type == pa.timestamp('s')
+
+
+def test_parquet_sink(tmpdir):
+    light_api = MytargetLight(access_token=None)
+    path = str(tmpdir.join('stats.parquet'))
+    with ParquetSink(path, strict=False) as sink:
+        sink.write(light_api._stats_to_arrow([LocalResult(STATS)]))
+        # Колонки нет в первой таблице, она не записывается.
+        sink.write(light_api._stats_to_arrow([LocalResult({'items': [
+            {'id': 3, 'rows': [{'date': '2019-01-03',
+                                'base': {'shows': 1}, 'extra': {'a': 1}}]}
+        ]})]))
+
+    table = pq.read_table(path)
+    assert sink.rows == table.num_rows == 4
+    assert table.column('base.spent').to_pylist()[-1] is None
+    assert 'extra.a' not in table.column_names
+
+
+def test_parquet_sink_new_metric_group(tmpdir):
+    light_api = MytargetLight(access_token=None)
+    first = light_api._stats_to_arrow([LocalResult({'items': [
+        {'id': 1, 'rows': [{'date': '2019-01-01', 'base': {'shows': 1}}]}
+    ]})])
+    # Группа events появилась только во второй порции.
+    second = light_api._stats_to_arrow([LocalResult({'items': [
+        {'id': 2, 'rows': [{'date': '2019-01-02', 'base': {'shows': 2},
+                            'events': {'likes': 3}}]}
+    ]})])
+
+    with ParquetSink(str(tmpdir.join('error.parquet'))) as sink:
+        sink.write(first)
+        with pytest.raises(ValueError):
+            sink.write(second)
+
+    path = str(tmpdir.join('stats.parquet'))
+    with ParquetSink(path, schema=stats_schema('base,events')) as sink:
+        sink.write(first)
+        sink.write(second)
+
+    table = pq.read_table(path)
+    assert table.column('events.likes').to_pylist() == [None, 3]
+    assert table.column('base.shows').to_pylist() == [1, 2]
+    assert table.schema.field('base.spent').type == pa.float64()
+
+
+def test_stats_schema_requested_groups():
+    # Без metrics API отдает только группу base.
+    names = stats_schema(with_date=False).names
+    assert names[-1] == 'id'
+    assert all(name.startswith('base.') for name in names[:-1])
+    # Группы, не известные schema.METRICS, берутся из данных.
+    assert stats_schema('base,carousel').names == stats_schema().names
+
+
+def test_parquet_sink_unknown_metrics(tmpdir):
+    light_api = MytargetLight(access_token=None)
+    path = str(tmpdir.join('stats.parquet'))
+    with ParquetSink(path, schema=stats_schema('base')) as sink:
+        sink.write(light_api._stats_to_arrow([LocalResult(STATS)]))
+
+    table = pq.read_table(path)
+    assert table.column('custom.metric').to_pylist() == [None, None, 'x']
+    assert table.schema.field('base.cpm').type == pa.float64()
+
+
+def test_to_parquet_default_metrics(tmpdir):
+    path = str(tmpdir.join('stats.parquet'))
+    with FakeMytargetServer(n_campaigns=10) as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root)
+        rows = light_api.to_parquet(path, date_from='2019-01-01',
+                                    date_to='2019-01-03', chunk_rows=7)
+
+    table = pq.read_table(path)
+    assert rows == table.num_rows == 30
+    assert table.column_names == stats_schema('base').names
+    assert table.column('base.shows').null_count == 0
+
+
+def test_parquet_sink_partition_by(tmpdir):
+    light_api = MytargetLight(access_token=None)
+    path = str(tmpdir.join('stats'))
+    with ParquetSink(path, partition_by='date') as sink:
+        sink.write(light_api._stats_to_arrow([LocalResult(STATS)]))
+        sink.write(light_api._stats_to_arrow([LocalResult(STATS)]))
+
+    assert sorted(tmpdir.join('stats').listdir()) == [
+        tmpdir.join('stats', 'date=2019-01-01'),
+        tmpdir.join('stats', 'date=2019-01-02')]
+    assert pq.read_table(path).num_rows == 6
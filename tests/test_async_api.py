@@ -0,0 +1,42 @@
+# coding: utf-8
+import asyncio
+
+from tapioca_mytarget import AsyncMytarget, AsyncMytargetLight
+
+CLIENT_ID = ''
+CLIENT_SECRET = ''
+ACCESS_TOKEN = ''
+REFRESH_TOKEN = ''
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_user2():
+    async def main():
+        async with AsyncMytarget(access_token=ACCESS_TOKEN) as api:
+            r = await api.user2().get()
+            print(r().data)
+    run(main())
+
+
+def test_campaigns():
+    async def main():
+        async with AsyncMytargetLight(access_token=ACCESS_TOKEN) as light_api:
+            print(await light_api.get_campaigns(limit=5))
+    run(main())
+
+
+def test_count_ids():
+    async def main():
+        async with AsyncMytargetLight(access_token=ACCESS_TOKEN) as light_api:
+            df = await light_api.get_stats(
+                limit=3,
+                limit_in_request=2,
+                interval=1,
+                date_from='2019-01-01',
+                date_to='2019-01-03',
+                as_dataframe=True)
+            assert len(df['id'].drop_duplicates()) == 3
+    run(main())
@@ -0,0 +1,66 @@
+# coding: utf-8
+import asyncio
+import threading
+
+import pytest
+
+from tapioca_mytarget import AsyncMytarget, AsyncMytargetLight
+from tapioca_mytarget.exceptions import MytargetApiError
+from tapioca_mytarget.testing import FakeMytargetServer
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_async_light_api_on_fake_server():
+    async def main(server):
+        async with AsyncMytargetLight(access_token='fake',
+                                      url_root=server.url_root,
+                                      max_workers=4) as light_api:
+            banners = await light_api.get_banners()
+            df = await light_api.get_stats(
+                object_type=light_api.BANNER_STATS, date_from='2019-01-01',
+                date_to='2019-01-10', limit_in_request=50, as_dataframe=True)
+        return banners, df
+
+    with FakeMytargetServer(n_banners=120) as server:
+        banners, df = run(main(server))
+        assert [i['id'] for i in banners] == list(range(1, 121))
+        assert len(df) == 120 * 10
+        # Дважды по 3 страницы объявлений и 3 запроса статистики.
+        assert server.requests == 9
+
+    # Синхронные методы не наследуются асинхронным клиентом.
+    for name in ('iter_stats', 'export_stats', 'to_parquet'):
+        assert not hasattr(AsyncMytargetLight, name)
+
+
+def test_async_server_error_with_html_body():
+    async def main(server):
+        async with AsyncMytarget(access_token='fake',
+                                 url_root=server.url_root) as api:
+            await api.user2().get()
+
+    with FakeMytargetServer() as server:
+        server.fail_next(status=502, content=b'<html>502 Bad Gateway</html>')
+        with pytest.raises(MytargetApiError) as e:
+            run(main(server))
+        assert e.value.response.status_code == 502
+
+
+def test_async_token_provider_runs_in_thread():
+    threads = []
+
+    def token_provider(expired_token=None):
+        threads.append(threading.current_thread())
+        return 'fake'
+
+    async def main(server):
+        async with AsyncMytarget(token_provider=token_provider,
+                                 url_root=server.url_root) as api:
+            return await api.user2().get()
+
+    with FakeMytargetServer() as server:
+        assert run(main(server))().data['username'] == 'fake'
+    assert threads and threading.main_thread() not in threads
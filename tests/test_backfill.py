@@ -0,0 +1,51 @@
+# coding: utf-8
+import pytest
+import requests
+
+from tapioca_mytarget import MytargetLight, StatsBackfill
+from tapioca_mytarget.testing import FakeMytargetServer
+
+
+JOB = dict(object_type='banners', date_from='2019-01-01',
+           date_to='2019-03-31', ids=list(range(1, 6)), limit_in_request=2,
+           interval=30)
+
+
+def test_backfill_resumes_after_failure(tmp_path):
+    with FakeMytargetServer() as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root)
+        server.fail_next(status=None, after=3)
+        backfill = StatsBackfill(light_api, str(tmp_path))
+        with pytest.raises(requests.ConnectionError):
+            backfill.run(**JOB)
+        # 3 группы объектов x 3 периода, загружены первые 3 части.
+        assert backfill.status() == {'chunks': 9, 'done': 3, 'pending': 6}
+        assert list(backfill.errors) == [3]
+
+        # Новый процесс продолжает с упавшей части без параметров.
+        server.reset_counters()
+        backfill = StatsBackfill(light_api, str(tmp_path))
+        assert backfill.run() == 6
+        assert server.stats_requests[0][1:3] == ([3, 4], '2019-01-01')
+        assert server.requests == 6
+        assert backfill.status()['pending'] == 0
+        assert backfill.run(**JOB) == 0
+
+    df = backfill.to_df()
+    assert len(df) == 5 * 90
+    assert len(df.drop_duplicates(['id', 'date'])) == 5 * 90
+
+    chunks = []
+    assert backfill.export(chunks.append, chunk_rows=100) == 5 * 90
+    assert sum(map(len, chunks)) == 5 * 90
+
+
+def test_backfill_job_mismatch(tmp_path):
+    light_api = MytargetLight(access_token=None)
+    backfill = StatsBackfill(light_api, str(tmp_path))
+    backfill.plan(**JOB)
+    with pytest.raises(ValueError):
+        backfill.plan(**dict(JOB, date_to='2019-04-30'))
+    with pytest.raises(ValueError):
+        StatsBackfill(light_api, str(tmp_path / 'new')).run()
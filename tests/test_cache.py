@@ -0,0 +1,51 @@
+# coding: utf-8
+from datetime import date, timedelta
+
+import pandas as pd
+
+from tapioca_mytarget import MytargetLight, StatsCache
+from tapioca_mytarget.testing import FakeMytargetServer
+
+
+def test_put_only_settled_days():
+    cache = StatsCache(settled_days=3)
+    today = date.today()
+    old_day = (today - timedelta(10)).strftime('%Y-%m-%d')
+    new_day = today.strftime('%Y-%m-%d')
+    cache.put('banners', 'day', 'base', [
+        {'id': 1, 'rows': [{'date': old_day, 'base': {'shows': 1}},
+                           {'date': new_day, 'base': {'shows': 2}}]}])
+
+    rows = cache.get('banners', 'day', 'base', ['1', 2], old_day, new_day)
+    assert rows == {1: {old_day: {'date': old_day, 'base': {'shows': 1}}}}
+    assert cache.get('banners', 'day', None, [1], old_day, new_day) == {}
+
+
+def test_get_stats_requests_only_missing_days():
+    def day(days_ago):
+        return (date.today() - timedelta(days_ago)).strftime('%Y-%m-%d')
+
+    with FakeMytargetServer() as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root,
+                                  cache=StatsCache(settled_days=3))
+        uncached_api = MytargetLight(access_token='fake',
+                                     url_root=server.url_root)
+
+        light_api.get_stats(ids=[1, 2, 3], date_from=day(20),
+                            date_to=day(10))
+        server.reset_counters()
+        df = light_api.get_stats(ids=[1, 2, 3], date_from=day(15),
+                                 date_to=day(0), as_dataframe=True)
+        # Дни с 15 по 10 взяты из кэша.
+        assert server.stats_requests == [('day', [1, 2, 3], day(9), day(0))]
+
+        server.reset_counters()
+        light_api.get_stats(ids=[1, 2, 3], date_from=day(15),
+                            date_to=day(0))
+        # Последние settled_days дней и сегодня не кэшируются.
+        assert server.stats_requests == [('day', [1, 2, 3], day(2), day(0))]
+
+        expected = uncached_api.get_stats(ids=[1, 2, 3], date_from=day(15),
+                                          date_to=day(0), as_dataframe=True)
+        pd.testing.assert_frame_equal(df, expected)
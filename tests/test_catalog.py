@@ -0,0 +1,49 @@
+# coding: utf-8
+from tapioca_mytarget import MytargetLight, ObjectCatalog
+from tapioca_mytarget.testing import FakeMytargetServer
+
+
+def test_refresh_requests_only_changed_objects():
+    with FakeMytargetServer(n_banners=30) as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root)
+        catalog = ObjectCatalog()
+
+        assert catalog.refresh(light_api, ObjectCatalog.BANNERS) == 30
+        light_api.update_banners([{'id': 1, 'status': 'blocked'}])
+        # Объявление 1 и объявление 27, измененное в последний
+        # сохраненный день, который запрашивается повторно.
+        assert catalog.refresh(light_api, ObjectCatalog.BANNERS) == 2
+
+    assert len(catalog.ids(ObjectCatalog.BANNERS)) == 30
+    active = catalog.ids(ObjectCatalog.BANNERS, statuses=['active'])
+    assert 1 not in active and 2 in active
+
+
+def test_get_stats_ids_same_with_catalog():
+    with FakeMytargetServer(n_banners=30, n_deleted=5) as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root)
+        catalog_api = MytargetLight(access_token='fake',
+                                    url_root=server.url_root,
+                                    catalog=ObjectCatalog())
+        stats = light_api.get_stats(object_type=light_api.BANNER_STATS)
+        catalog_stats = catalog_api.get_stats(
+            object_type=light_api.BANNER_STATS)
+
+        assert [i['id'] for i in catalog_stats] == \
+            [i['id'] for i in stats] == list(range(1, 31))
+        # Удаленные объявления остаются в каталоге.
+        assert len(catalog_api.catalog.ids(ObjectCatalog.BANNERS)) == 35
+
+
+def test_catalog_keeps_status_field():
+    catalog = ObjectCatalog(fields={ObjectCatalog.BANNERS: 'id,updated'})
+    assert catalog.fields[ObjectCatalog.BANNERS] == 'id,updated,status'
+
+    with FakeMytargetServer(n_banners=30) as server:
+        catalog_api = MytargetLight(access_token='fake',
+                                    url_root=server.url_root,
+                                    catalog=catalog)
+        stats = catalog_api.get_stats(object_type=catalog_api.BANNER_STATS)
+    assert [i['id'] for i in stats] == list(range(1, 31))
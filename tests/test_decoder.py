@@ -0,0 +1,32 @@
+# coding: utf-8
+import json
+
+import pytest
+
+from tapioca_mytarget import MytargetLight
+from tapioca_mytarget.decoder import get_decoder
+from tapioca_mytarget.testing import FakeMytargetServer
+
+
+def test_get_decoder():
+    content = json.dumps({'items': [{'id': 1, 'spent': '1.5'}]}).encode()
+    assert get_decoder('json')(content) == json.loads(content)
+    assert get_decoder()(content) == json.loads(content)
+    assert get_decoder(len) is len
+    with pytest.raises(ValueError):
+        get_decoder('simplejson')
+
+
+def test_json_decoder_setting():
+    decoded = []
+
+    def decoder(content):
+        decoded.append(len(content))
+        return json.loads(content)
+
+    with FakeMytargetServer(n_banners=60) as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root,
+                                  json_decoder=decoder)
+        assert len(light_api.get_banners()) == 60
+    assert len(decoded) == server.requests == 2
@@ -0,0 +1,96 @@
+# coding: utf-8
+import csv
+
+import pytest
+
+from tapioca_mytarget import CallbackSink, CsvSink, MytargetLight
+from tapioca_mytarget.schema import stats_columns
+from tapioca_mytarget.tapioca_mytarget import LocalResult
+from tapioca_mytarget.testing import FakeMytargetServer
+
+
+def test_iter_stats_chunks():
+    light_api = MytargetLight(access_token=None)
+    results = [LocalResult({'items': [{'id': 1, 'rows': [
+        {'date': '2019-01-0{}'.format(d), 'base': {'shows': d}}
+        for d in range(1, 6)]}]}),
+        LocalResult({'items': [{'id': 2, 'rows': [
+            {'date': '2019-01-01', 'base': {'shows': 1},
+             'tps': {'tps': '0.1'}}]}]})]
+
+    chunks = list(light_api._iter_stats_chunks(results, 2))
+    assert [n for _, n in chunks] == [2, 2, 2]
+    assert chunks[0][0]['base.shows'] == [1, 2]
+    # Новая колонка во второй порции дополняется пустыми значениями.
+    assert chunks[2][0]['tps.tps'] == [None, '0.1']
+    assert chunks[2][0]['id'] == [1, 2]
+
+
+def test_export_stats_csv(tmpdir):
+    path = str(tmpdir.join('stats.csv'))
+    with FakeMytargetServer() as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root)
+        rows = light_api.export_stats(
+            CsvSink(path), chunk_rows=7, object_type='banners',
+            date_from='2019-01-01', date_to='2019-01-10', ids=[1, 2, 3],
+            limit_in_request=2)
+
+    with open(path, encoding='utf-8') as f:
+        data = list(csv.DictReader(f))
+    assert rows == len(data) == 30
+    assert list(data[0]) == stats_columns('base')
+
+
+def test_csv_sink_new_columns(tmpdir):
+    first = {'date': ['2019-01-01'], 'base.shows': [1], 'id': [1]}
+    # Группа events появилась только во второй порции.
+    second = {'date': ['2019-01-02'], 'base.shows': [2],
+              'events.likes': [3], 'id': [2]}
+
+    with CsvSink(str(tmpdir.join('error.csv'))) as sink:
+        sink.write_columns(first)
+        with pytest.raises(ValueError):
+            sink.write_columns(second)
+
+    path = str(tmpdir.join('stats.csv'))
+    with CsvSink(path, columns=stats_columns('base,events')) as sink:
+        sink.write_columns(first)
+        sink.write_columns(second)
+
+    with open(path, encoding='utf-8') as f:
+        data = list(csv.DictReader(f))
+    assert [i['events.likes'] for i in data] == ['', '3']
+    assert list(data[0]) == stats_columns('base,events')
+
+
+def test_export_stats_chunk_rows(tmpdir):
+    light_api = MytargetLight(access_token=None)
+    sink = CsvSink(str(tmpdir.join('stats.csv')))
+    with pytest.raises(ValueError):
+        light_api.export_stats(sink, chunk_rows=0, ids=[1],
+                               date_from='2019-01-01', date_to='2019-01-01')
+    assert sink._file.closed
+
+
+def test_export_stats_callback():
+    chunks = []
+    with FakeMytargetServer() as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root,
+                                  metric_types='float')
+        rows = light_api.export_stats(
+            chunks.append, chunk_rows=4, object_type='banners',
+            date_from='2019-01-01', date_to='2019-01-05', ids=[1, 2])
+
+    assert rows == 10
+    assert [len(df) for df in chunks] == [4, 4, 2]
+    assert str(chunks[0]['base.spent'].dtype) == 'float64'
+
+
+def test_callback_sink():
+    frames = []
+    sink = CallbackSink(frames.append)
+    sink.write_columns({'id': [1], 'base.spent': ['1.5']})
+    assert sink.rows == 1
+    assert frames[0]['base.spent'].tolist() == ['1.5']
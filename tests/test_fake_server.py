@@ -0,0 +1,39 @@
+# coding: utf-8
+import pytest
+
+from tapioca_mytarget import Mytarget, MytargetLight
+from tapioca_mytarget.exceptions import MytargetLimitError
+from tapioca_mytarget.testing import FakeMytargetServer
+
+
+def test_light_api_on_fake_server():
+    with FakeMytargetServer(n_campaigns=7, n_banners=120) as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root, max_workers=4)
+        banners = light_api.get_banners()
+        assert [i['id'] for i in banners] == list(range(1, 121))
+        assert server.requests == 3
+        df = light_api.get_banners(as_dataframe=True)
+        assert df['id'].tolist() == list(range(1, 121))
+
+        server.reset_counters()
+        df = light_api.get_stats(object_type=light_api.BANNER_STATS,
+                                 date_from='2019-01-01', date_to='2019-04-30',
+                                 as_dataframe=True)
+        # 3 страницы объявлений и 2 периода по 92 и 28 дней.
+        assert server.requests == 5
+        assert len(df) == 120 * 120
+        assert df['base.spent'].tolist()[0] == '0.37'
+
+
+def test_fake_server_quota():
+    with FakeMytargetServer(limits={86400: 2}) as server:
+        api = Mytarget(access_token='fake', url_root=server.url_root,
+                       retry_request_if_limit=True)
+        api.user2().get()
+        result = api.user2().get()
+        assert result._response.headers['X-RateLimit-Daily-Remaining'] == '0'
+        # Суточная квота исчерпана, запрос не повторяется.
+        with pytest.raises(MytargetLimitError):
+            api.user2().get()
+        assert server.throttled == 1
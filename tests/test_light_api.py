@@ -71,6 +71,39 @@ def test_count_ids():
     assert len(df['id'].drop_duplicates()) == 3
 
 
+def test_stats_max_workers():
+    df = light_api.get_stats(
+        limit=3,
+        limit_in_request=1,
+        interval=1,
+        date_from='2019-01-01',
+        date_to='2019-01-03',
+        as_dataframe=True,
+        max_workers=4)
+    assert len(df['id'].drop_duplicates()) == 3
+
+
+def test_iter_stats():
+    rows = list(light_api.iter_stats(
+        limit=3,
+        limit_in_request=2,
+        interval=1,
+        date_from='2019-01-01',
+        date_to='2019-01-03'))
+    assert len({row['id'] for row in rows}) == 3
+
+
+def test_prune_inactive_dense():
+    df = light_api.get_stats(
+        limit=3,
+        date_from='2019-01-01',
+        date_to='2019-01-03',
+        prune_inactive=True,
+        dense=True,
+        as_dataframe=True)
+    assert len(df) == 3 * 3
+
+
 def test_camapign_stats_of_id():
     print(light_api.get_stats(ids=['5815884']))
 
@@ -0,0 +1,119 @@
+# coding: utf-8
+import asyncio
+
+import pytest
+import requests
+from tapioca.exceptions import ClientError
+
+from tapioca_mytarget import AsyncMytargetLight, MytargetLight
+from tapioca_mytarget.testing import FakeMytargetServer
+
+
+def test_update_banners_report():
+    changes = [{'id': i, 'status': 'blocked'} for i in range(1, 451)]
+    changes[9]['status'] = 'unknown'
+    with FakeMytargetServer() as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root, max_workers=4)
+        report = light_api.update_banners(changes)
+
+        assert [i['id'] for i in report] == list(range(1, 451))
+        assert [i['id'] for i in report if not i['ok']] == [10]
+        assert report[9]['error']['error']['code'] == 'validation_error'
+        assert len(server.updates['banners']) == 449
+        assert server.updates['banners'][1] == {'id': 1, 'status': 'blocked'}
+        # 3 запроса по 200, 200 и 50 объектов, первый отклонен
+        # и поделен пополам до объекта с ошибкой.
+        assert server.requests == 3 + 2 * 7
+
+        server.reset_counters()
+        df = light_api.update_campaigns(
+            [{'id': 1, 'status': 'active'}], as_dataframe=True)
+        assert df.to_dict('records') == [{'id': 1, 'ok': True, 'error': None}]
+        assert server.requests == 1
+
+
+def test_update_stops_splitting_invalid_request():
+    changes = [{'id': i, 'status': 'bogus'} for i in range(1, 201)]
+    with FakeMytargetServer() as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root)
+        report = light_api.update_campaigns(changes)
+
+        assert not any(i['ok'] for i in report)
+        assert report[0]['error']['error']['code'] == 'validation_error'
+        assert not server.updates['campaigns']
+        # Запрос и обе его половины, дальше не делится.
+        assert server.requests == 3
+
+
+def test_update_validation():
+    light_api = MytargetLight(access_token='fake')
+    with pytest.raises(ValueError):
+        light_api.update_banners([{'status': 'active'}])
+    with pytest.raises(ValueError):
+        light_api.update_banners([{'id': 1}], limit_in_request=201)
+
+
+def test_update_bisects_tapioca_client_error():
+    class ResultStub:
+        def __init__(self, response):
+            self.response = response
+            self.status_code = response.status_code
+
+        def __call__(self):
+            return self
+
+    class ResourceStub:
+        def post(self, data):
+            if any(change['status'] == 'unknown' for change in data):
+                response = requests.Response()
+                response.status_code = 400
+                response._content = b'{"error": {"code": "validation_error"}}'
+                raise ClientError(client=ResultStub(response))
+
+    light_api = MytargetLight(access_token='fake')
+    report = light_api._mass_action(
+        ResourceStub, [{'id': 1, 'status': 'unknown'},
+                       {'id': 2, 'status': 'active'}])
+    assert report == [
+        {'id': 1, 'ok': False,
+         'error': {'error': {'code': 'validation_error'}}},
+        {'id': 2, 'ok': True, 'error': None}]
+
+
+def test_async_update_campaigns():
+    changes = [{'id': i, 'status': 'blocked'} for i in range(1, 11)]
+    changes[3]['status'] = 'bogus'
+
+    async def main(server):
+        async with AsyncMytargetLight(access_token='fake',
+                                      url_root=server.url_root,
+                                      max_workers=4) as light_api:
+            return await light_api.update_campaigns(changes,
+                                                    limit_in_request=5)
+
+    with FakeMytargetServer() as server:
+        report = asyncio.run(main(server))
+        assert [i['id'] for i in report] == list(range(1, 11))
+        assert [i['id'] for i in report if not i['ok']] == [4]
+        assert report[3]['error']['error']['code'] == 'validation_error'
+        assert sorted(server.updates['campaigns']) == \
+            [1, 2, 3, 5, 6, 7, 8, 9, 10]
+        # 2 запроса по 5 объектов, первый поделен на 2 и 3,
+        # затем 3 на 1 и 2, затем 2 на 1 и 1.
+        assert server.requests == 2 + 2 * 3
+
+
+def test_async_update_stops_splitting_invalid_request():
+    changes = [{'id': i, 'status': 'bogus'} for i in range(1, 9)]
+
+    async def main(server):
+        async with AsyncMytargetLight(access_token='fake',
+                                      url_root=server.url_root) as light_api:
+            return await light_api.update_banners(changes)
+
+    with FakeMytargetServer() as server:
+        report = asyncio.run(main(server))
+        assert not any(i['ok'] for i in report)
+        assert server.requests == 3
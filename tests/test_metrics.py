@@ -0,0 +1,49 @@
+# coding: utf-8
+from tapioca_mytarget import MetricsCollector, MytargetLight
+from tapioca_mytarget.metrics import resource_name
+from tapioca_mytarget.testing import FakeMytargetServer
+
+
+def test_resource_name():
+    assert resource_name('https://target.my.com/api/v2/statistics/'
+                         'banners/day.json?id=1') == 'stats2'
+    assert resource_name('https://target.my.com/api/v2/banners.json') \
+        == 'banners2'
+    assert resource_name('https://target.my.com/api/v2/unknown.json') is None
+
+
+def test_metrics_collector():
+    events = []
+    collector = MetricsCollector()
+    with FakeMytargetServer(n_banners=120, limits={60: 100}) as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root, max_workers=4,
+                                  hooks=[collector, events.append])
+        light_api.get_stats(object_type=light_api.BANNER_STATS,
+                            date_from='2019-01-01', date_to='2019-01-10')
+
+    assert len(events) == server.requests == 4
+    assert {i['resource'] for i in events} == {'banners2', 'stats2'}
+    assert all(i['elapsed'] is not None and i['bytes'] for i in events)
+
+    summary = collector.summary()
+    assert summary['banners2']['requests'] == 3
+    assert summary['stats2']['requests'] == 1
+    assert summary['stats2']['errors'] == 0
+    assert summary['_quota']['min_remaining'] == {60: 96}
+
+    text = collector.prometheus()
+    assert 'mytarget_requests_total{resource="stats2",status="200"} 1' in text
+    assert 'mytarget_request_seconds_count{resource="banners2"} 3' in text
+    assert 'mytarget_quota_remaining{window="60"} 96' in text
+
+
+def test_hook_error_does_not_break_request():
+    def broken_hook(event):
+        raise ValueError
+
+    with FakeMytargetServer(n_banners=5) as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root,
+                                  hooks=[broken_hook])
+        assert len(light_api.get_banners()) == 5
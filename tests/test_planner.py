@@ -0,0 +1,68 @@
+# coding: utf-8
+from tapioca_mytarget import MytargetLight
+from tapioca_mytarget.planner import grouper_list, object_lifetime, plan_requests
+from tapioca_mytarget.testing import FakeMytargetServer
+
+
+def test_grouper_list():
+    assert grouper_list(list(range(200)), 200) == [list(range(200))]
+    assert [len(i) for i in grouper_list(list(range(401)), 200)] == [134, 134, 133]
+    assert grouper_list([1, 2, 3], 2) == [[1, 2], [3]]
+    assert grouper_list([], 200) == []
+
+
+def test_object_lifetime():
+    assert object_lifetime({'status': 'active',
+                            'created': '2019-01-01 10:00:00',
+                            'date_start': '2019-01-05',
+                            'date_end': '2019-03-01'}) == ('2019-01-05', '2019-03-01')
+    assert object_lifetime({'status': 'blocked',
+                            'created': '2019-01-01 10:00:00',
+                            'updated': '2019-02-01 10:00:00'}) == ('2019-01-01', '2019-02-01')
+    assert object_lifetime({'id': 1}) == (None, None)
+
+
+def test_plan_requests_skips_inactive_periods():
+    periods = [('2019-01-01', '2019-01-31'), ('2019-02-01', '2019-02-28')]
+    lifetimes = {1: ('2019-01-10', '2019-01-20'),
+                 2: ('2019-02-05', None),
+                 3: (None, None)}
+    assert plan_requests([1, 2, 3], periods, 200, lifetimes) == [
+        ([1, 3], ('2019-01-01', '2019-01-31')),
+        ([2, 3], ('2019-02-01', '2019-02-28'))]
+    assert plan_requests([1, 2], periods, 1, {1: ('2019-01-10', '2019-01-20'),
+                                              2: ('2019-02-05', '2019-02-10')}) == [
+        ([1], ('2019-01-10', '2019-01-20')),
+        ([2], ('2019-02-05', '2019-02-10'))]
+    assert plan_requests([1, 2], [{}], 1) == [([1], {}), ([2], {})]
+
+
+def test_plan_only_quota_cost():
+    with FakeMytargetServer(n_banners=120) as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root)
+        params = dict(object_type=light_api.BANNER_STATS,
+                      date_from='2019-01-01', date_to='2019-04-30',
+                      prune_inactive=True)
+        plan = light_api.get_stats(plan_only=True, **params)
+        # 3 страницы объявлений и 1 запрос суммарной статистики.
+        assert plan['planning_requests'] == server.requests == 4
+        assert len(plan['requests']) == 2
+
+        server.reset_counters()
+        light_api.get_stats(**params)
+        assert server.requests == plan['quota_cost'] == 6
+
+
+def test_lifetimes_only_for_known_ids():
+    with FakeMytargetServer(n_banners=1000) as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root)
+        stats = light_api.get_stats(
+            object_type=light_api.BANNER_STATS, ids=list(range(1, 61)),
+            date_from='2019-01-01', date_to='2019-01-10',
+            plan_by_lifetime=True)
+        assert [i['id'] for i in stats] == list(range(1, 61))
+        # 2 страницы объявлений по _id__in и 1 запрос статистики,
+        # а не 20 страниц всех объявлений.
+        assert server.requests == 3
@@ -0,0 +1,47 @@
+# coding: utf-8
+
+from tapioca_mytarget import RateLimiter
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_acquire_waits_until_window_reset():
+    clock = Clock(1000.25)
+    rate_limiter = RateLimiter(limits={1: 2}, clock=clock, sleep=clock.sleep)
+    rate_limiter.acquire()
+    rate_limiter.acquire()
+    assert clock.now == 1000.25
+    rate_limiter.acquire()
+    assert clock.now == 1001.0
+
+
+def test_update_from_error_remaining():
+    clock = Clock(1000.5)
+    rate_limiter = RateLimiter(clock=clock, sleep=clock.sleep)
+    assert rate_limiter.wait_time() == 0
+    rate_limiter.update({'1': 0, '60': 10, '3600': 100})
+    assert rate_limiter.wait_time() == 0.5
+    rate_limiter.update({'60': 0})
+    assert rate_limiter.wait_time() == 19.5
+
+
+def test_update_from_headers():
+    clock = Clock(1000.0)
+    rate_limiter = RateLimiter(clock=clock, sleep=clock.sleep)
+    rate_limiter.update_from_headers({
+        'X-RateLimit-RPS-Limit': '5',
+        'X-RateLimit-RPS-Remaining': '1',
+        'X-RateLimit-Hourly-Remaining': '1000',
+        'Content-Type': 'application/json'})
+    assert rate_limiter.limits == {1: 5}
+    assert rate_limiter.reserve() == 0
+    assert rate_limiter.reserve() == 1.0
@@ -0,0 +1,170 @@
+# coding: utf-8
+import asyncio
+
+import pytest
+import requests
+
+from tapioca_mytarget import (
+    CircuitBreaker, MytargetLight, RetryPolicy, RetryRule)
+from tapioca_mytarget.exceptions import MytargetCircuitOpenError
+from tapioca_mytarget.testing import FakeMytargetServer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def test_retry_rule_delay():
+    rule = RetryRule(base_delay=1, max_delay=5, multiplier=2, jitter=0.5)
+    assert [rule.delay(i, rand=lambda: 0) for i in (1, 2, 3, 4)] == \
+        [1, 2, 4, 5]
+    assert rule.delay(2, rand=lambda: 1) == 1
+
+
+def test_retry_policy_classes_and_total_time():
+    clock = Clock()
+    policy = RetryPolicy(
+        rules={'server': RetryRule(max_attempts=10, jitter=0)},
+        max_total_time=10, clock=clock, sleep=clock.sleep)
+    responses = iter([Response(502), Response(500), Response(200)])
+    assert policy.call('GET', lambda: next(responses)).status_code == 200
+    assert clock.sleeps == [1, 2]
+
+    # Паузы 1, 2, 4, а следующая 8 не укладывается в 10 секунд.
+    clock.sleeps = []
+    assert policy.call('GET', lambda: Response(503)).status_code == 503
+    assert clock.sleeps == [1, 2, 4]
+
+    def reset():
+        raise requests.exceptions.ConnectionError('reset')
+
+    clock.sleeps = []
+    with pytest.raises(requests.exceptions.ConnectionError):
+        policy.call('GET', reset)
+    assert len(clock.sleeps) == 4
+
+    # POST не повторяется, 4xx - не сбой.
+    clock.sleeps = []
+    assert policy.call('POST', lambda: Response(503)).status_code == 503
+    assert policy.call('GET', lambda: Response(400)).status_code == 400
+    assert clock.sleeps == []
+
+
+def test_circuit_breaker():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30,
+                             clock=clock)
+    breaker.record_failure()
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+    with pytest.raises(MytargetCircuitOpenError):
+        breaker.before_request()
+
+    clock.now += 30
+    # Один пробный запрос, остальные ждут его результата.
+    breaker.before_request()
+    with pytest.raises(MytargetCircuitOpenError):
+        breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+
+    clock.now += 30
+    breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == breaker.CLOSED
+    breaker.before_request()
+
+
+def test_breaker_stops_requests():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60,
+                             clock=clock)
+    policy = RetryPolicy(max_total_time=30, breaker=breaker, clock=clock,
+                         sleep=clock.sleep)
+    sent = []
+
+    def send():
+        sent.append(1)
+        return Response(503)
+
+    # 3 сбоя подряд, ждать замыкания дольше max_total_time.
+    with pytest.raises(MytargetCircuitOpenError):
+        policy.call('GET', send)
+    assert len(sent) == 3
+    with pytest.raises(MytargetCircuitOpenError):
+        policy.call('GET', send)
+    assert len(sent) == 3
+
+
+def test_retry_on_fake_server():
+    events = []
+    policy = RetryPolicy(rules={
+        'server': RetryRule(base_delay=0.01),
+        'connection': RetryRule(base_delay=0.01)})
+    with FakeMytargetServer(n_banners=120) as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root,
+                                  retry_policy=policy, hooks=[events.append])
+        server.fail_next(2, status=503)
+        server.fail_next(1, status=None)
+        banners = light_api.get_banners()
+
+    assert len(banners) == 120
+    assert server.requests == 6
+    assert [i['reason'] for i in events if i['type'] == 'retry'] == \
+        ['server', 'server', 'connection']
+
+
+def test_breaker_probe_unclassified_error():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30,
+                             clock=clock)
+    policy = RetryPolicy(max_total_time=0, breaker=breaker, clock=clock,
+                         sleep=clock.sleep)
+    breaker.record_failure()
+    clock.now += 30
+
+    def broken():
+        raise ValueError('broken body')
+
+    # Пробный запрос упал с ошибкой, которая не повторяется:
+    # это не сбой API, следующий запрос снова пробный.
+    with pytest.raises(ValueError):
+        policy.call('GET', broken)
+    assert breaker.state == breaker.HALF_OPEN
+    assert policy.call('GET', lambda: Response(200)).status_code == 200
+    assert breaker.state == breaker.CLOSED
+
+
+def test_breaker_ignores_cancelled_requests():
+    breaker = CircuitBreaker(failure_threshold=5)
+    policy = RetryPolicy(breaker=breaker)
+
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    def interrupted():
+        raise KeyboardInterrupt()
+
+    for _ in range(5):
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(policy.call_async('GET', cancelled))
+        with pytest.raises(KeyboardInterrupt):
+            policy.call('GET', interrupted)
+    assert breaker.state == breaker.CLOSED
+    assert breaker.failures == 0
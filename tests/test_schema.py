@@ -0,0 +1,53 @@
+# coding: utf-8
+from decimal import Decimal
+
+from tapioca_mytarget import MytargetLight
+from tapioca_mytarget.schema import column_type
+from tapioca_mytarget.tapioca_mytarget import LocalResult
+
+STATS = {'items': [
+    {'id': 1, 'rows': [
+        {'date': '2019-01-01',
+         'base': {'shows': 10, 'clicks': 1, 'spent': '155.8', 'cpm': '1.25'},
+         'uniques': {'reach': 3, 'frequency': '1.5'}},
+        {'date': '2019-01-02',
+         'base': {'shows': 0, 'clicks': 0, 'spent': '0', 'cpm': '0'},
+         'uniques': {'reach': 0, 'frequency': '0'}}]},
+    {'id': 2, 'rows': [
+        {'date': '2019-01-01', 'base': {'shows': 5}}]},
+]}
+
+
+def test_column_type():
+    assert column_type('base.spent') == 'float'
+    assert column_type('video.viewed_25_percent_rate') == 'float'
+    assert column_type('viral.likes') == 'int'
+    assert column_type('base.unknown') is None
+    assert column_type('name') is None
+
+
+def test_stats_to_df_float():
+    light_api = MytargetLight(access_token=None, metric_types='float')
+    df = light_api._stats_to_df([LocalResult(STATS)])
+
+    assert str(df['base.shows'].dtype) == 'int64'
+    assert str(df['id'].dtype) == 'int64'
+    assert str(df['base.spent'].dtype) == 'float64'
+    assert df['base.spent'].tolist()[:2] == [155.8, 0.0]
+    # Второй объект без метрики uniques.
+    assert str(df['uniques.reach'].dtype) == 'Int64'
+    assert df['date'].tolist()[0] == '2019-01-01'
+
+
+def test_stats_to_df_decimal():
+    light_api = MytargetLight(access_token=None, metric_types='decimal')
+    df = light_api._stats_to_df([LocalResult(STATS)])
+
+    assert df['base.cpm'].tolist()[0] == Decimal('1.25')
+    assert df['uniques.frequency'].tolist()[2] is None
+
+
+def test_stats_to_df_without_types():
+    light_api = MytargetLight(access_token=None)
+    df = light_api._stats_to_df([LocalResult(STATS)])
+    assert df['base.spent'].tolist()[0] == '155.8'
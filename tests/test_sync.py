@@ -0,0 +1,48 @@
+# coding: utf-8
+from tapioca_mytarget import MytargetLight, StatsSync
+from tapioca_mytarget.testing import FakeMytargetServer
+
+
+def periods(server):
+    """Объекты и периоды запросов статистики."""
+    return [(ids, date_from, date_to)
+            for _, ids, date_from, date_to in server.stats_requests]
+
+
+def test_run_requests_only_missing_days():
+    with FakeMytargetServer() as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root)
+        sync = StatsSync(light_api, lookback_days=2)
+
+        assert sync.run('banners', '2019-01-01', '2019-01-10',
+                        ids=[1, 2]) == 20
+        assert sync.watermarks('banners') == {1: '2019-01-10',
+                                              2: '2019-01-10'}
+
+        server.reset_counters()
+        assert sync.run('banners', '2019-01-01', '2019-01-12',
+                        ids=[1, 2, 3]) == 20
+        assert periods(server) == [([3], '2019-01-01', '2019-01-12'),
+                                   ([1, 2], '2019-01-09', '2019-01-12')]
+        assert len(sync.rows('banners', ids=[1])[0]['rows']) == 12
+
+
+def test_earlier_run_keeps_watermarks():
+    with FakeMytargetServer() as server:
+        light_api = MytargetLight(access_token='fake',
+                                  url_root=server.url_root)
+        sync = StatsSync(light_api, lookback_days=7)
+        sync.run('banners', '2019-01-01', '2019-01-10', ids=[1])
+
+        # Перезагрузка старого периода.
+        server.reset_counters()
+        sync.run('banners', '2019-01-01', '2019-01-05', ids=[1, 2])
+        assert periods(server) == [([2], '2019-01-01', '2019-01-05'),
+                                   ([1], '2019-01-04', '2019-01-05')]
+        assert sync.watermarks('banners') == {1: '2019-01-10',
+                                              2: '2019-01-05'}
+
+        server.reset_counters()
+        sync.run('banners', '2019-01-01', '2019-01-12', ids=[1])
+        assert periods(server) == [([1], '2019-01-04', '2019-01-12')]
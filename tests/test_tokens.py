@@ -0,0 +1,91 @@
+# coding: utf-8
+import time
+
+from tapioca_mytarget import MytargetAuth
+from tapioca_mytarget.tokens import (
+    FileTokenStore, MemoryTokenStore, SQLiteTokenStore, is_expiring)
+from tapioca_mytarget.exceptions import MytargetTokenError
+
+
+class Response:
+    status_code = 401
+    text = ''
+    url = ''
+    headers = {}
+
+    def json(self):
+        return {}
+
+
+class AuthStub(MytargetAuth):
+    """Выдает токены без запросов к API."""
+
+    def __init__(self, store=None, expires_in='86400'):
+        super().__init__(store=store)
+        self.expires_in = expires_in
+        self.calls = []
+
+    def get_client_token(self, client_id, client_secret, **kwargs):
+        self.calls.append('new')
+        return {'access_token': 'a{}'.format(len(self.calls)),
+                'refresh_token': 'r', 'expires_in': self.expires_in}
+
+    def refresh_token(self, client_id, client_secret, refresh_token,
+                      **kwargs):
+        self.calls.append('refresh')
+        if refresh_token == 'bad':
+            raise MytargetTokenError(Response())
+        return {'access_token': 'a{}'.format(len(self.calls)),
+                'expires_in': self.expires_in}
+
+
+def test_stores(tmpdir):
+    token = {'access_token': 'a', 'refresh_token': 'r', 'expires_at': None}
+    for store in (MemoryTokenStore(),
+                  FileTokenStore(str(tmpdir.join('tokens.json'))),
+                  SQLiteTokenStore()):
+        assert store.get('key') is None
+        store.put('key', token)
+        assert store.get('key') == token
+        store.delete('key')
+        assert store.get('key') is None
+
+
+def test_get_token_reuses_and_refreshes():
+    auth = AuthStub()
+    first = auth.get_token('id', 'secret')
+    assert auth.get_token('id', 'secret') == first
+    assert auth.calls == ['new']
+    assert not is_expiring(first)
+
+    # API не принял токен, он обновляется через refresh_token.
+    second = auth.get_token('id', 'secret', expired_token='a1')
+    assert second['access_token'] == 'a2'
+    assert second['refresh_token'] == 'r'
+    assert auth.calls == ['new', 'refresh']
+
+
+def test_get_token_refreshes_before_expiration():
+    auth = AuthStub(expires_in='100')
+    auth.get_token('id', 'secret', refresh_before=300)
+    auth.get_token('id', 'secret', refresh_before=300)
+    assert auth.calls == ['new', 'refresh']
+
+
+def test_get_token_new_if_refresh_failed():
+    auth = AuthStub(store=MemoryTokenStore())
+    auth.store.put(auth._token_key('id'), {
+        'access_token': 'old', 'refresh_token': 'bad',
+        'expires_at': time.time() - 1})
+    assert auth.get_token('id', 'secret')['access_token'] == 'a2'
+    assert auth.calls == ['refresh', 'new']
+
+
+def test_token_provider():
+    auth = AuthStub(expires_in='None')
+    provider = auth.token_provider('id', 'secret')
+    assert provider() == provider() == 'a1'
+    assert provider(expired_token='a1') == 'a2'
+    # Токен уже обновлен другим потоком.
+    assert provider(expired_token='a1') == 'a2'
+    assert auth.calls == ['new', 'refresh']